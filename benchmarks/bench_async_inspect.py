@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# Scaling of GGUFInspector over many files with the number of concurrent
+# reads, with the page cache dropped before every run.
+#
+# On local SSDs the header reads are short and the runs quickly become CPU
+# bound; the scaling this is meant to show appears on network and cloud
+# storage, where each read waits for a round trip. Use --dir to point it at
+# files on such a mount (they are written there when it holds none).
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Necessary to load the local gguf package
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from gguf.gguf_inspect import GGUFInspector  # noqa: E402
+from bench_header_io import drop_page_cache  # noqa: E402
+from bench_reader_memory import write_synthetic  # noqa: E402
+
+
+async def scan(paths: list[str], workers: int) -> float:
+    start = time.perf_counter()
+    async with GGUFInspector(max_workers = workers, per_device = workers) as inspector:
+        await inspector.inspect_many(paths)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Measure concurrent GGUF header inspection')
+    parser.add_argument('--dir', help = 'directory of GGUF files to scan, temporary by default')
+    parser.add_argument('--files', type = int, default = 500, help = 'number of synthetic files')
+    parser.add_argument('--vocab', type = int, default = 32000, help = 'vocab size of the synthetic files')
+    parser.add_argument('--workers', default = '1,2,4,8,16,32,64', help = 'comma separated concurrency levels')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        directory = args.dir or tmpdir
+        paths = sorted(str(p) for p in Path(directory).glob('*.gguf'))
+        if not paths:
+            paths = [os.path.join(directory, f'model-{i:04d}.gguf') for i in range(args.files)]
+            write_synthetic(paths[0], args.vocab, 100)
+            for path in paths[1:]:
+                # Copies, not links, so every file has its own pages to read
+                with open(paths[0], 'rb') as src, open(path, 'wb') as dst:
+                    dst.write(src.read())
+
+        results = []
+        baseline = None
+        for workers in (int(w) for w in args.workers.split(',')):
+            for path in paths:
+                drop_page_cache(path)
+            elapsed = asyncio.run(scan(paths, workers))
+            if baseline is None:
+                baseline = elapsed
+            results.append({
+                'workers': workers,
+                'seconds': elapsed,
+                'files_per_s': len(paths) / elapsed,
+                'speedup': baseline / elapsed,
+            })
+
+        print(json.dumps({
+            'files': len(paths),
+            'file_mb': os.path.getsize(paths[0]) / 1e6,
+            'results': results,
+        }, indent = 4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# Regression suite for reading and writing GGUF files.
+#
+# Writes a matrix of synthetic files with GGUFWriter, each configuration
+# varying one dimension from a base file (32 KV pairs, 32k vocab, 100 Q8_0
+# tensors): the KV count, the vocab size (32k to 256k strings), the tensor
+# count (100 to 10,000) and the tensor type. For every file it measures
+#
+#   - writer throughput, from creating the GGUFWriter to closing it
+#   - GGUFReader open time with mmap and pread header parsing, eager and
+#     lazy tensors, and from a saved header index, on a cold and a warm
+#     page cache
+#   - the Python heap kept and peaked by opening (tracemalloc), and the
+#     peak RSS of a fresh process opening the file (psutil, /proc or
+#     getrusage)
+#   - the latency of field, vocab item and tensor lookups
+#
+# Cold runs drop the page cache of the file with posix_fadvise(DONTNEED),
+# on platforms without it they are skipped. Results are written as JSON;
+# --compare prints the change of every metric against an earlier result.
+#
+#   python benchmarks/bench_gguf_suite.py --output results.json
+#   python benchmarks/bench_gguf_suite.py --quick --compare results.json
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator, NamedTuple
+
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Necessary to load the local gguf package
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from gguf import GGMLQuantizationType, GGUFReader, GGUFWriter  # noqa: E402
+from gguf.quants import quantize  # noqa: E402
+from bench_header_io import drop_page_cache  # noqa: E402
+from bench_reader_memory import measure  # noqa: E402
+
+
+class BenchConfig(NamedTuple):
+    n_kv: int
+    n_vocab: int
+    n_tensors: int
+    qtype: str
+
+    @property
+    def name(self) -> str:
+        return f'kv{self.n_kv}-vocab{self.n_vocab}-tensors{self.n_tensors}-{self.qtype}'
+
+
+BASE_CONFIG = BenchConfig(n_kv = 32, n_vocab = 32000, n_tensors = 100, qtype = 'Q8_0')
+
+# Values of every dimension, the others keep their base value.
+FULL_MATRIX: dict[str, tuple[Any, ...]] = {
+    'n_kv':      (32, 1024, 8192),
+    'n_vocab':   (32000, 128000, 256000),
+    'n_tensors': (100, 1000, 10000),
+    'qtype':     ('F32', 'F16', 'Q8_0', 'Q4_0'),
+}
+QUICK_MATRIX: dict[str, tuple[Any, ...]] = {
+    'n_kv':      (32, 1024),
+    'n_vocab':   (32000, 128000),
+    'n_tensors': (100, 1000),
+    'qtype':     ('F16', 'Q8_0'),
+}
+
+# Variants of opening a file, as GGUFReader arguments.
+OPEN_VARIANTS: dict[str, dict[str, Any]] = {
+    'mmap_eager': {'header_io': 'mmap', 'lazy_tensors': False},
+    'mmap_lazy':  {'header_io': 'mmap', 'lazy_tensors': True},
+    'pread_lazy': {'header_io': 'pread', 'lazy_tensors': True},
+}
+
+
+def configs(matrix: dict[str, tuple[Any, ...]]) -> list[BenchConfig]:
+    result = []
+    for dimension, values in matrix.items():
+        for value in values:
+            config = BASE_CONFIG._replace(**{dimension: value})
+            if config not in result:
+                result.append(config)
+    return result
+
+
+def write_model(path: str, config: BenchConfig, rows: int, row_size: int) -> dict[str, float]:
+    qtype = GGMLQuantizationType[config.qtype]
+    values = np.random.default_rng(0).standard_normal((rows, row_size), dtype = np.float32)
+    tensor = values if qtype == GGMLQuantizationType.F32 else quantize(values, qtype)
+    raw_dtype = None if qtype == GGMLQuantizationType.F32 else qtype
+    tokens = [f'token_{i}' for i in range(config.n_vocab)]
+    scores = [float(i) for i in range(config.n_vocab)]
+
+    start = time.perf_counter()
+    writer = GGUFWriter(path, 'llama')
+    writer.add_block_count(config.n_tensors)
+    writer.add_context_length(4096)
+    for i in range(config.n_kv):
+        if i % 2:
+            writer.add_uint32(f'bench.u32.{i}', i)
+        else:
+            writer.add_string(f'bench.str.{i}', f'value {i}')
+    writer.add_tokenizer_model('gpt2')
+    writer.add_token_list(tokens)
+    writer.add_token_scores(scores)
+    writer.add_token_types([1] * config.n_vocab)
+    for i in range(config.n_tensors):
+        writer.add_tensor(f'blk.{i}.ffn_up.weight', tensor, raw_dtype = raw_dtype)
+    writer.write_header_to_file()
+    writer.write_kv_data_to_file()
+    header_s = time.perf_counter() - start
+    writer.write_tensors_to_file()
+    writer.close()
+    total_s = time.perf_counter() - start
+
+    file_mb = os.path.getsize(path) / 1e6
+    return {'file_mb': file_mb, 'seconds': total_s, 'header_s': header_s, 'mb_per_s': file_mb / total_s}
+
+
+def open_times(path: str, cold: bool, runs: int, **kwargs: Any) -> dict[str, float]:
+    times = []
+    for _ in range(runs):
+        if cold:
+            drop_page_cache(path)
+        start = time.perf_counter()
+        reader = GGUFReader(path, **kwargs)
+        times.append(time.perf_counter() - start)
+        del reader
+    return {'median_s': statistics.median(times), 'min_s': min(times), 'max_s': max(times)}
+
+
+# Resets the peak RSS of this process (VmHWM), only possible on Linux.
+def reset_peak_rss() -> bool:
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+# Current and peak RSS of this process in MB, None where not available.
+def rss_mb() -> tuple[float | None, float | None]:
+    current = peak = None
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        current = info.rss / 1e6
+        if hasattr(info, 'peak_wset'):
+            return current, info.peak_wset / 1e6
+    try:
+        with open('/proc/self/status') as f:
+            match = re.search(r'^VmHWM:\s+(\d+) kB', f.read(), re.MULTILINE)
+        if match is not None:
+            return current, int(match.group(1)) * 1024 / 1e6
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return current, peak
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = maxrss / 1e6 if sys.platform == 'darwin' else maxrss * 1024 / 1e6
+    return current, peak
+
+
+# Opens a file in a fresh process, whose RSS only holds the interpreter
+# and the imports besides the reader.
+def child_rss(path: str, header_io: str) -> dict[str, Any]:
+    output = subprocess.run(
+        [sys.executable, __file__, '--child-open', path, '--child-header-io', header_io],
+        check = True, capture_output = True, text = True,
+    ).stdout
+    return json.loads(output)
+
+
+def _child_open(path: str, header_io: str) -> None:
+    # Without a reset the peak is that of the imports when they took more
+    peak_reset = reset_peak_rss()
+    before, _peak = rss_mb()
+    reader = GGUFReader(path, header_io = header_io, lazy_tensors = True, use_index = False)  # type: ignore[arg-type]
+    after, peak = rss_mb()
+    del reader
+    print(json.dumps({'rss_before_mb': before, 'rss_after_mb': after, 'peak_rss_mb': peak, 'peak_reset': peak_reset}))
+
+
+def per_op_ns(fn: Callable[[Any], Any], items: list[Any]) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1e9
+
+
+def access_latency(reader: GGUFReader, config: BenchConfig, repeats: int) -> dict[str, float]:
+    rng = random.Random(0)
+    kv_keys = [
+        f'bench.u32.{i}' if i % 2 else f'bench.str.{i}'
+        for i in (rng.randrange(config.n_kv) for _ in range(repeats))
+    ] if config.n_kv else ['llama.context_length'] * repeats
+    token_ids = [rng.randrange(config.n_vocab) for _ in range(repeats)]
+    tensor_ids = [rng.randrange(config.n_tensors) for _ in range(repeats)]
+    tensor_names = [f'blk.{i}.ffn_up.weight' for i in tensor_ids]
+    tokens = reader.fields['tokenizer.ggml.tokens']
+
+    start = time.perf_counter()
+    tokens.contents()
+    all_tokens_s = time.perf_counter() - start
+    return {
+        'scalar_ns':         per_op_ns(lambda _: reader.fields['llama.context_length'].contents(), token_ids),
+        'kv_lookup_ns':      per_op_ns(lambda key: reader.get_field(key), kv_keys),
+        'token_ns':          per_op_ns(tokens.contents, token_ids),
+        'tensor_ns':         per_op_ns(reader.get_tensor, tensor_ids),
+        'tensor_by_name_ns': per_op_ns(reader.get_tensor_by_name, tensor_names),
+        'all_tokens_ms':     all_tokens_s * 1e3,
+    }
+
+
+def run_config(path: str, config: BenchConfig, args: argparse.Namespace) -> dict[str, Any]:
+    write = write_model(path, config, args.rows, args.row_size)
+    caches = ('cold', 'warm') if hasattr(os, 'posix_fadvise') else ('warm',)
+
+    opens = {
+        variant: {cache: open_times(path, cache == 'cold', args.runs, use_index = False, **kwargs) for cache in caches}
+        for variant, kwargs in OPEN_VARIANTS.items()
+    }
+    index_dir = os.path.join(os.path.dirname(path), 'index')
+    GGUFReader(path, header_io = 'pread', lazy_tensors = True, use_index = False).save_index(index_dir)
+    opens['index'] = {
+        cache: open_times(path, cache == 'cold', args.runs, lazy_tensors = True, index_dir = index_dir)
+        for cache in caches
+    }
+    shutil.rmtree(index_dir, ignore_errors = True)
+
+    reader, heap = measure(lambda: GGUFReader(path, header_io = 'pread', lazy_tensors = True, use_index = False))
+    latency = access_latency(reader, config, args.repeats)  # type: ignore[arg-type]
+    del reader
+
+    return {
+        'config': config._asdict(),
+        'write': write,
+        'open': opens,
+        'memory': {
+            'heap': heap,
+            'rss': {header_io: child_rss(path, header_io) for header_io in ('mmap', 'pread')},
+        },
+        'access': latency,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd = Path(__file__).parent, check = True, capture_output = True, text = True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict[str, Any]:
+    return {
+        'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec = 'seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'can_drop_cache': hasattr(os, 'posix_fadvise'),
+        'psutil': psutil is not None,
+    }
+
+
+def _metrics(value: Any, prefix: str = '') -> Iterator[tuple[str, float]]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _metrics(item, f'{prefix}.{key}' if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, float(value)
+
+
+# Relative change of every metric of the configurations in both results.
+def compare(old: dict[str, Any], new: dict[str, Any]) -> list[tuple[str, str, float, float, float]]:
+    old_results = {result['name']: result for result in old['results']}
+    changes = []
+    for result in new['results']:
+        previous = old_results.get(result['name'])
+        if previous is None:
+            continue
+        old_metrics = dict(_metrics(previous))
+        for metric, value in _metrics(result):
+            if metric.startswith('config.') or not old_metrics.get(metric):
+                continue
+            base = old_metrics[metric]
+            changes.append((result['name'], metric, base, value, (value - base) / base))
+    return changes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Benchmark GGUFReader and GGUFWriter on synthetic files')
+    parser.add_argument('--quick', action = 'store_true', help = 'smaller matrix for a fast check')
+    parser.add_argument('--only', help = 'only configurations whose name contains this')
+    parser.add_argument('--runs', type = int, default = 5, help = 'runs per open time measurement')
+    parser.add_argument('--repeats', type = int, default = 10000, help = 'lookups per access latency measurement')
+    parser.add_argument('--rows', type = int, default = 8, help = 'rows per synthetic tensor')
+    parser.add_argument('--row-size', type = int, default = 256, help = 'values per row, a multiple of 256')
+    parser.add_argument('--dir', help = 'directory to write the files in, temporary by default')
+    parser.add_argument('--output', help = 'write the results to this JSON file, stdout by default')
+    parser.add_argument('--compare', help = 'earlier results to print the change against')
+    parser.add_argument('--threshold', type = float, default = 0.1, help = 'only print changes larger than this')
+    parser.add_argument('--child-open', help = argparse.SUPPRESS)
+    parser.add_argument('--child-header-io', default = 'pread', help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_open:
+        _child_open(args.child_open, args.child_header_io)
+        return
+
+    selected = [
+        config for config in configs(QUICK_MATRIX if args.quick else FULL_MATRIX)
+        if args.only is None or args.only in config.name
+    ]
+    results = []
+    with tempfile.TemporaryDirectory(dir = args.dir) as tmpdir:
+        for config in selected:
+            print(f'{config.name}...', file = sys.stderr)
+            path = os.path.join(tmpdir, f'{config.name}.gguf')
+            results.append({'name': config.name, **run_config(path, config, args)})
+            os.remove(path)
+
+    report = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent = 2)
+    else:
+        print(json.dumps(report, indent = 2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        for name, metric, base, value, change in compare(old, report):
+            if abs(change) >= args.threshold:
+                print(f'{name:45} {metric:40} {base:12.4g} -> {value:12.4g} {change:+8.1%}', file = sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
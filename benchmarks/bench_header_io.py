@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Open time of GGUFReader with the header read through the memmap versus
+# with a few large pread calls, on a cold and a warm page cache.
+#
+# The page cache of the file is dropped with posix_fadvise(DONTNEED) before
+# every cold run, which works without root for files nobody is writing. On
+# network file systems point --path at a file on the mount to see the
+# difference that matters there.
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Necessary to load the local gguf package
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from gguf import GGUFReader  # noqa: E402
+from bench_reader_memory import write_synthetic  # noqa: E402
+
+
+def drop_page_cache(path: str) -> bool:
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+def time_open(path: str, header_io: str, lazy_tensors: bool, cold: bool, runs: int) -> dict[str, float]:
+    times = []
+    for _ in range(runs):
+        if cold:
+            drop_page_cache(path)
+        start = time.perf_counter()
+        reader = GGUFReader(path, header_io = header_io, lazy_tensors = lazy_tensors)  # type: ignore[arg-type]
+        times.append(time.perf_counter() - start)
+        del reader
+    return {'median_s': statistics.median(times), 'min_s': min(times), 'max_s': max(times)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Compare mmap and pread header parsing of GGUFReader')
+    parser.add_argument('--path', help = 'existing GGUF file to open, a synthetic one is written otherwise')
+    parser.add_argument('--vocab', type = int, default = 128000, help = 'number of tokens in the synthetic vocab')
+    parser.add_argument('--tensors', type = int, default = 2000, help = 'number of synthetic tensors')
+    parser.add_argument('--runs', type = int, default = 5, help = 'runs per measurement')
+    parser.add_argument('--eager', action = 'store_true', help = 'build every ReaderTensor when opening')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = args.path
+        if path is None:
+            path = os.path.join(tmpdir, 'synthetic.gguf')
+            write_synthetic(path, args.vocab, args.tensors)
+
+        results = {}
+        for header_io in ('mmap', 'pread'):
+            results[header_io] = {
+                cache: time_open(path, header_io, not args.eager, cache == 'cold', args.runs)
+                for cache in ('cold', 'warm')
+            }
+
+        print(json.dumps({
+            'file_mb': os.path.getsize(path) / 1e6,
+            'lazy_tensors': not args.eager,
+            'can_drop_cache': hasattr(os, 'posix_fadvise'),
+            'results': results,
+        }, indent = 4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# Memory use of GGUFReader for a synthetic GGUF file with a large vocab.
+#
+# Reports the Python heap allocated (tracemalloc) to keep a reader open,
+# and how much more it takes when every field is materialized as a
+# ReaderField, which is what holding the fields in a dict would cost.
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+# Necessary to load the local gguf package
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from gguf import GGUFReader, GGUFWriter  # noqa: E402
+
+
+def write_synthetic(path: str, n_vocab: int, n_tensors: int) -> None:
+    writer = GGUFWriter(path, 'llama')
+    writer.add_block_count(n_tensors)
+    writer.add_context_length(4096)
+    writer.add_tokenizer_model('gpt2')
+    writer.add_token_list([f'token_{i}' for i in range(n_vocab)])
+    writer.add_token_scores([float(i) for i in range(n_vocab)])
+    writer.add_token_types([1] * n_vocab)
+    writer.add_token_merges([f'tok{i} en{i}' for i in range(n_vocab // 2)])
+    tensor = np.zeros((4, 32), dtype = np.float32)
+    for i in range(n_tensors):
+        writer.add_tensor(f'blk.{i}.attn_q.weight', tensor)
+    writer.write_header_to_file()
+    writer.write_kv_data_to_file()
+    writer.write_tensors_to_file()
+    writer.close()
+
+
+def measure(fn) -> tuple[object, dict[str, float]]:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {'seconds': elapsed, 'retained_mb': current / 1e6, 'peak_mb': peak / 1e6}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Measure GGUFReader memory use on a synthetic file')
+    parser.add_argument('--vocab', type = int, default = 256000, help = 'number of tokens in the vocab')
+    parser.add_argument('--tensors', type = int, default = 1000, help = 'number of tensors')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'synthetic.gguf')
+        write_synthetic(path, args.vocab, args.tensors)
+
+        reader, open_stats = measure(lambda: GGUFReader(path, lazy_tensors = True))
+        fields, materialize_stats = measure(lambda: dict(reader.fields.items()))  # type: ignore[attr-defined]
+        del fields, reader
+
+        print(json.dumps({
+            'file_mb': os.path.getsize(path) / 1e6,
+            'vocab': args.vocab,
+            'tensors': args.tensors,
+            'open': open_stats,
+            'materialize_all_fields': materialize_stats,
+        }, indent = 4))
+
+
+if __name__ == '__main__':
+    main()
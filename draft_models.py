@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Find draft models usable for speculative decoding with a target model.
+
+A draft model is only usable when it tokenizes text exactly like the target
+model, so candidates are compared on tokenizer.ggml.model,
+tokenizer.ggml.pre and a hash of the raw tokenizer.ggml.tokens array. The
+token array is hashed straight from the GGUF memmap in one go instead of
+decoding every token.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+
+from gguf import SHARD_NAME_PATTERN, GGUFReader, Keys, split_shard_paths
+
+
+@dataclass(frozen=True)
+class TokenizerSignature:
+    model: str
+    pre: str
+    n_tokens: int
+    tokens_digest: str
+
+
+@dataclass(frozen=True)
+class DraftCandidate:
+    path: str
+    size: int
+    size_ratio: float  # size of the draft model relative to the target model
+
+
+# Signatures are cached by path, size and mtime so repeated searches are fast
+_signature_cache = {}
+
+
+def model_size(path):
+    """Get the size of a model in bytes, summing all shards of a split model"""
+    return sum(os.path.getsize(shard) for shard in split_shard_paths(path) if shard.exists())
+
+
+def _field_string(reader, key):
+    field = reader.get_field(key)
+    if field is None:
+        return ""
+    return field.contents()
+
+
+def _tokens_digest(reader):
+    """Hash the raw bytes of the token array, returns (n_tokens, digest)"""
+    field = reader.get_field(Keys.Tokenizer.LIST)
+    if field is None:
+        return 0, ""
+    # field.values is one view of all the length prefixed strings, which are
+    # stored back to back in the file
+    n_tokens = len(field.data)
+    if n_tokens == 0 or field.values is None:
+        return 0, ""
+    strings = field.values
+
+    digest = hashlib.blake2b(memoryview(strings), digest_size=16)
+    return n_tokens, digest.hexdigest()
+
+
+def tokenizer_signature(path):
+    """Get the TokenizerSignature of a GGUF model"""
+    st = os.stat(path)
+    cache_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    signature = _signature_cache.get(cache_key)
+    if signature is None:
+        reader = GGUFReader(path, 'r', lazy_tensors=True)
+        n_tokens, digest = _tokens_digest(reader)
+        signature = TokenizerSignature(
+            model=_field_string(reader, Keys.Tokenizer.MODEL),
+            pre=_field_string(reader, Keys.Tokenizer.PRE),
+            n_tokens=n_tokens,
+            tokens_digest=digest,
+        )
+        _signature_cache[cache_key] = signature
+    return signature
+
+
+def iter_gguf_files(model_dirs):
+    """Yield the GGUF model files in the given directories, only the first shard of split models"""
+    seen = set()
+    for model_dir in model_dirs:
+        if not os.path.isdir(model_dir):
+            continue
+        for dirpath, _dirnames, filenames in os.walk(model_dir):
+            for filename in sorted(filenames):
+                if not filename.endswith(".gguf"):
+                    continue
+                match = SHARD_NAME_PATTERN.match(filename)
+                if match and int(match.group("no")) != 1:
+                    continue
+                path = os.path.abspath(os.path.join(dirpath, filename))
+                if path not in seen:
+                    seen.add(path)
+                    yield path
+
+
+def find_draft_candidates(target_path, model_dirs):
+    """Find models in model_dirs that can serve as draft model for target_path
+
+    Candidates must be smaller than the target and share its tokenizer, they
+    are returned sorted by size ratio, smallest first.
+    """
+    target = tokenizer_signature(target_path)
+    if not target.tokens_digest:
+        raise ValueError(f"{os.path.basename(target_path)} has no tokenizer.ggml.tokens array")
+    target_size = model_size(target_path)
+    target_abs = os.path.abspath(target_path)
+
+    candidates = []
+    for path in iter_gguf_files(model_dirs):
+        if path == target_abs:
+            continue
+        size = model_size(path)
+        if size >= target_size:
+            continue
+        try:
+            signature = tokenizer_signature(path)
+        except (OSError, ValueError):
+            # Not a readable GGUF file
+            continue
+        if signature == target:
+            candidates.append(DraftCandidate(path, size, size / target_size))
+
+    candidates.sort(key=lambda c: c.size_ratio)
+    return candidates
@@ -1,6 +1,7 @@
 from .constants import *
 from .lazy import *
 from .gguf_reader import *
+from .gguf_split_reader import *
 from .gguf_writer import *
 from .quants import *
 from .tensor_mapping import *
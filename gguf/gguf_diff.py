@@ -0,0 +1,283 @@
+#
+# Structural and numerical differences between two GGUF files: metadata keys
+# added, removed or changed, tensors added, removed or with another shape or
+# type, and for the common tensors whether their bytes are equal (hashed in
+# a thread pool) and, when they are not, how far apart their values are.
+# Values are compared in chunks of a fixed number of elements on a few
+# threads, so memory use depends neither on the size of the tensors nor on
+# how far their type is quantized.
+#
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, NamedTuple
+
+import numpy as np
+import numpy.typing as npt
+
+from .constants import GGML_QUANT_SIZES, GGMLQuantizationType
+from .gguf_integrity import hash_range
+from .gguf_reader import GGUFReader, ReaderField
+from .quants import dequantize
+
+# Values of each tensor dequantized per step of the numerical comparison,
+# as float32 that is 4 MiB per file.
+DIFF_CHUNK_ELEMENTS = 1 << 20
+
+# Threads comparing values, each holding a few chunks. Hashing, which only
+# streams the bytes, uses more.
+DIFF_NUMERIC_WORKERS = 4
+
+# Arrays longer than this are summarized instead of listed in the report.
+DIFF_MAX_ARRAY_ITEMS = 8
+
+_PLAIN_TYPES: dict[GGMLQuantizationType, type[np.generic]] = {
+    GGMLQuantizationType.F64: np.float64,
+    GGMLQuantizationType.I8:  np.int8,
+    GGMLQuantizationType.I16: np.int16,
+    GGMLQuantizationType.I32: np.int32,
+    GGMLQuantizationType.I64: np.int64,
+}
+
+
+class KVChange(NamedTuple):
+    key: str
+    old: Any
+    new: Any
+
+
+class TensorChange(NamedTuple):
+    name: str
+    old_shape: tuple[int, ...]
+    new_shape: tuple[int, ...]
+    old_type: str
+    new_type: str
+
+
+class TensorDelta(NamedTuple):
+    name: str
+    identical: bool
+
+    # Only computed for tensors that differ, None when the type can not be
+    # dequantized.
+    max_abs: float | None = None
+    rmse: float | None = None
+    cosine: float | None = None
+
+
+class GGUFDiff(NamedTuple):
+    kv_added: list[str]
+    kv_removed: list[str]
+    kv_changed: list[KVChange]
+    tensors_added: list[str]
+    tensors_removed: list[str]
+    tensors_changed: list[TensorChange]
+    tensor_deltas: list[TensorDelta]
+
+    @property
+    def identical(self) -> bool:
+        return not (
+            self.kv_added or self.kv_removed or self.kv_changed or self.tensors_added
+            or self.tensors_removed or self.tensors_changed
+            or any(not delta.identical for delta in self.tensor_deltas)
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'identical': self.identical,
+            'kv_added': self.kv_added,
+            'kv_removed': self.kv_removed,
+            'kv_changed': [change._asdict() for change in self.kv_changed],
+            'tensors_added': self.tensors_added,
+            'tensors_removed': self.tensors_removed,
+            'tensors_changed': [change._asdict() for change in self.tensors_changed],
+            'tensors_different': [delta._asdict() for delta in self.tensor_deltas if not delta.identical],
+            'tensors_identical': sum(1 for delta in self.tensor_deltas if delta.identical),
+        }
+
+
+def _summary(field: ReaderField) -> Any:
+    # The value of a field for the report, long arrays only by their length
+    value = field.contents()
+    if isinstance(value, list) and len(value) > DIFF_MAX_ARRAY_ITEMS:
+        return f'[{len(value)} items]'
+    return value
+
+
+def _raw_value(reader: GGUFReader, key: str) -> bytes:
+    _start, value_start, end = reader.fields.span(key)
+    return reader.data[value_start - 4:end].tobytes()
+
+
+def diff_metadata(a: GGUFReader, b: GGUFReader) -> tuple[list[str], list[str], list[KVChange]]:
+    keys_a = [key for key in a.fields if not key.startswith('GGUF.')]
+    keys_b = [key for key in b.fields if not key.startswith('GGUF.')]
+    added = [key for key in keys_b if key not in a.fields]
+    removed = [key for key in keys_a if key not in b.fields]
+    changed = []
+    same_order = a.byte_order == b.byte_order
+    for key in keys_a:
+        if key not in b.fields:
+            continue
+        # The raw bytes (type and value) are compared, which avoids decoding
+        # large arrays like the vocab
+        if same_order:
+            equal = _raw_value(a, key) == _raw_value(b, key)
+        else:
+            field_a, field_b = a.fields[key], b.fields[key]
+            equal = field_a.types == field_b.types and field_a.contents() == field_b.contents()
+        if not equal:
+            changed.append(KVChange(key, _summary(a.fields[key]), _summary(b.fields[key])))
+    return added, removed, changed
+
+
+def tensor_values(
+    raw: npt.NDArray[np.uint8], qtype: GGMLQuantizationType, dtype: type[np.floating[Any]] = np.float64,
+) -> npt.NDArray[np.floating[Any]]:
+    # Values of raw tensor bytes (whole blocks) as a flat float array.
+    plain_type = _PLAIN_TYPES.get(qtype)
+    if plain_type is not None:
+        return raw.view(plain_type).astype(dtype)
+    _block_size, type_size = GGML_QUANT_SIZES[qtype]
+    return dequantize(raw.reshape(-1, type_size), qtype).reshape(-1).astype(dtype, copy = False)
+
+
+def _sum_of_products(x: npt.NDArray[np.float32], y: npt.NDArray[np.float32], out: npt.NDArray[np.float32]) -> float:
+    # The products are float32, their sum is accumulated in float64
+    np.multiply(x, y, out = out)
+    return float(out.sum(dtype = np.float64))
+
+
+def tensor_delta(a: GGUFReader, b: GGUFReader, name: str, chunk_elements: int = DIFF_CHUNK_ELEMENTS) -> TensorDelta:
+    # Compare the values of a tensor of the same type and shape in both files.
+    idx_a, idx_b = a.tensor_table.find(name), b.tensor_table.find(name)
+    assert idx_a is not None and idx_b is not None
+    qtype = GGMLQuantizationType(int(a.tensor_table.types[idx_a]))
+    n_bytes = int(a.tensor_table.n_bytes[idx_a])
+    start_a = int(a.tensor_table.data_offsets[idx_a])
+    start_b = int(b.tensor_table.data_offsets[idx_b])
+    block_size, type_size = GGML_QUANT_SIZES[qtype]
+    step = max(1, chunk_elements // block_size) * type_size
+
+    max_abs = 0.0
+    sum_sq = dot = norm_a = norm_b = 0.0
+    count = 0
+    try:
+        for offs in range(0, n_bytes, step):
+            size = min(step, n_bytes - offs)
+            values_a = tensor_values(np.asarray(a.data[start_a + offs:start_a + offs + size]), qtype, np.float32)
+            values_b = tensor_values(np.asarray(b.data[start_b + offs:start_b + offs + size]), qtype, np.float32)
+            diff = values_a - values_b
+            products = np.empty_like(diff)
+            if len(diff):
+                max_abs = max(max_abs, float(np.abs(diff, out = products).max()))
+            sum_sq += _sum_of_products(diff, diff, products)
+            dot += _sum_of_products(values_a, values_b, products)
+            norm_a += _sum_of_products(values_a, values_a, products)
+            norm_b += _sum_of_products(values_b, values_b, products)
+            count += len(diff)
+    except NotImplementedError:
+        return TensorDelta(name, False)
+    rmse = (sum_sq / count) ** 0.5 if count else 0.0
+    cosine = dot / (norm_a * norm_b) ** 0.5 if norm_a > 0 and norm_b > 0 else None
+    return TensorDelta(name, False, max_abs, rmse, cosine)
+
+
+def diff_files(
+    path_a: os.PathLike[str] | str, path_b: os.PathLike[str] | str, max_workers: int | None = None,
+    numeric: bool = True, numeric_workers: int = DIFF_NUMERIC_WORKERS,
+) -> GGUFDiff:
+    # max_workers threads hash the tensor data, numeric_workers threads
+    # compare the values of the tensors that differ.
+    a = GGUFReader(path_a, lazy_tensors = True)
+    b = GGUFReader(path_b, lazy_tensors = True)
+    kv_added, kv_removed, kv_changed = diff_metadata(a, b)
+
+    table_a, table_b = a.tensor_table, b.tensor_table
+    tensors_added = [name for name in table_b.names if table_a.find(name) is None]
+    tensors_removed = [name for name in table_a.names if table_b.find(name) is None]
+    tensors_changed = []
+    comparable = []
+    for idx_a, name in enumerate(table_a.names):
+        idx_b = table_b.find(name)
+        if idx_b is None:
+            continue
+        shape_a, shape_b = table_a.shape(idx_a), table_b.shape(idx_b)
+        type_a = GGMLQuantizationType(int(table_a.types[idx_a]))
+        type_b = GGMLQuantizationType(int(table_b.types[idx_b]))
+        if shape_a != shape_b or type_a != type_b:
+            tensors_changed.append(TensorChange(name, shape_a, shape_b, type_a.name, type_b.name))
+        else:
+            comparable.append((name, int(table_a.data_offsets[idx_a]), int(table_b.data_offsets[idx_b]), int(table_a.n_bytes[idx_a])))
+
+    tensor_deltas = []
+    workers = max_workers if max_workers is not None else min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers = workers) as executor:
+        # hashlib releases the GIL, so both files are hashed in parallel
+        digests_a = [executor.submit(hash_range, path_a, offs_a, n_bytes) for _name, offs_a, _offs_b, n_bytes in comparable]
+        digests_b = [executor.submit(hash_range, path_b, offs_b, n_bytes) for _name, _offs_a, offs_b, n_bytes in comparable]
+        different = []
+        for (name, _offs_a, _offs_b, _n_bytes), digest_a, digest_b in zip(comparable, digests_a, digests_b):
+            if digest_a.result() == digest_b.result():
+                tensor_deltas.append(TensorDelta(name, True))
+            else:
+                different.append(name)
+
+    if numeric and different:
+        with ThreadPoolExecutor(max_workers = max(1, min(numeric_workers, workers))) as executor:
+            tensor_deltas += executor.map(lambda name: tensor_delta(a, b, name), different)
+    else:
+        tensor_deltas += (TensorDelta(name, False) for name in different)
+
+    return GGUFDiff(kv_added, kv_removed, kv_changed, tensors_added, tensors_removed, tensors_changed, tensor_deltas)
+
+
+def format_diff(diff: GGUFDiff) -> list[str]:
+    lines = []
+    lines += [f'+ kv {key}' for key in diff.kv_added]
+    lines += [f'- kv {key}' for key in diff.kv_removed]
+    lines += [f'~ kv {change.key}: {change.old!r} -> {change.new!r}' for change in diff.kv_changed]
+    lines += [f'+ tensor {name}' for name in diff.tensors_added]
+    lines += [f'- tensor {name}' for name in diff.tensors_removed]
+    lines += [
+        f'~ tensor {change.name}: {change.old_type} {list(change.old_shape)} -> {change.new_type} {list(change.new_shape)}'
+        for change in diff.tensors_changed
+    ]
+    for delta in diff.tensor_deltas:
+        if delta.identical:
+            continue
+        if delta.max_abs is None:
+            lines.append(f'~ data {delta.name}: bytes differ')
+        else:
+            cosine = 'n/a' if delta.cosine is None else f'{delta.cosine:.6f}'
+            lines.append(f'~ data {delta.name}: max abs {delta.max_abs:.6g}, rmse {delta.rmse:.6g}, cosine {cosine}')
+    identical = sum(1 for delta in diff.tensor_deltas if delta.identical)
+    lines.append(f'{identical} of {len(diff.tensor_deltas)} common tensors with the same shape and type are identical')
+    return lines
+
+
+def main() -> None:
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description = 'Compare two GGUF files')
+    parser.add_argument('a', help = 'first GGUF file')
+    parser.add_argument('b', help = 'second GGUF file')
+    parser.add_argument('--threads', type = int, default = None, help = 'number of hashing threads')
+    parser.add_argument('--numeric-threads', type = int, default = DIFF_NUMERIC_WORKERS, help = 'number of value comparison threads')
+    parser.add_argument('--no-numeric', action = 'store_true', help = 'only report which tensors differ, without value deltas')
+    parser.add_argument('--json', action = 'store_true', help = 'print the differences as JSON')
+    args = parser.parse_args()
+
+    diff = diff_files(args.a, args.b, args.threads, not args.no_numeric, args.numeric_threads)
+    if args.json:
+        print(json.dumps(diff.to_dict(), indent = 2, default = str))
+    else:
+        print('\n'.join(format_diff(diff)))
+    sys.exit(0 if diff.identical else 1)
+
+
+if __name__ == '__main__':
+    main()
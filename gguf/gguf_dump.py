@@ -0,0 +1,177 @@
+#
+# Machine readable dumps of GGUF headers: metadata and tensor table as JSON
+# or NDJSON, for one file or many.
+#
+# Files are read with the header only path of GGUFReader (header_io =
+# 'pread', lazy tensors), the tensor data is never mapped. Many files are
+# dumped on a process pool and the results are written in input order as
+# soon as they are ready, so a long run streams instead of waiting for the
+# slowest file at the end.
+#
+#   python -m gguf.gguf_dump model.gguf --keys '*.context_length' --keys '*.block_count'
+#   python -m gguf.gguf_dump models/ --tensors --skip-arrays > catalog.ndjson
+#
+from __future__ import annotations
+
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Sequence
+
+from .constants import GGMLQuantizationType, GGUFValueType
+from .gguf_reader import GGUFReader, ReaderField
+
+# Arrays longer than this are truncated to their first items.
+DUMP_MAX_ARRAY_ITEMS = 16
+
+# Files handed to a worker at a time when dumping many files.
+DUMP_CHUNKSIZE = 4
+
+
+def _field_value(field: ReaderField, count: int, max_array_items: int | None, skip_arrays: bool) -> Any:
+    if field.types[0] != GGUFValueType.ARRAY:
+        return field.contents()
+    if max_array_items is None or count <= max_array_items:
+        return field.contents()
+    summary: dict[str, Any] = {
+        'array': GGUFValueType(field.types[-1]).name,
+        'count': count,
+    }
+    if not skip_arrays:
+        # Item by item, slicing a string array would copy all its bytes
+        summary['head'] = [field.contents(i) for i in range(max_array_items)]
+    return summary
+
+
+def dump_reader(
+    reader: GGUFReader, keys: Sequence[str] | None = None, max_array_items: int | None = DUMP_MAX_ARRAY_ITEMS,
+    skip_arrays: bool = False, tensors: bool = False,
+) -> dict[str, Any]:
+    # The metadata (the keys matching any of the glob patterns in keys, all
+    # by default) and optionally the tensor table of a reader. Arrays longer
+    # than max_array_items become {"array": item type, "count": n, "head":
+    # first items}, without "head" when skip_arrays is set.
+    metadata = {}
+    for key, field in reader.fields.items():
+        if key.startswith('GGUF.'):
+            continue
+        if keys is not None and not any(fnmatchcase(key, pattern) for pattern in keys):
+            continue
+        metadata[key] = _field_value(field, reader.fields.item_count(key), max_array_items, skip_arrays)
+
+    result: dict[str, Any] = {
+        'path': str(reader.path),
+        'version': int(reader.fields['GGUF.version'].contents()),
+        'tensor_count': len(reader.tensor_table),
+        'kv_count': int(reader.fields['GGUF.kv_count'].contents()),
+        'metadata': metadata,
+    }
+    if tensors:
+        table = reader.tensor_table
+        result['tensors'] = [
+            {
+                'name': name,
+                'type': GGMLQuantizationType(tensor_type).name,
+                'shape': list(table.shape(idx)),
+                'offset': offset,
+                'n_bytes': n_bytes,
+            }
+            for idx, (name, tensor_type, offset, n_bytes) in enumerate(zip(
+                table.names, table.types.tolist(), table.data_offsets.tolist(), table.n_bytes.tolist(),
+            ))
+        ]
+    return result
+
+
+def dump_file(
+    path: os.PathLike[str] | str, keys: Sequence[str] | None = None, max_array_items: int | None = DUMP_MAX_ARRAY_ITEMS,
+    skip_arrays: bool = False, tensors: bool = False,
+) -> dict[str, Any]:
+    reader = GGUFReader(path, 'r', lazy_tensors = True, header_io = 'pread')
+    result = dump_reader(reader, keys, max_array_items, skip_arrays, tensors)
+    result['file_size'] = os.path.getsize(path)
+    return result
+
+
+def _dump_or_error(path: str, **kwargs: Any) -> dict[str, Any]:
+    try:
+        return dump_file(path, **kwargs)
+    except (OSError, ValueError) as e:
+        return {'path': path, 'error': str(e)}
+
+
+def dump_files(
+    paths: Iterable[os.PathLike[str] | str], max_workers: int | None = None, **kwargs: Any,
+) -> Iterator[dict[str, Any]]:
+    # Dump many files, yielding the results in the order of paths. Files that
+    # can not be read give {"path": ..., "error": ...}. kwargs are passed to
+    # dump_file.
+    paths = [os.fspath(path) for path in paths]
+    worker = functools.partial(_dump_or_error, **kwargs)
+    if len(paths) <= 1 or max_workers == 1:
+        yield from map(worker, paths)
+        return
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        yield from executor.map(worker, paths, chunksize = DUMP_CHUNKSIZE)
+
+
+# Files given on the command line, with the .gguf files in directories.
+def expand_paths(paths: Iterable[os.PathLike[str] | str]) -> list[Path]:
+    expanded = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            expanded += sorted(p for p in path.rglob('*.gguf') if p.is_file())
+        else:
+            expanded.append(path)
+    return expanded
+
+
+def main() -> None:
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description = 'Dump GGUF metadata and tensor tables as JSON or NDJSON')
+    parser.add_argument('paths', nargs = '+', help = 'GGUF files or directories of them')
+    parser.add_argument('--keys', action = 'append', metavar = 'PATTERN', help = 'only keys matching this glob pattern, can be repeated')
+    parser.add_argument('--max-array', type = int, default = DUMP_MAX_ARRAY_ITEMS, help = 'truncate arrays longer than this, -1 for no limit')
+    parser.add_argument('--skip-arrays', action = 'store_true', help = 'only give the type and length of truncated arrays')
+    parser.add_argument('--tensors', action = 'store_true', help = 'include the tensor table')
+    parser.add_argument('--format', choices = ('ndjson', 'json'), default = None, help = 'json for one file, ndjson for many by default')
+    parser.add_argument('--workers', type = int, default = None, help = 'number of worker processes')
+    args = parser.parse_args()
+
+    paths = expand_paths(args.paths)
+    fmt = args.format or ('json' if len(paths) == 1 else 'ndjson')
+    results = dump_files(
+        paths, args.workers, keys = args.keys, max_array_items = None if args.max_array < 0 else args.max_array,
+        skip_arrays = args.skip_arrays, tensors = args.tensors,
+    )
+
+    failed = False
+    if fmt == 'json' and len(paths) == 1:
+        result = next(results)
+        failed = 'error' in result
+        print(json.dumps(result, indent = 2, ensure_ascii = False))
+    else:
+        # A JSON array is streamed item by item too
+        if fmt == 'json':
+            sys.stdout.write('[\n')
+        for i, result in enumerate(results):
+            failed = failed or 'error' in result
+            line = json.dumps(result, ensure_ascii = False)
+            if fmt == 'json':
+                line = ('' if i == 0 else ',\n') + line
+                sys.stdout.write(line)
+            else:
+                sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+        if fmt == 'json':
+            sys.stdout.write('\n]\n')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
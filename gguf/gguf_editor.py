@@ -0,0 +1,263 @@
+#
+# Editing of the key/value metadata of GGUF files without rewriting the
+# tensor data through GGUFWriter.
+#
+# Edits that keep every value the same size are patched in place. Otherwise
+# a new header is built from the raw bytes of the untouched fields and the
+# tensor infos; when it still fits in front of the tensor data it is written
+# in place too, else the tensor data is moved with os.copy_file_range, which
+# is an in-kernel copy and becomes a reflink or server side copy where the
+# file system supports it.
+#
+# The in place edits are not atomic: a process killed while writing them
+# leaves a corrupt header. apply(atomic = True) always writes a new file and
+# renames it over the old one, at the cost of copying the tensor data on
+# file systems without reflinks.
+#
+from __future__ import annotations
+
+import errno
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Literal
+
+import numpy as np
+
+from .constants import GGUF_DEFAULT_ALIGNMENT, GGUF_MAGIC, GGUFValueType, Keys
+from .gguf_index import read_at
+from .gguf_reader import GGUFReader
+from .gguf_writer import GGUFValue, GGUFWriter
+
+logger = logging.getLogger(__name__)
+
+# Size of the reads and writes when the tensor data is moved without
+# os.copy_file_range.
+EDITOR_COPY_CHUNK = 64 << 20
+
+
+def _write_at(fd: int, data: bytes | bytearray | memoryview, offset: int) -> None:
+    view = memoryview(data)
+    while view:
+        if hasattr(os, 'pwrite'):
+            written = os.pwrite(fd, view, offset)
+        else:
+            os.lseek(fd, offset, os.SEEK_SET)
+            written = os.write(fd, view)
+        view = view[written:]
+        offset += written
+
+
+def copy_range(src_fd: int, dst_fd: int, src_offset: int, dst_offset: int, n_bytes: int) -> None:
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    while n_bytes > 0 and copy_file_range is not None:
+        try:
+            copied = copy_file_range(src_fd, dst_fd, n_bytes, src_offset, dst_offset)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM):
+                raise
+            # Not supported between these files, copy through user space
+            break
+        if copied == 0:
+            raise ValueError(f'Unexpected end of file at offset {src_offset}')
+        src_offset += copied
+        dst_offset += copied
+        n_bytes -= copied
+    while n_bytes > 0:
+        chunk = read_at(src_fd, min(n_bytes, EDITOR_COPY_CHUNK), src_offset)
+        if not chunk:
+            raise ValueError(f'Unexpected end of file at offset {src_offset}')
+        _write_at(dst_fd, chunk, dst_offset)
+        src_offset += len(chunk)
+        dst_offset += len(chunk)
+        n_bytes -= len(chunk)
+
+
+class GGUFMetadataEditor:
+    # Collects edits with set() and remove() and applies them with apply().
+    edits: dict[str, GGUFValue | None]
+
+    def __init__(self, path: os.PathLike[str] | str):
+        self.path = Path(path)
+        self.edits = {}
+
+    # Set a key to a value. Without vtype, an existing key keeps its type and
+    # a new one gets the type GGUFValueType.get_type picks for the value,
+    # except general.alignment, which is always a UINT32.
+    def set(self, key: str, value: Any, vtype: GGUFValueType | None = None) -> None:
+        if key.startswith('GGUF.'):
+            raise ValueError(f'{key} is not a metadata key')
+        self.edits[key] = GGUFValue(value, vtype)  # type: ignore[arg-type]
+
+    def remove(self, key: str) -> None:
+        self.edits[key] = None
+
+    def _packed_values(self, reader: GGUFReader, packer: GGUFWriter) -> dict[str, bytes | None]:
+        # Value type plus value of every edit, None for removals.
+        packed: dict[str, bytes | None] = {}
+        for key, edit in self.edits.items():
+            field = reader.get_field(key)
+            if edit is None:
+                if field is None:
+                    logger.warning(f'{key} is not in {self.path.name}, nothing to remove')
+                    continue
+                packed[key] = None
+                continue
+            vtype = edit.type
+            if vtype is None and field is not None:
+                vtype = GGUFValueType(field.types[0])
+            elif vtype is None and key == Keys.General.ALIGNMENT:
+                # The only type readers accept for the alignment
+                vtype = GGUFValueType.UINT32
+            elif vtype is None:
+                vtype = GGUFValueType.get_type(edit.value)
+            packed[key] = packer._pack_val(edit.value, vtype, add_vtype = True)
+
+        if Keys.General.ALIGNMENT in packed:
+            # The tensor offsets depend on the alignment, changing it means
+            # laying out the tensor data again. Setting the alignment in use,
+            # or removing the key when that is the default, is fine.
+            current = packer._pack_val(int(reader.alignment), GGUFValueType.UINT32, add_vtype = True)
+            alignment = packed[Keys.General.ALIGNMENT]
+            if (alignment is None and int(reader.alignment) != GGUF_DEFAULT_ALIGNMENT) or alignment not in (None, current):
+                raise ValueError(f'Changing {Keys.General.ALIGNMENT} needs the tensor data to be rewritten, use GGUFWriter')
+        return packed
+
+    # Apply the edits, returns how: 'in-place' when values were patched,
+    # 'header' when the header was rewritten in place and 'rewrite' when a
+    # new file replaced the old one, because the tensor data had to be moved
+    # or atomic was set.
+    def apply(self, atomic: bool = False) -> Literal['in-place', 'header', 'rewrite']:
+        reader = GGUFReader(self.path, 'r', lazy_tensors = True, use_index = False)
+        packer = GGUFWriter(None, '', endianess = reader.endianess)
+        packed = self._packed_values(reader, packer)
+        fields = reader.fields
+        data = reader.data
+
+        # Same size edits of existing keys are patched through a r+ memmap
+        same_size = all(
+            value is not None and key in fields and len(value) == fields.span(key)[2] - fields.span(key)[1] + 4
+            for key, value in packed.items()
+        )
+        if same_size and not atomic:
+            patches = [(fields.span(key)[1] - 4, value) for key, value in packed.items()]
+            del reader, fields, data
+            out = np.memmap(self.path, mode = 'r+')
+            for offset, value in patches:
+                assert value is not None
+                out[offset:offset + len(value)] = np.frombuffer(value, dtype = np.uint8)
+            out.flush()
+            del out
+            return 'in-place'
+
+        # Build the new header from the raw bytes of the untouched fields
+        kv_data = bytearray()
+        kv_count = 0
+        for key in fields:
+            if key.startswith('GGUF.'):
+                continue
+            start, value_start, end = fields.span(key)
+            if key not in packed:
+                kv_data += data[start:end].tobytes()
+            elif packed[key] is not None:
+                kv_data += packer._pack_val(key, GGUFValueType.STRING, add_vtype = False) + packed[key]  # type: ignore[operator]
+            else:
+                continue
+            kv_count += 1
+        for key, value in packed.items():
+            if key not in fields:
+                assert value is not None
+                kv_data += packer._pack_val(key, GGUFValueType.STRING, add_vtype = False) + value
+                kv_count += 1
+
+        table = reader.tensor_table
+        ti_start = int(table.field_offsets[0]) if len(table) else reader.header_end
+        header = bytearray()
+        header += packer._pack('<I', GGUF_MAGIC, skip_pack_prefix = True)
+        header += data[4:8].tobytes()  # version
+        header += packer._pack('Q', len(table))
+        header += packer._pack('Q', kv_count)
+        header += kv_data
+        header += data[ti_start:reader.header_end].tobytes()
+
+        alignment = int(reader.alignment)
+        old_data_offset = reader.data_offset
+        new_data_offset = GGUFWriter.ggml_pad(len(header), alignment)
+        header += bytes(new_data_offset - len(header))
+        file_size = os.path.getsize(self.path)
+        del reader, fields, data
+
+        if new_data_offset == old_data_offset and not atomic:
+            # The new header fits in front of the tensor data
+            fd = os.open(self.path, os.O_RDWR | getattr(os, 'O_BINARY', 0))
+            try:
+                _write_at(fd, header, 0)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            return 'header'
+
+        # Move the tensor data into a new file, which replaces the old one
+        tmp_path = self.path.with_name(self.path.name + '.edit.tmp')
+        src_fd = os.open(self.path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            dst_fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+            try:
+                copy_range(src_fd, dst_fd, old_data_offset, new_data_offset, file_size - old_data_offset)
+                _write_at(dst_fd, header, 0)
+                os.fsync(dst_fd)
+            finally:
+                os.close(dst_fd)
+        except BaseException:
+            tmp_path.unlink(missing_ok = True)
+            raise
+        finally:
+            os.close(src_fd)
+        shutil.copymode(self.path, tmp_path)
+        os.replace(tmp_path, self.path)
+        return 'rewrite'
+
+
+def _parse_cli_value(reader: GGUFReader, key: str, raw: str, type_name: str | None) -> tuple[Any, GGUFValueType | None]:
+    if type_name is not None:
+        vtype = GGUFValueType[type_name.upper()]
+    else:
+        field = reader.get_field(key)
+        vtype = GGUFValueType(field.types[0]) if field is not None else GGUFValueType.STRING
+    if vtype == GGUFValueType.STRING:
+        return raw, vtype
+    if vtype == GGUFValueType.BOOL:
+        return raw.lower() in ('1', 'true', 'yes', 'on'), vtype
+    if vtype in (GGUFValueType.FLOAT32, GGUFValueType.FLOAT64):
+        return float(raw), vtype
+    if vtype == GGUFValueType.ARRAY:
+        raise ValueError(f'{key}: arrays cannot be set from the command line')
+    return int(raw), vtype
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'Edit the metadata of a GGUF file without rewriting the tensor data')
+    parser.add_argument('model', help = 'GGUF file to edit')
+    parser.add_argument('--set', nargs = 2, action = 'append', default = [], metavar = ('KEY', 'VALUE'), help = 'set a key')
+    parser.add_argument('--type', help = 'value type of the keys set, by default the existing type or string')
+    parser.add_argument('--remove', action = 'append', default = [], metavar = 'KEY', help = 'remove a key')
+    parser.add_argument('--atomic', action = 'store_true', help = 'write a new file and rename it, never edit in place')
+    args = parser.parse_args()
+    logging.basicConfig(level = logging.INFO)
+
+    editor = GGUFMetadataEditor(args.model)
+    reader = GGUFReader(args.model, 'r', lazy_tensors = True, use_index = False)
+    for key, raw in args.set:
+        value, vtype = _parse_cli_value(reader, key, raw, args.type)
+        editor.set(key, value, vtype)
+    del reader
+    for key in args.remove:
+        editor.remove(key)
+    logging.info(f'{args.model}: {editor.apply(args.atomic)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#
+# Content fingerprints of GGUF models, to key caches and histories by what a
+# model is rather than where it is stored.
+#
+# The fingerprint hashes the whole serialized header (metadata and tensor
+# infos) and a deterministic sample of the tensor data: a few blocks at
+# fixed positions of every tensor. The positions only depend on the tensor
+# table, so copies and renamed files get the same fingerprint, while any
+# metadata change and any change to the weights (requantization, another
+# finetune) changes it. Edits touching only a few bytes of a tensor outside
+# the sampled blocks are not seen, use gguf_integrity for that.
+#
+# Sample ranges close to each other are merged, so small tensors stored
+# back to back cost a single read. A merged read is at most a few MB and
+# skips less than 64 KB between samples, so a model reads a few 100 KB to a
+# few 10 MB in total whatever the size of its tensors.
+#
+from __future__ import annotations
+
+import hashlib
+import os
+from bisect import bisect_left
+from typing import Iterable
+
+from .gguf_index import read_at
+from .gguf_reader import GGUFReader
+from .gguf_split_reader import split_shard_paths
+
+FINGERPRINT_VERSION = 1
+
+# Sampled blocks per tensor, spread evenly from its first to its last byte,
+# and their size.
+FINGERPRINT_SAMPLES = 4
+FINGERPRINT_SAMPLE_BYTES = 4096
+
+# Sample ranges less than this apart are read with one pread, as long as
+# it reads at most FINGERPRINT_MAX_READ bytes.
+FINGERPRINT_MERGE_GAP = 64 << 10
+FINGERPRINT_MAX_READ = 4 << 20
+
+# Fingerprints by (path, size, mtime_ns), to skip the reads for unchanged files.
+_fingerprint_cache: dict[tuple[str, int, int], str] = {}
+
+
+def _sample_ranges(reader: GGUFReader, samples: int, sample_bytes: int) -> list[tuple[int, int]]:
+    table = reader.tensor_table
+    ranges = []
+    for offset, n_bytes in zip(table.data_offsets.tolist(), table.n_bytes.tolist()):
+        if n_bytes <= samples * sample_bytes:
+            ranges.append((offset, offset + n_bytes))
+            continue
+        step = (n_bytes - sample_bytes) // (samples - 1) if samples > 1 else 0
+        ranges += ((offset + i * step, offset + i * step + sample_bytes) for i in range(samples))
+    return sorted(ranges)
+
+
+def _merge_ranges(ranges: Iterable[tuple[int, int]], gap: int, max_size: int) -> list[tuple[int, int]]:
+    merged: list[tuple[int, int]] = []
+    for start, end in ranges:
+        if merged and start - merged[-1][1] <= gap and max(merged[-1][1], end) - merged[-1][0] <= max_size:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def file_fingerprint(
+    path: os.PathLike[str] | str, samples: int = FINGERPRINT_SAMPLES, sample_bytes: int = FINGERPRINT_SAMPLE_BYTES,
+) -> str:
+    st = os.stat(path)
+    cache_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    default = samples == FINGERPRINT_SAMPLES and sample_bytes == FINGERPRINT_SAMPLE_BYTES
+    if default and cache_key in _fingerprint_cache:
+        return _fingerprint_cache[cache_key]
+
+    reader = GGUFReader(path, 'r', lazy_tensors = True, header_io = 'pread')
+    ranges = _sample_ranges(reader, samples, sample_bytes)
+    digest = hashlib.blake2b(digest_size = 16)
+    digest.update(f'gguf-fingerprint:{FINGERPRINT_VERSION}:{samples}:{sample_bytes}:{st.st_size}:'.encode())
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        digest.update(read_at(fd, reader.header_end, 0))
+        for start, end in _merge_ranges(ranges, FINGERPRINT_MERGE_GAP, FINGERPRINT_MAX_READ):
+            data = read_at(fd, end - start, start)
+            # Only the sampled bytes are hashed, not the gaps read with them,
+            # so the result does not depend on how the ranges were merged
+            view = memoryview(data)
+            for sample_start, sample_end in ranges[bisect_left(ranges, (start,)):]:
+                if sample_start >= end:
+                    break
+                digest.update(view[sample_start - start:sample_end - start])
+            digest.update(b'truncated' if len(data) != end - start else b'')
+    finally:
+        os.close(fd)
+
+    fingerprint = digest.hexdigest()
+    if default:
+        _fingerprint_cache[cache_key] = fingerprint
+    return fingerprint
+
+
+# Fingerprint of a model, combining all shards of a split model.
+def model_fingerprint(path: os.PathLike[str] | str) -> str:
+    shards = split_shard_paths(path)
+    if len(shards) == 1:
+        return file_fingerprint(shards[0])
+    digest = hashlib.blake2b(digest_size = 16)
+    for shard in shards:
+        digest.update(bytes.fromhex(file_fingerprint(shard)))
+    return digest.hexdigest()
+
+
+def main() -> None:
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description = 'Print content fingerprints of GGUF models')
+    parser.add_argument('models', nargs = '+', help = 'GGUF files, any shard of a split model')
+    parser.add_argument('--time', action = 'store_true', help = 'print the time taken per model')
+    args = parser.parse_args()
+
+    for model in args.models:
+        start = time.perf_counter()
+        fingerprint = model_fingerprint(model)
+        elapsed = f'  {time.perf_counter() - start:.3f}s' if args.time else ''
+        print(f'{fingerprint}  {model}{elapsed}')
+
+
+if __name__ == '__main__':
+    main()
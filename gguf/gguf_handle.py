@@ -0,0 +1,103 @@
+#
+# Picklable references to tensor data, for process pools.
+#
+# A ReaderTensor holds a memmap view, and pickling it copies the whole
+# tensor into the worker. A TensorHandle only holds where the tensor is
+# (path, offset, size) and how to read it (type, shape); the worker maps
+# the file itself through its own ReaderRegistry, so no tensor bytes cross
+# the process boundary and each worker maps a file once however many
+# tensors of it it gets.
+#
+from __future__ import annotations
+
+import os
+from typing import Iterable, NamedTuple
+
+import numpy as np
+import numpy.typing as npt
+
+from .constants import GGML_QUANT_SIZES, GGMLQuantizationType
+from .gguf_reader import GGUFReader, ReaderTensorSelection
+from .gguf_registry import shared_registry
+from .quants import quant_shape_to_byte_shape
+
+
+_PLAIN_TYPES: dict[GGMLQuantizationType, type[np.generic]] = {
+    GGMLQuantizationType.F32: np.float32,
+    GGMLQuantizationType.F16: np.float16,
+    GGMLQuantizationType.F64: np.float64,
+    GGMLQuantizationType.I8:  np.int8,
+    GGMLQuantizationType.I16: np.int16,
+    GGMLQuantizationType.I32: np.int32,
+    GGMLQuantizationType.I64: np.int64,
+}
+
+
+class TensorHandle(NamedTuple):
+    path: str
+    name: str
+
+    # Absolute offset and size of the tensor data in the file.
+    offset: int
+    n_bytes: int
+    tensor_type: GGMLQuantizationType
+
+    # In GGUF order, the row size (ne0) first.
+    shape: tuple[int, ...]
+
+    @property
+    def n_elements(self) -> int:
+        return int(np.prod(self.shape, dtype = np.int64))
+
+    # Number of rows, values and bytes per row.
+    def row_layout(self) -> tuple[int, int, int]:
+        row_size = self.shape[0] if self.shape else 1
+        n_rows = self.n_elements // row_size if row_size else 0
+        block_size, type_size = GGML_QUANT_SIZES[self.tensor_type]
+        return n_rows, row_size, row_size // block_size * type_size
+
+    # The raw bytes of the tensor, or of bytes [start, end) of it, as a view
+    # of the file mapped in this process.
+    def raw(self, start: int = 0, end: int | None = None) -> npt.NDArray[np.uint8]:
+        end = self.n_bytes if end is None else min(end, self.n_bytes)
+        data = shared_registry().get(self.path).data
+        return np.asarray(data[self.offset + start:self.offset + end])
+
+    # Bytes of rows [row_start, row_end).
+    def raw_rows(self, row_start: int, row_end: int) -> npt.NDArray[np.uint8]:
+        _n_rows, _row_size, row_bytes = self.row_layout()
+        return self.raw(row_start * row_bytes, row_end * row_bytes)
+
+    # The tensor as ReaderTensor.data would have it: typed for float and
+    # integer tensors, bytes in blocks for quantized ones.
+    def array(self) -> npt.NDArray[np.generic]:
+        np_shape = tuple(reversed(self.shape))
+        plain_type = _PLAIN_TYPES.get(self.tensor_type)
+        if plain_type is not None:
+            return self.raw().view(plain_type).reshape(np_shape)
+        return self.raw().reshape(quant_shape_to_byte_shape(np_shape, self.tensor_type))
+
+
+def tensor_handle(reader: GGUFReader, idx: int) -> TensorHandle:
+    table = reader.tensor_table
+    return TensorHandle(
+        path = os.path.abspath(reader.path),
+        name = table.names[idx],
+        offset = int(table.data_offsets[idx]),
+        n_bytes = int(table.n_bytes[idx]),
+        tensor_type = GGMLQuantizationType(int(table.types[idx])),
+        shape = table.shape(idx),
+    )
+
+
+# Handles of all tensors of a reader, or of a selection or list of indices.
+def tensor_handles(
+    reader: GGUFReader, tensors: ReaderTensorSelection | Iterable[int] | None = None,
+) -> list[TensorHandle]:
+    if tensors is None:
+        indices: Iterable[int] = range(len(reader.tensor_table))
+    elif isinstance(tensors, ReaderTensorSelection):
+        indices = tensors.indices.tolist()
+    else:
+        indices = tensors
+    return [tensor_handle(reader, int(idx)) for idx in indices]
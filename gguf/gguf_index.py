@@ -0,0 +1,180 @@
+#
+# Header index files of GGUF models. An index holds what GGUFReader learns
+# by parsing the header (field slots, string array offsets, tensor table) in
+# a fixed binary layout that is memory mapped back, so re-opening a model
+# does not depend on the size of its header.
+#
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import numpy as np
+import numpy.typing as npt
+
+INDEX_MAGIC = b'GGIX'
+INDEX_VERSION = 1
+
+# Directory for index files, when unset they are stored next to the model.
+INDEX_DIR_ENV = 'GGUF_INDEX_DIR'
+
+# Bytes at the start and at the end of the header covered by the checksum.
+INDEX_CHECKSUM_SPAN = 1 << 16
+
+# magic, version, file size, file mtime_ns, header checksum, header end,
+# byte order, GGUF version, alignment, data offset, number of sections
+_INDEX_HEADER = struct.Struct('<4sIQq16sQ1sxxxIQQI')
+
+# section name, dtype, offset, count
+_INDEX_SECTION = struct.Struct('<32s4sQQ')
+
+# Sections are aligned so they can be used as memmap views directly.
+_INDEX_SECTION_ALIGNMENT = 8
+
+
+class IndexMeta(NamedTuple):
+    file_size: int
+    mtime_ns: int
+    checksum: bytes
+
+    # Offset of the end of the tensor infos, before the alignment padding.
+    header_end: int
+
+    byte_order: str
+    version: int
+    alignment: int
+    data_offset: int
+
+
+def read_at(fd: int, size: int, offset: int) -> bytes:
+    # os.pread where available (not on Windows), otherwise seek and read.
+    if hasattr(os, 'pread'):
+        return os.pread(fd, size, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
+
+
+def index_path(path: os.PathLike[str] | str, index_dir: os.PathLike[str] | str | None = None) -> Path:
+    # Location of the index of a model, either model.gguf.idx next to it or
+    # a file named after the absolute model path in the index directory.
+    path = Path(path)
+    if index_dir is None:
+        index_dir = os.environ.get(INDEX_DIR_ENV) or None
+    if index_dir is None:
+        return path.with_name(path.name + '.idx')
+    path_hash = hashlib.blake2b(str(path.resolve()).encode('utf-8'), digest_size = 8).hexdigest()
+    return Path(index_dir) / f'{path.stem}-{path_hash}.idx'
+
+
+def header_checksum(fd: int, header_end: int) -> bytes:
+    # Hashing the whole header would cost as much as parsing it, so only the
+    # start (version, counts, first keys) and the end (last tensor infos) are
+    # covered. Together with size and mtime this catches rewritten headers.
+    first = read_at(fd, min(header_end, INDEX_CHECKSUM_SPAN), 0)
+    last_start = max(header_end - INDEX_CHECKSUM_SPAN, len(first))
+    last = read_at(fd, header_end - last_start, last_start) if last_start < header_end else b''
+    digest = hashlib.blake2b(digest_size = 16)
+    digest.update(header_end.to_bytes(8, 'little'))
+    digest.update(first)
+    digest.update(last)
+    return digest.digest()
+
+
+def encode_names(names: list[str]) -> tuple[npt.NDArray[np.uint64], npt.NDArray[np.uint8]]:
+    encoded = [name.encode('utf-8') for name in names]
+    offsets = np.zeros(len(encoded) + 1, dtype = np.uint64)
+    np.cumsum([len(e) for e in encoded], out = offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype = np.uint8)
+
+
+def decode_names(offsets: npt.NDArray[np.uint64], data: npt.NDArray[np.uint8]) -> list[str]:
+    raw = data.tobytes()
+    bounds = offsets.tolist()
+    return [raw[start:end].decode('utf-8') for start, end in zip(bounds, bounds[1:])]
+
+
+def write_index(idx_path: os.PathLike[str] | str, meta: IndexMeta, sections: dict[str, npt.NDArray[Any]]) -> None:
+    # Write the sections (little endian numpy arrays) after the fixed header
+    # and the section table. The file is replaced atomically so a reader never
+    # sees a partial index.
+    idx_path = Path(idx_path)
+    arrays = [(name, np.ascontiguousarray(arr).reshape(-1)) for name, arr in sections.items()]
+    offs = _INDEX_HEADER.size + _INDEX_SECTION.size * len(arrays)
+    table = []
+    for name, arr in arrays:
+        offs += -offs % _INDEX_SECTION_ALIGNMENT
+        dtype = arr.dtype.newbyteorder('<').str.encode('ascii')
+        table.append(_INDEX_SECTION.pack(name.encode('ascii'), dtype, offs, len(arr)))
+        offs += arr.nbytes
+
+    tmp_path = idx_path.with_name(idx_path.name + f'.{os.getpid()}.tmp')
+    idx_path.parent.mkdir(parents = True, exist_ok = True)
+    with open(tmp_path, 'wb') as f:
+        f.write(_INDEX_HEADER.pack(
+            INDEX_MAGIC, INDEX_VERSION, meta.file_size, meta.mtime_ns, meta.checksum, meta.header_end,
+            meta.byte_order.encode('ascii'), meta.version, meta.alignment, meta.data_offset, len(arrays),
+        ))
+        for entry in table:
+            f.write(entry)
+        for name, arr in arrays:
+            f.write(bytes(-f.tell() % _INDEX_SECTION_ALIGNMENT))
+            f.write(arr.astype(arr.dtype.newbyteorder('<'), copy = False).tobytes())
+    os.replace(tmp_path, idx_path)
+
+
+def read_index(idx_path: os.PathLike[str] | str) -> tuple[IndexMeta, dict[str, npt.NDArray[Any]]] | None:
+    # Map an index file, returns None when it is missing or not readable.
+    # The sections are views of the mapping.
+    try:
+        data = np.memmap(idx_path, mode = 'r')
+    except (OSError, ValueError):
+        return None
+    buf = memoryview(data)
+    try:
+        (
+            magic, version, file_size, mtime_ns, checksum, header_end,
+            byte_order, gguf_version, alignment, data_offset, n_sections,
+        ) = _INDEX_HEADER.unpack_from(buf, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            return None
+
+        sections: dict[str, npt.NDArray[Any]] = {}
+        for i in range(n_sections):
+            name, dtype, offs, count = _INDEX_SECTION.unpack_from(buf, _INDEX_HEADER.size + _INDEX_SECTION.size * i)
+            np_dtype = np.dtype(dtype.rstrip(b'\0').decode('ascii'))
+            if offs + count * np_dtype.itemsize > len(buf):
+                return None
+            sections[name.rstrip(b'\0').decode('ascii')] = data[offs:offs + count * np_dtype.itemsize].view(np_dtype)
+        meta = IndexMeta(
+            file_size, mtime_ns, checksum, header_end,
+            byte_order.decode('ascii'), gguf_version, alignment, data_offset,
+        )
+    except (struct.error, TypeError, UnicodeDecodeError):
+        # Truncated or garbled index
+        return None
+    return meta, sections
+
+
+def main() -> None:
+    import argparse
+    import logging
+
+    from .gguf_reader import GGUFReader
+
+    parser = argparse.ArgumentParser(description = 'Write header indexes of GGUF files for faster opening')
+    parser.add_argument('models', nargs = '+', help = 'GGUF files to index')
+    parser.add_argument('--index-dir', help = f'directory of the index files (default: ${INDEX_DIR_ENV}, or next to the models)')
+    args = parser.parse_args()
+    logging.basicConfig(level = logging.INFO)
+
+    for model in args.models:
+        reader = GGUFReader(model, lazy_tensors = True, use_index = False)
+        idx_path = reader.save_index(args.index_dir)
+        logging.info(f'{model}: wrote {idx_path} ({idx_path.stat().st_size} bytes)')
+
+
+if __name__ == '__main__':
+    main()
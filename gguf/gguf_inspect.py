@@ -0,0 +1,142 @@
+#
+# Summaries of GGUF files from their headers, for catalogs and dashboards
+# that look at many models.
+#
+# inspect_file is the plain blocking call. GGUFInspector runs it for asyncio
+# applications on a bounded thread pool, with a limit on the concurrent
+# reads per device so one slow disk or network mount does not take all the
+# threads. The header is read with pread in a few growing chunks, see
+# GGUFReader(header_io = 'pread'), and the tensor data is never mapped.
+#
+from __future__ import annotations
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterable, NamedTuple
+
+from .constants import GGMLQuantizationType, Keys
+from .gguf_reader import GGUFReader
+
+# Default limits of GGUFInspector.
+INSPECT_MAX_WORKERS = 32
+INSPECT_PER_DEVICE = 16
+
+
+class GGUFSummary(NamedTuple):
+    path: Path
+    file_size: int
+    version: int
+    architecture: str | None
+    name: str | None
+    context_length: int | None
+    block_count: int | None
+    vocab_size: int | None
+    kv_count: int
+    tensor_count: int
+
+    # Total number of weights and bytes of tensor data.
+    n_elements: int
+    n_bytes: int
+
+    # Tensor data bytes per tensor type name.
+    bytes_by_type: dict[str, int]
+
+    alignment: int
+    data_offset: int
+
+
+def _scalar(reader: GGUFReader, key: str) -> Any:
+    field = reader.get_field(key)
+    return None if field is None else field.contents()
+
+
+def summarize(reader: GGUFReader, file_size: int | None = None) -> GGUFSummary:
+    arch = _scalar(reader, Keys.General.ARCHITECTURE)
+    tokens = Keys.Tokenizer.LIST
+    selection = reader.select_tensors()
+    return GGUFSummary(
+        path = Path(reader.path),
+        file_size = file_size if file_size is not None else os.path.getsize(reader.path),
+        version = int(_scalar(reader, 'GGUF.version')),
+        architecture = arch,
+        name = _scalar(reader, Keys.General.NAME),
+        context_length = _scalar(reader, Keys.LLM.CONTEXT_LENGTH.format(arch = arch)) if arch else None,
+        block_count = _scalar(reader, Keys.LLM.BLOCK_COUNT.format(arch = arch)) if arch else None,
+        vocab_size = reader.fields.item_count(tokens) if tokens in reader.fields else None,
+        kv_count = int(_scalar(reader, 'GGUF.kv_count')),
+        tensor_count = len(selection),
+        n_elements = selection.total_elements(),
+        n_bytes = selection.total_bytes(),
+        bytes_by_type = {GGMLQuantizationType(t).name: n for t, n in selection.bytes_by_type().items()},
+        alignment = int(reader.alignment),
+        data_offset = reader.data_offset,
+    )
+
+
+def inspect_file(path: os.PathLike[str] | str) -> GGUFSummary:
+    reader = GGUFReader(path, 'r', lazy_tensors = True, header_io = 'pread')
+    return summarize(reader)
+
+
+class GGUFInspector:
+    # Asyncio front end of inspect_file. Reads run on a thread pool of
+    # max_workers threads, at most per_device of them on the same device
+    # (st_dev), so the event loop never blocks on file I/O.
+
+    def __init__(self, max_workers: int = INSPECT_MAX_WORKERS, per_device: int = INSPECT_PER_DEVICE):
+        self.executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = 'gguf-inspect')
+        self.per_device = per_device
+        self._device_limits: dict[int, asyncio.Semaphore] = {}
+
+    async def __aenter__(self) -> GGUFInspector:
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.executor.shutdown(wait = False, cancel_futures = True)
+
+    async def inspect(self, path: os.PathLike[str] | str) -> GGUFSummary:
+        loop = asyncio.get_running_loop()
+        st = await loop.run_in_executor(self.executor, os.stat, path)
+        limit = self._device_limits.get(st.st_dev)
+        if limit is None:
+            limit = self._device_limits[st.st_dev] = asyncio.Semaphore(self.per_device)
+        async with limit:
+            return await loop.run_in_executor(self.executor, inspect_file, path)
+
+    # Inspect many files concurrently, the results are in the order of paths.
+    # With return_exceptions, files that can not be read give their exception
+    # instead of failing the whole call.
+    async def inspect_many(
+        self, paths: Iterable[os.PathLike[str] | str], return_exceptions: bool = False,
+    ) -> list[GGUFSummary | BaseException]:
+        return await asyncio.gather(*(self.inspect(path) for path in paths), return_exceptions = return_exceptions)
+
+
+def main() -> None:
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description = 'Print header summaries of GGUF files as NDJSON')
+    parser.add_argument('models', nargs = '+', help = 'GGUF files')
+    parser.add_argument('--workers', type = int, default = INSPECT_MAX_WORKERS, help = 'number of reader threads')
+    parser.add_argument('--per-device', type = int, default = INSPECT_PER_DEVICE, help = 'concurrent reads per device')
+    args = parser.parse_args()
+
+    async def run() -> list[GGUFSummary | BaseException]:
+        async with GGUFInspector(args.workers, args.per_device) as inspector:
+            return await inspector.inspect_many(args.models, return_exceptions = True)
+
+    for model, result in zip(args.models, asyncio.run(run())):
+        if isinstance(result, BaseException):
+            print(json.dumps({'path': model, 'error': str(result)}))
+        else:
+            print(json.dumps(result._asdict(), default = str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+#
+# Integrity checking of GGUF files against a manifest of per-tensor digests.
+#
+# Every tensor's byte range is hashed on its own, in a thread pool: hashlib
+# releases the GIL while hashing, so throughput scales with the number of
+# threads until the disk is the limit. The manifest is a JSON sidecar file
+# (model.gguf.manifest.json) holding a digest of the header and one per
+# tensor, which tells which tensor is damaged instead of just that the file
+# is.
+#
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, NamedTuple
+
+from .gguf_reader import GGUFReader
+
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = '.manifest.json'
+
+# Size of the reads, large enough for sequential disk throughput.
+INTEGRITY_CHUNK_SIZE = 8 << 20
+
+
+class TensorDigest(NamedTuple):
+    name: str
+
+    # Absolute offset of the tensor data in the file.
+    offset: int
+
+    n_bytes: int
+    digest: str
+
+
+class IntegrityReport(NamedTuple):
+    path: Path
+    header_ok: bool
+
+    # Tensors whose data does not match the manifest, in file order. Checking
+    # stops at the first one unless all mismatches were asked for.
+    corrupt: list[str]
+
+    # Tensors of the file missing from the manifest and the other way around.
+    unexpected: list[str]
+    missing: list[str]
+
+    @property
+    def ok(self) -> bool:
+        return self.header_ok and not self.corrupt and not self.unexpected and not self.missing
+
+    @property
+    def first_corrupt(self) -> str | None:
+        return self.corrupt[0] if self.corrupt else None
+
+    def describe(self) -> str:
+        if self.ok:
+            return f'{self.path.name}: OK'
+        problems = []
+        if not self.header_ok:
+            problems.append('header differs from the manifest')
+        if self.corrupt:
+            problems.append(f'tensor {self.corrupt[0]} is corrupt')
+        if self.missing:
+            problems.append(f'{len(self.missing)} tensor(s) missing, e.g. {self.missing[0]}')
+        if self.unexpected:
+            problems.append(f'{len(self.unexpected)} tensor(s) not in the manifest, e.g. {self.unexpected[0]}')
+        return f'{self.path.name}: {", ".join(problems)}'
+
+
+def manifest_path(path: os.PathLike[str] | str) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + MANIFEST_SUFFIX)
+
+
+def hash_range(
+    path: os.PathLike[str] | str, offset: int, n_bytes: int, algorithm: str = 'sha256',
+    chunk_size: int = INTEGRITY_CHUNK_SIZE,
+) -> str:
+    # Digest of a byte range of a file. A range running past the end of the
+    # file gets a digest of what is there plus a marker, so it never matches.
+    digest = hashlib.new(algorithm)
+    buf = bytearray(min(chunk_size, max(n_bytes, 1)))
+    view = memoryview(buf)
+    remaining = n_bytes
+    with open(path, 'rb', buffering = 0) as f:
+        f.seek(offset)
+        while remaining > 0:
+            n_read = f.readinto(view[:min(remaining, len(buf))])
+            if not n_read:
+                digest.update(b'truncated')
+                break
+            digest.update(view[:n_read])
+            remaining -= n_read
+    return digest.hexdigest()
+
+
+def _tensor_ranges(reader: GGUFReader) -> list[tuple[str, int, int]]:
+    table = reader.tensor_table
+    ranges = zip(table.names, table.data_offsets.tolist(), table.n_bytes.tolist())
+    return sorted(ranges, key = lambda r: r[1])
+
+
+def compute_digests(
+    path: os.PathLike[str] | str, algorithm: str = 'sha256', max_workers: int | None = None,
+    stop: Callable[[TensorDigest], bool] | None = None,
+) -> tuple[str, list[TensorDigest]]:
+    # Hash the header and every tensor, returns the header digest and the
+    # tensor digests in file order. When stop returns True for a tensor
+    # digest, the digests of the tensors after it are not computed.
+    reader = GGUFReader(path, lazy_tensors = True)
+    header_digest = hash_range(path, 0, reader.data_offset, algorithm)
+    ranges = _tensor_ranges(reader)
+    del reader
+
+    workers = max_workers if max_workers is not None else min(32, (os.cpu_count() or 1) + 4)
+    digests: list[TensorDigest] = []
+    with ThreadPoolExecutor(max_workers = workers) as executor:
+        # Submitted in file order, so neighbouring reads stay close together
+        futures: list[Future[str]] = [
+            executor.submit(hash_range, path, offset, n_bytes, algorithm)
+            for _name, offset, n_bytes in ranges
+        ]
+        try:
+            for (name, offset, n_bytes), future in zip(ranges, futures):
+                tensor_digest = TensorDigest(name, offset, n_bytes, future.result())
+                digests.append(tensor_digest)
+                if stop is not None and stop(tensor_digest):
+                    break
+        finally:
+            for future in futures:
+                future.cancel()
+    return header_digest, digests
+
+
+def write_manifest(
+    path: os.PathLike[str] | str, algorithm: str = 'sha256', max_workers: int | None = None,
+) -> Path:
+    header_digest, digests = compute_digests(path, algorithm, max_workers)
+    manifest: dict[str, Any] = {
+        'version': MANIFEST_VERSION,
+        'algorithm': algorithm,
+        'file_size': os.path.getsize(path),
+        'header': header_digest,
+        'tensors': {d.name: {'offset': d.offset, 'n_bytes': d.n_bytes, 'digest': d.digest} for d in digests},
+    }
+    out_path = manifest_path(path)
+    tmp_path = out_path.with_name(out_path.name + '.tmp')
+    with open(tmp_path, 'w', encoding = 'utf-8') as f:
+        json.dump(manifest, f, indent = 1)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def read_manifest(path: os.PathLike[str] | str) -> dict[str, Any]:
+    with open(manifest_path(path), 'r', encoding = 'utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f'Unsupported manifest version {manifest.get("version")}')
+    return manifest
+
+
+def verify_manifest(
+    path: os.PathLike[str] | str, max_workers: int | None = None, all_mismatches: bool = False,
+) -> IntegrityReport:
+    # Check a file against its manifest. Unless all_mismatches is set, hashing
+    # stops at the first corrupt tensor.
+    path = Path(path)
+    manifest = read_manifest(path)
+    expected: dict[str, dict[str, Any]] = manifest['tensors']
+    corrupt: list[str] = []
+    seen: set[str] = set()
+
+    def check(tensor_digest: TensorDigest) -> bool:
+        seen.add(tensor_digest.name)
+        entry = expected.get(tensor_digest.name)
+        if entry is None:
+            return False
+        if (entry['offset'], entry['n_bytes'], entry['digest']) != tensor_digest[1:]:
+            corrupt.append(tensor_digest.name)
+            return not all_mismatches
+        return False
+
+    header_digest, digests = compute_digests(path, manifest['algorithm'], max_workers, check)
+    names = [d.name for d in digests]
+    unexpected = [name for name in names if name not in expected]
+    # Tensors after an early stop were not looked at, they are not missing
+    missing = [] if corrupt and not all_mismatches else [name for name in expected if name not in seen]
+    return IntegrityReport(path, header_digest == manifest['header'], corrupt, unexpected, missing)
+
+
+def main() -> None:
+    import argparse
+    import sys
+    import time
+
+    parser = argparse.ArgumentParser(description = 'Write or verify per-tensor digest manifests of GGUF files')
+    parser.add_argument('command', choices = ('write', 'verify'))
+    parser.add_argument('models', nargs = '+', help = 'GGUF files')
+    parser.add_argument('--threads', type = int, default = None, help = 'number of hashing threads')
+    parser.add_argument('--algorithm', default = 'sha256', help = 'hashlib algorithm of new manifests')
+    parser.add_argument('--all', action = 'store_true', help = 'report every corrupt tensor, not only the first one')
+    args = parser.parse_args()
+
+    failed = False
+    for model in args.models:
+        start = time.perf_counter()
+        if args.command == 'write':
+            out_path = write_manifest(model, args.algorithm, args.threads)
+            message = f'{model}: wrote {out_path}'
+        else:
+            report = verify_manifest(model, args.threads, args.all)
+            failed = failed or not report.ok
+            message = report.describe()
+        elapsed = time.perf_counter() - start
+        size_mb = os.path.getsize(model) / 1e6
+        print(f'{message} ({size_mb:.0f} MB in {elapsed:.1f}s, {size_mb / max(elapsed, 1e-9):.0f} MB/s)')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,13 +6,18 @@ from __future__ import annotations
 
 import logging
 import os
+import re
+import struct
+from array import array
+from fnmatch import fnmatchcase
 import sys
-from collections import OrderedDict
-from typing import Any, Literal, NamedTuple, TypeVar, Union
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Literal, Mapping, NamedTuple, Sequence, TypeVar, Union, overload
 
 import numpy as np
 import numpy.typing as npt
 
+from .gguf_index import IndexMeta, decode_names, encode_names, header_checksum, index_path, read_at, read_index, write_index
 from .quants import quant_shape_to_byte_shape
 
 if __name__ == "__main__":
@@ -35,6 +40,15 @@ logger = logging.getLogger(__name__)
 
 READER_SUPPORTED_VERSIONS = [2, GGUF_VERSION]
 
+# Same as GGML_MAX_DIMS in ggml.h
+READER_MAX_DIMS = 4
+
+# First read of the pread based header parser, grown as the header needs.
+READER_HEADER_CHUNK = 1 << 20
+
+# Block id of per-layer tensors, e.g. blk.12.attn_q.weight
+READER_BLOCK_ID_PATTERN = re.compile(r'^blk\.(\d+)\.')
+
 
 class ReaderField(NamedTuple):
     # Offset to start of this field.
@@ -45,20 +59,48 @@ class ReaderField(NamedTuple):
 
     # Data parts. Some types have multiple components, such as strings
     # that consist of a length followed by the string data.
-    parts: list[npt.NDArray[Any]] = []
+    parts: Sequence[npt.NDArray[Any]] = []
 
     # Indexes into parts that we can call the actual data. For example
     # an array of strings will be populated with indexes to the actual
     # string data.
-    data: list[int] = [-1]
+    #
+    # For flat (non-nested) arrays parts and data are lazy sequences with
+    # the same layout, the views of the items are only created on access.
+    data: Sequence[int] = [-1]
 
     types: list[GGUFValueType] = []
 
+    # Flat arrays only: a single view of all values, for string arrays of all
+    # the length prefixed strings.
+    values: npt.NDArray[Any] | None = None
+
+    # String arrays only: the offset of every string in values, and of the end.
+    string_offsets: npt.NDArray[np.uint64] | None = None
+
     def contents(self, index_or_slice: int | slice = slice(None)) -> Any:
         if self.types:
             to_string = lambda x: str(x.tobytes(), encoding='utf-8') # noqa: E731
             main_type = self.types[0]
 
+            if self.values is not None:
+                values = self.values
+                offsets = self.string_offsets
+
+                if offsets is not None:
+                    # values is the byte buffer of all strings, each one
+                    # starting with its 8 bytes length at the given offset
+                    if isinstance(index_or_slice, int):
+                        idx = range(len(offsets) - 1)[index_or_slice]
+                        return to_string(values[int(offsets[idx]) + 8:int(offsets[idx + 1])])
+                    else:
+                        raw = values.tobytes()
+                        starts = (offsets[:-1][index_or_slice] + 8).tolist()
+                        ends = offsets[1:][index_or_slice].tolist()
+                        return [str(raw[start:end], encoding='utf-8') for start, end in zip(starts, ends)]
+                else:
+                    return values[index_or_slice].tolist()
+
             if main_type == GGUFValueType.ARRAY:
                 sub_type = self.types[-1]
 
@@ -108,12 +150,423 @@ class ReaderTensor(NamedTuple):
     field: ReaderField
 
 
+# Lookup tables to compute tensor sizes from type ids in one vectorized step
+_QUANT_TYPE_IDS = np.array([int(t) for t in GGML_QUANT_SIZES], dtype = np.uint32)
+_QUANT_BLOCK_SIZES = np.ones(int(_QUANT_TYPE_IDS.max()) + 1, dtype = np.uint64)
+_QUANT_TYPE_SIZES = np.zeros(int(_QUANT_TYPE_IDS.max()) + 1, dtype = np.uint64)
+for _qtype, (_block_size, _type_size) in GGML_QUANT_SIZES.items():
+    _QUANT_BLOCK_SIZES[_qtype] = _block_size
+    _QUANT_TYPE_SIZES[_qtype] = _type_size
+
+
+class ReaderTensorTable:
+    # Tensor info of a GGUF file kept in parallel arrays, one entry per tensor,
+    # so no per-tensor objects need to be created to answer questions about
+    # names, shapes, types or sizes.
+
+    def __init__(
+        self, names: list[str], field_offsets: Sequence[int], dims: Sequence[Sequence[int]],
+        n_dims: Sequence[int], types: Sequence[int], offsets: Sequence[int], data_offset: int,
+    ):
+        count = len(names)
+        self.names = names
+
+        # Offset of the tensor info in the file.
+        self.field_offsets = np.array(field_offsets, dtype = np.uint64)
+
+        # Dimensions in GGUF order (fastest varying first), unused ones are 1.
+        self.dims = np.array(dims, dtype = np.uint64).reshape(count, READER_MAX_DIMS)
+        self.n_dims = np.array(n_dims, dtype = np.uint32)
+        self.types = np.array(types, dtype = np.uint32)
+
+        # Offsets relative to the start of the tensor data, and absolute ones.
+        self.offsets = np.array(offsets, dtype = np.uint64)
+        self.data_offsets = self.offsets + np.uint64(data_offset)
+
+        known_types = np.isin(self.types, _QUANT_TYPE_IDS)
+        if not known_types.all():
+            idx = int(np.argmin(known_types))
+            raise ValueError(f'Tensor {names[idx]} has unknown type {int(self.types[idx])}')
+        self.n_elements = np.prod(self.dims, axis = 1, dtype = np.uint64)
+        self.n_bytes = self.n_elements * _QUANT_TYPE_SIZES[self.types] // _QUANT_BLOCK_SIZES[self.types]
+
+        self._name_index: dict[str, int] | None = None
+        self._block_ids: npt.NDArray[np.int64] | None = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # Index of the tensor with the given name, None when there is none.
+    def find(self, name: str) -> int | None:
+        if self._name_index is None:
+            self._name_index = {tensor_name: idx for idx, tensor_name in enumerate(self.names)}
+        return self._name_index.get(name)
+
+    # Block (layer) id of every tensor, -1 for tensors outside the blocks.
+    @property
+    def block_ids(self) -> npt.NDArray[np.int64]:
+        if self._block_ids is None:
+            matches = (READER_BLOCK_ID_PATTERN.match(name) for name in self.names)
+            self._block_ids = np.array([int(m.group(1)) if m else -1 for m in matches], dtype = np.int64)
+        return self._block_ids
+
+    @classmethod
+    def from_index(cls, sections: Mapping[str, npt.NDArray[Any]], data_offset: int) -> ReaderTensorTable:
+        return cls(
+            decode_names(sections['tensor_name_offsets'], sections['tensor_name_data']),
+            sections['tensor_field_offsets'], sections['tensor_dims'], sections['tensor_n_dims'],
+            sections['tensor_types'], sections['tensor_offsets'], data_offset = data_offset,
+        )
+
+    def index_sections(self) -> dict[str, npt.NDArray[Any]]:
+        # The arrays stored in a header index, see from_index.
+        name_offsets, name_data = encode_names(self.names)
+        return {
+            'tensor_name_offsets': name_offsets,
+            'tensor_name_data': name_data,
+            'tensor_field_offsets': self.field_offsets,
+            'tensor_dims': self.dims,
+            'tensor_n_dims': self.n_dims,
+            'tensor_types': self.types,
+            'tensor_offsets': self.offsets,
+        }
+
+    def shape(self, idx: int) -> tuple[int, ...]:
+        return tuple(int(d) for d in self.dims[idx, :self.n_dims[idx]])
+
+
+class ReaderTensorList(Sequence[ReaderTensor]):
+    # Read-only list of the tensors of a GGUFReader opened with
+    # lazy_tensors = True. A ReaderTensor, including its memmap view of the
+    # data, is only created when it is accessed.
+
+    def __init__(self, reader: GGUFReader):
+        self.reader = reader
+
+    def __len__(self) -> int:
+        return len(self.reader.tensor_table)
+
+    @overload
+    def __getitem__(self, idx: int) -> ReaderTensor: ...
+    @overload
+    def __getitem__(self, idx: slice) -> list[ReaderTensor]: ...
+
+    def __getitem__(self, idx: int | slice) -> ReaderTensor | list[ReaderTensor]:
+        if isinstance(idx, slice):
+            return [self.reader._make_tensor(i) for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('tensor index out of range')
+        return self.reader._make_tensor(idx)
+
+
+class ReaderTensorSelection(Sequence[ReaderTensor]):
+    # A subset of the tensors of a GGUFReader, as indexes into its tensor
+    # table. Names, types and sizes of the selection are answered from the
+    # table; ReaderTensor objects are only created when items are accessed.
+
+    def __init__(self, reader: GGUFReader, indices: npt.ArrayLike):
+        self.reader = reader
+        self.indices = np.asarray(indices, dtype = np.int64)
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    @overload
+    def __getitem__(self, idx: int) -> ReaderTensor: ...
+    @overload
+    def __getitem__(self, idx: slice) -> ReaderTensorSelection: ...
+
+    def __getitem__(self, idx: int | slice) -> ReaderTensor | ReaderTensorSelection:
+        if isinstance(idx, slice):
+            return ReaderTensorSelection(self.reader, self.indices[idx])
+        return self.reader.tensors[int(self.indices[idx])]
+
+    @property
+    def names(self) -> list[str]:
+        names = self.reader.tensor_table.names
+        return [names[idx] for idx in self.indices.tolist()]
+
+    @property
+    def types(self) -> npt.NDArray[np.uint32]:
+        return self.reader.tensor_table.types[self.indices]
+
+    @property
+    def n_elements(self) -> npt.NDArray[np.uint64]:
+        return self.reader.tensor_table.n_elements[self.indices]
+
+    @property
+    def n_bytes(self) -> npt.NDArray[np.uint64]:
+        return self.reader.tensor_table.n_bytes[self.indices]
+
+    def total_bytes(self) -> int:
+        return int(self.n_bytes.sum(dtype = np.uint64))
+
+    def total_elements(self) -> int:
+        return int(self.n_elements.sum(dtype = np.uint64))
+
+    # Total size in bytes per tensor type.
+    def bytes_by_type(self) -> dict[GGMLQuantizationType, int]:
+        types, inverse = np.unique(self.types, return_inverse = True)
+        totals = np.zeros(len(types), dtype = np.uint64)
+        np.add.at(totals, inverse, self.n_bytes)
+        return {GGMLQuantizationType(int(t)): int(total) for t, total in zip(types, totals)}
+
+    def select(
+        self, pattern: str | None = None, *, regex: str | re.Pattern[str] | None = None,
+        block: int | Iterable[int] | None = None,
+        tensor_type: GGMLQuantizationType | Iterable[GGMLQuantizationType] | None = None,
+    ) -> ReaderTensorSelection:
+        # Narrow the selection down to the tensors matching all the given
+        # criteria: a glob pattern on the name (e.g. blk.*.ffn_*_exps.weight),
+        # a regular expression searched in the name, block id(s) and type(s).
+        table = self.reader.tensor_table
+        indices = self.indices
+        if block is not None:
+            blocks = [block] if isinstance(block, int) else list(block)
+            indices = indices[np.isin(table.block_ids[indices], blocks)]
+        if tensor_type is not None:
+            types = [tensor_type] if isinstance(tensor_type, int) else list(tensor_type)
+            indices = indices[np.isin(table.types[indices], np.array(types, dtype = np.uint32))]
+        if pattern is not None or regex is not None:
+            compiled = re.compile(regex) if isinstance(regex, str) else regex
+            names = table.names
+            keep = [
+                (pattern is None or fnmatchcase(names[idx], pattern))
+                and (compiled is None or compiled.search(names[idx]) is not None)
+                for idx in indices.tolist()
+            ]
+            indices = indices[np.array(keep, dtype = np.bool_)]
+        return ReaderTensorSelection(self.reader, indices)
+
+
+class ReaderFieldParts(Sequence[npt.NDArray[Any]]):
+    # The parts of a flat array field, laid out as for any other field: the
+    # leading parts (key, value type, item type and length) followed by one
+    # view per number, or a length and a data view per string. The views of
+    # the items are created on access, so looking up a field holding the
+    # vocab does not create a million views.
+
+    def __init__(
+        self, reader: GGUFReader, head: list[npt.NDArray[Any]], items_offset: int, count: int,
+        item_nptype: type[np.generic] | None, string_offsets: npt.NDArray[np.uint64] | None,
+    ):
+        self.reader = reader
+        self.head = head
+        self.items_offset = items_offset
+        self.count = count
+        self.item_nptype = item_nptype
+        self.string_offsets = string_offsets
+        self.item_parts = 1 if string_offsets is None else 2
+
+    def __len__(self) -> int:
+        return len(self.head) + self.count * self.item_parts
+
+    @overload
+    def __getitem__(self, idx: int) -> npt.NDArray[Any]: ...
+    @overload
+    def __getitem__(self, idx: slice) -> list[npt.NDArray[Any]]: ...
+
+    def __getitem__(self, idx: int | slice) -> npt.NDArray[Any] | list[npt.NDArray[Any]]:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        idx = range(len(self))[idx]
+        if idx < len(self.head):
+            return self.head[idx]
+        item, part = divmod(idx - len(self.head), self.item_parts)
+        if self.string_offsets is None:
+            assert self.item_nptype is not None
+            itemsize = np.dtype(self.item_nptype).itemsize
+            return self.reader._get(self.items_offset + item * itemsize, self.item_nptype)
+        start = self.items_offset + int(self.string_offsets[item])
+        if part == 0:
+            return self.reader._get(start, np.uint64)
+        return self.reader._get(start + 8, np.uint8, int(self.string_offsets[item + 1]) - int(self.string_offsets[item]) - 8)
+
+
+class ReaderFieldStore(Mapping[str, ReaderField]):
+    # Compact storage of the key/value fields of a GGUFReader. Every field is
+    # a slot in a few parallel numpy arrays (offsets, types, counts, sizes),
+    # names live in one interned table, and the offsets of all string arrays
+    # share one array. ReaderField objects, with their views of the file, are
+    # only created when a field is looked up and are not kept around.
+
+    # Item type of fields that are not arrays.
+    NO_ITEM_TYPE = 0xFFFFFFFF
+
+    def __init__(self, reader: GGUFReader):
+        self.reader = reader
+        self.names: list[str] = []
+        self._index: dict[str, int] = {}
+        self._slots: list[tuple[int, int, int, int, int, int]] = []
+        self._string_offsets_starts: list[int] = []
+        self._string_offsets: list[npt.NDArray[np.uint64]] = []
+        self._string_offsets_len = 0
+        self.freeze()
+
+    def add(
+        self, name: str, offset: int, value_offset: int, vtype: int, item_type: int = NO_ITEM_TYPE,
+        count: int = 1, nbytes: int = 0, string_offsets: npt.NDArray[np.uint64] | None = None,
+    ) -> int:
+        # Add a field, where offset is the start of the field and value_offset
+        # the start of its value (the same for the GGUF.* header pseudo fields).
+        # Returns nbytes, the size of the whole field in the file.
+        if name in self._index:
+            # TODO: add option to generate error on duplicate keys
+            # raise KeyError(f'Duplicate {name} already in list at offset {offset}')
+
+            logger.warning(f'Duplicate key {name} at offset {offset}')
+            name = name + '_{}'.format(offset)
+        name = sys.intern(name)
+        self._index[name] = len(self.names)
+        self.names.append(name)
+
+        string_offsets_start = -1
+        if string_offsets is not None:
+            string_offsets_start = self._string_offsets_len
+            self._string_offsets.append(string_offsets)
+            self._string_offsets_len += len(string_offsets)
+        self._slots.append((offset, value_offset, vtype, item_type, count, nbytes))
+        self._string_offsets_starts.append(string_offsets_start)
+        return nbytes
+
+    def freeze(self) -> None:
+        # Move the slots added so far into the compact arrays.
+        slots = np.array(self._slots, dtype = np.uint64).reshape(-1, 6)
+        self.offsets = slots[:, 0].copy()
+        self.value_offsets = slots[:, 1].copy()
+        self.types = slots[:, 2].astype(np.uint32)
+        self.item_types = slots[:, 3].astype(np.uint32)
+        self.counts = slots[:, 4].copy()
+        self.nbytes = slots[:, 5].copy()
+        self.string_offsets_start = np.array(self._string_offsets_starts, dtype = np.int64)
+        self.string_offsets = np.concatenate(self._string_offsets) if self._string_offsets else np.empty(0, dtype = np.uint64)
+        self._string_offsets = [self.string_offsets]
+
+    def restore(self, sections: Mapping[str, npt.NDArray[Any]]) -> None:
+        # Take over the arrays of a header index instead of adding the fields
+        # one by one. The arrays stay views of the mapped index file.
+        self.names = [sys.intern(name) for name in decode_names(sections['field_name_offsets'], sections['field_name_data'])]
+        self._index = {name: slot for slot, name in enumerate(self.names)}
+        self.offsets = sections['field_offsets']
+        self.value_offsets = sections['field_value_offsets']
+        self.types = sections['field_types']
+        self.item_types = sections['field_item_types']
+        self.counts = sections['field_counts']
+        self.nbytes = sections['field_nbytes']
+        self.string_offsets_start = sections['field_string_offsets_start']
+        self.string_offsets = sections['field_string_offsets']
+        self._string_offsets = [self.string_offsets]
+
+    def index_sections(self) -> dict[str, npt.NDArray[Any]]:
+        # The arrays stored in a header index, see restore.
+        name_offsets, name_data = encode_names(self.names)
+        return {
+            'field_name_offsets': name_offsets,
+            'field_name_data': name_data,
+            'field_offsets': self.offsets,
+            'field_value_offsets': self.value_offsets,
+            'field_types': self.types,
+            'field_item_types': self.item_types,
+            'field_counts': self.counts,
+            'field_nbytes': self.nbytes,
+            'field_string_offsets_start': self.string_offsets_start,
+            'field_string_offsets': self.string_offsets,
+        }
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._index
+
+    def __getitem__(self, key: str) -> ReaderField:
+        return self._make_field(self._index[key])
+
+    # Number of items of an array field (the length of a string field, 1 for
+    # other fields), without creating the field.
+    def item_count(self, key: str) -> int:
+        return int(self.counts[self._index[key]])
+
+    # File offsets of a field: its start, the start of its value (after the
+    # value type) and its end.
+    def span(self, key: str) -> tuple[int, int, int]:
+        slot = self._index[key]
+        offs = int(self.offsets[slot])
+        return offs, int(self.value_offsets[slot]), offs + int(self.nbytes[slot])
+
+    # Bytes of a field in the file from its value type (its value for the
+    # GGUF.* header pseudo fields) to its end, without creating the field.
+    def raw_value(self, key: str) -> npt.NDArray[np.uint8]:
+        start, value_start, end = self.span(key)
+        if value_start != start:
+            value_start -= 4
+        return self.reader._get(value_start, np.uint8, end - value_start)
+
+    def _make_field(self, slot: int) -> ReaderField:
+        reader = self.reader
+        offs = int(self.offsets[slot])
+        value_offs = int(self.value_offsets[slot])
+        parts: list[npt.NDArray[Any]] = []
+        if value_offs != offs:
+            kv_klen, kv_kdata = reader._get_str(offs)
+            parts += [kv_klen, kv_kdata, reader._get(value_offs - 4, np.uint32)]
+        idxs_offs = len(parts)
+
+        vtype = int(self.types[slot])
+        item_type = int(self.item_types[slot])
+        string_offsets_start = int(self.string_offsets_start[slot])
+        item_nptype = reader.gguf_scalar_to_np.get(GGUFValueType(item_type)) if vtype == GGUFValueType.ARRAY else None
+        if item_nptype is None and string_offsets_start < 0:
+            _size, field_parts, field_idxs, field_types = reader._get_field_parts(value_offs, vtype)
+            return ReaderField(
+                offs,
+                self.names[slot],
+                parts + field_parts,
+                [idx + idxs_offs for idx in field_idxs],
+                field_types,
+            )
+
+        # Flat array: one view of all values, and the parts of the items
+        # only created on access
+        count = int(self.counts[slot])
+        parts += [reader._get(value_offs, np.uint32), reader._get(value_offs + 4, np.uint64)]
+        items_offs = value_offs + 12
+        string_offsets = None
+        if string_offsets_start >= 0:
+            # String array, reuse the offsets found when opening the file
+            string_offsets = self.string_offsets[string_offsets_start:string_offsets_start + count + 1]
+            values = reader._get(items_offs, np.uint8, string_offsets[-1])
+        else:
+            assert item_nptype is not None
+            values = reader._get(items_offs, item_nptype, count)
+        field_parts = ReaderFieldParts(reader, parts, items_offs, count, item_nptype, string_offsets)
+        first_data = len(parts) + field_parts.item_parts - 1
+        return ReaderField(
+            offs,
+            self.names[slot],
+            field_parts,
+            range(first_data, len(field_parts), field_parts.item_parts),
+            # Like the per-item parser, an empty array has no item type
+            [GGUFValueType.ARRAY, GGUFValueType(item_type)] if count else [GGUFValueType.ARRAY],
+            values,
+            string_offsets,
+        )
+
+
 class GGUFReader:
     # I - same as host, S - swapped
     byte_order: Literal['I', 'S'] = 'I'
     alignment: int = GGUF_DEFAULT_ALIGNMENT
     data_offset: int
 
+    # End of the tensor infos, where the padding before the tensor data starts.
+    header_end: int
+
     # Note: Internal helper, API may change.
     gguf_scalar_to_np: dict[GGUFValueType, type[np.generic]] = {
         GGUFValueType.UINT8:   np.uint8,
@@ -129,57 +582,189 @@ class GGUFReader:
         GGUFValueType.BOOL:    np.bool_,
     }
 
-    def __init__(self, path: os.PathLike[str] | str, mode: Literal['r', 'r+', 'c'] = 'r'):
-        self.data = np.memmap(path, mode = mode)
+    fields: ReaderFieldStore
+    tensor_table: ReaderTensorTable
+    tensors: Sequence[ReaderTensor]
+
+    def __init__(
+        self, path: os.PathLike[str] | str, mode: Literal['r', 'r+', 'c'] = 'r', *,
+        lazy_tensors: bool = False, header_io: Literal['mmap', 'pread'] = 'mmap',
+        use_index: bool = True, index_dir: os.PathLike[str] | str | None = None,
+    ):
+        # With lazy_tensors, only the compact tensor_table is built when
+        # opening and ReaderTensor objects are created on access, which keeps
+        # the open time of files with many tensors independent of their count.
+        #
+        # With header_io = 'pread', the header is read with a few large
+        # os.pread calls into a growing buffer instead of page faulting
+        # through a memmap, which is much faster on network and FUSE file
+        # systems. The file is only memory mapped once tensor data is needed,
+        # so combined with lazy_tensors nothing is mapped when opening.
+        #
+        # With use_index, a header index written by save_index is used
+        # instead of parsing the header when it is still valid for the file.
+        self.path = path
+        self.mode = mode
+        self._data: np.memmap | None = None
+        self._header_fd: int | None = None
+        st = os.stat(path)
+        self._file_stat = (st.st_size, st.st_mtime_ns)
+        if use_index and self._load_index(index_dir):
+            self._init_tensors(lazy_tensors)
+            return
+
+        if header_io == 'pread':
+            if mode != 'r':
+                raise ValueError('header_io = "pread" only supports mode "r"')
+            self._header_fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            self._file_size = os.fstat(self._header_fd).st_size
+            self._hbuf: memoryview | bytearray = bytearray()
+        elif header_io == 'mmap':
+            self._hbuf = memoryview(self.data)
+            self._file_size = len(self._hbuf)
+        else:
+            raise ValueError(f'Unknown header_io {header_io!r}')
+
+        try:
+            self._parse_header()
+        finally:
+            if self._header_fd is not None:
+                os.close(self._header_fd)
+                self._header_fd = None
+        self._init_tensors(lazy_tensors)
+
+    # The memory mapped file, only mapped on first use when the header was
+    # read with pread.
+    @property
+    def data(self) -> np.memmap:
+        if self._data is None:
+            self._data = np.memmap(self.path, mode = self.mode)
+        return self._data
+
+    def _set_endianess(self) -> None:
+        if sys.byteorder == "little":
+            # Host is little endian
+            host_endian = GGUFEndian.LITTLE
+            swapped_endian = GGUFEndian.BIG
+        else:
+            # Sorry PDP or other weird systems that don't use BE or LE.
+            host_endian = GGUFEndian.BIG
+            swapped_endian = GGUFEndian.LITTLE
+        self.endianess = swapped_endian if self.byte_order == "S" else host_endian
+        self._struct_order = '<' if self.endianess == GGUFEndian.LITTLE else '>'
+
+    def _parse_header(self) -> None:
         offs = 0
+        self._header_need(24)
+        buf = self._hbuf
 
         # Check for GGUF magic
-        if self._get(offs, np.uint32, override_order = '<')[0] != GGUF_MAGIC:
+        if struct.unpack_from('<I', buf, offs)[0] != GGUF_MAGIC:
             raise ValueError('GGUF magic invalid')
         offs += 4
 
         # Check GGUF version
-        temp_version = self._get(offs, np.uint32)
-        if temp_version[0] & 65535 == 0:
+        version, = struct.unpack_from('=I', buf, offs)
+        if version & 65535 == 0:
             # If we get 0 here that means it's (probably) a GGUF file created for
             # the opposite byte order of the machine this script is running on.
             self.byte_order = 'S'
-            temp_version = temp_version.view(temp_version.dtype.newbyteorder(self.byte_order))
-        version = temp_version[0]
+            version, = struct.unpack_from('>I' if sys.byteorder == 'little' else '<I', buf, offs)
         if version not in READER_SUPPORTED_VERSIONS:
             raise ValueError(f'Sorry, file appears to be version {version} which we cannot handle')
-        if sys.byteorder == "little":
-            # Host is little endian
-            host_endian = GGUFEndian.LITTLE
-            swapped_endian = GGUFEndian.BIG
-        else:
-            # Sorry PDP or other weird systems that don't use BE or LE.
-            host_endian = GGUFEndian.BIG
-            swapped_endian = GGUFEndian.LITTLE
-        self.endianess = swapped_endian if self.byte_order == "S" else host_endian
-        self.fields: OrderedDict[str, ReaderField] = OrderedDict()
-        self.tensors: list[ReaderTensor] = []
-        offs += self._push_field(ReaderField(offs, 'GGUF.version', [temp_version], [0], [GGUFValueType.UINT32]))
+        self._set_endianess()
+        self.fields = ReaderFieldStore(self)
+        self.tensors = []
+        offs += self.fields.add('GGUF.version', offs, offs, GGUFValueType.UINT32, nbytes = 4)
 
         # Check tensor count and kv count
-        temp_counts = self._get(offs, np.uint64, 2)
-        offs += self._push_field(ReaderField(offs, 'GGUF.tensor_count', [temp_counts[:1]], [0], [GGUFValueType.UINT64]))
-        offs += self._push_field(ReaderField(offs, 'GGUF.kv_count', [temp_counts[1:]], [0], [GGUFValueType.UINT64]))
-        tensor_count, kv_count = temp_counts
+        tensor_count, kv_count = struct.unpack_from(self._struct_order + 'QQ', buf, offs)
+        offs += self.fields.add('GGUF.tensor_count', offs, offs, GGUFValueType.UINT64, nbytes = 8)
+        offs += self.fields.add('GGUF.kv_count', offs, offs, GGUFValueType.UINT64, nbytes = 8)
         offs = self._build_fields(offs, kv_count)
 
-        # Build Tensor Info Fields
-        offs, tensors_fields = self._build_tensor_info(offs, tensor_count)
+        # Build Tensor Info Table
+        offs, tensor_info = self._build_tensor_info(offs, tensor_count)
+        self.header_end = offs
+
+        # The header is complete, views of it can be handed out from here on.
+        # A pread buffer is read ahead in large chunks, so whatever lies past
+        # the header is dropped rather than kept for the reader's lifetime.
+        if isinstance(self._hbuf, bytearray):
+            del self._hbuf[self.header_end:]
+            self._header_data = np.frombuffer(self._hbuf, dtype = np.uint8)
+            self._header_data.flags.writeable = False
+        else:
+            self._header_data = self.data
+
         new_align = self.fields.get('general.alignment')
         if new_align is not None:
             if new_align.types != [GGUFValueType.UINT32]:
                 raise ValueError('Bad type for general.alignment field')
             self.alignment = new_align.parts[-1][0]
+            if self.alignment == 0 or self.alignment & (self.alignment - 1):
+                raise ValueError(f'general.alignment must be a power of two, got {self.alignment}')
         padding = offs % self.alignment
         if padding != 0:
             offs += self.alignment - padding
         self.data_offset = offs
-        self._build_tensors(offs, tensors_fields)
+        self.tensor_table = ReaderTensorTable(*tensor_info, data_offset = offs)
+
+    def _init_tensors(self, lazy_tensors: bool) -> None:
+        self._check_tensor_names()
+        if lazy_tensors:
+            self.tensors = ReaderTensorList(self)
+        else:
+            self.tensors = [self._make_tensor(i) for i in range(len(self.tensor_table))]
+
+    def _header_checksum(self) -> bytes:
+        fd = os.open(self.path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            return header_checksum(fd, self.header_end)
+        finally:
+            os.close(fd)
+
+    def _load_index(self, index_dir: os.PathLike[str] | str | None) -> bool:
+        # Set up the reader from its header index, returns False when there
+        # is no index or it does not match the file (size, mtime, checksum).
+        loaded = read_index(index_path(self.path, index_dir))
+        if loaded is None:
+            return False
+        meta, sections = loaded
+        if self._file_stat != (meta.file_size, meta.mtime_ns):
+            return False
+        self.header_end = meta.header_end
+        if self._header_checksum() != meta.checksum:
+            return False
+        try:
+            self.byte_order = 'S' if meta.byte_order == 'S' else 'I'
+            self._set_endianess()
+            self.fields = ReaderFieldStore(self)
+            self.fields.restore(sections)
+            self.alignment = meta.alignment
+            self.data_offset = meta.data_offset
+            self.tensor_table = ReaderTensorTable.from_index(sections, meta.data_offset)
+        except (KeyError, ValueError) as e:
+            logger.warning(f'Ignoring invalid header index of {self.path}: {e}')
+            return False
+        # Field views are created from the memmap, which is only paged in
+        # for the fields that are actually accessed
+        self._hbuf = memoryview(self.data)
+        self._file_size = len(self._hbuf)
+        self._header_data = self.data
+        return True
+
+    # Write a header index for this file, which later readers use instead of
+    # parsing the header as long as the file does not change.
+    def save_index(self, index_dir: os.PathLike[str] | str | None = None) -> Path:
+        idx_path = index_path(self.path, index_dir)
+        file_size, mtime_ns = self._file_stat
+        meta = IndexMeta(
+            file_size, mtime_ns, self._header_checksum(), self.header_end,
+            self.byte_order, int(self.fields['GGUF.version'].parts[0][0]), int(self.alignment), self.data_offset,
+        )
+        write_index(idx_path, meta, {**self.fields.index_sections(), **self.tensor_table.index_sections()})
+        return idx_path
 
     _DT = TypeVar('_DT', bound = npt.DTypeLike)
 
@@ -191,30 +776,88 @@ class GGUFReader:
     def get_tensor(self, idx: int) -> ReaderTensor:
         return self.tensors[idx]
 
+    # Fetch a tensor by name, None when there is no such tensor.
+    def get_tensor_by_name(self, name: str) -> Union[ReaderTensor, None]:
+        idx = self.tensor_table.find(name)
+        return None if idx is None else self.tensors[idx]
+
+    # Select tensors by name glob pattern, regular expression, block id and
+    # tensor type, see ReaderTensorSelection.select. Without any criteria all
+    # tensors are selected.
+    def select_tensors(
+        self, pattern: str | None = None, *, regex: str | re.Pattern[str] | None = None,
+        block: int | Iterable[int] | None = None,
+        tensor_type: GGMLQuantizationType | Iterable[GGMLQuantizationType] | None = None,
+    ) -> ReaderTensorSelection:
+        everything = ReaderTensorSelection(self, np.arange(len(self.tensor_table)))
+        return everything.select(pattern, regex = regex, block = block, tensor_type = tensor_type)
+
+    def _header_need(self, end: int) -> None:
+        # Make sure the header buffer holds the file up to end. A pread buffer
+        # grows at least twofold at a time to keep the number of reads low.
+        if end <= len(self._hbuf):
+            return
+        if end > self._file_size or not isinstance(self._hbuf, bytearray):
+            raise ValueError(f'GGUF header is truncated, needs {end} bytes but the file has {self._file_size}')
+        size = len(self._hbuf)
+        new_size = min(max(end, 2 * size, READER_HEADER_CHUNK), self._file_size)
+        while size < new_size:
+            chunk = self._read_header(new_size - size, size)
+            if not chunk:
+                raise ValueError(f'GGUF header is truncated, needs {end} bytes but could only read {size}')
+            self._hbuf.extend(chunk)
+            size += len(chunk)
+
+    def _read_header(self, size: int, offset: int) -> bytes:
+        # Read more of the header for a pread buffer
+        assert self._header_fd is not None
+        return read_at(self._header_fd, size, offset)
+
+    def _data_range(self, start: int, end: int) -> npt.NDArray[np.uint8]:
+        # Bytes of the file past the header, i.e. tensor data
+        return self.data[start:end]
+
     def _get(
         self, offset: int, dtype: npt.DTypeLike, count: int = 1, override_order: None | Literal['I', 'S', '<'] = None,
     ) -> npt.NDArray[Any]:
         count = int(count)
         itemsize = int(np.empty([], dtype = dtype).itemsize)
         end_offs = offset + itemsize * count
-        arr = self.data[offset:end_offs].view(dtype=dtype)[:count]
-        return arr.view(arr.dtype.newbyteorder(self.byte_order if override_order is None else override_order))
-
-    def _push_field(self, field: ReaderField, skip_sum: bool = False) -> int:
-        if field.name in self.fields:
-            # TODO: add option to generate error on duplicate keys
-            # raise KeyError(f'Duplicate {field.name} already in list at offset {field.offset}')
-
-            logger.warning(f'Duplicate key {field.name} at offset {field.offset}')
-            self.fields[field.name + '_{}'.format(field.offset)] = field
+        # Header views come from the header buffer, tensor data from the memmap
+        if end_offs <= len(self._header_data):
+            raw = self._header_data[offset:end_offs]
         else:
-            self.fields[field.name] = field
-        return 0 if skip_sum else sum(int(part.nbytes) for part in field.parts)
+            raw = self._data_range(offset, end_offs)
+        arr = raw.view(dtype=dtype)[:count]
+        return arr.view(arr.dtype.newbyteorder(self.byte_order if override_order is None else override_order))
 
     def _get_str(self, offset: int) -> tuple[npt.NDArray[np.uint64], npt.NDArray[np.uint8]]:
         slen = self._get(offset, np.uint64)
         return slen, self._get(offset + 8, np.uint8, slen[0])
 
+    def _get_str_array(self, offset: int, count: int) -> tuple[npt.NDArray[np.uint64], npt.NDArray[np.uint8]]:
+        # Each string starts where the previous one ends, so the length
+        # prefixes have to be followed one after the other. Only the 8 bytes
+        # of each prefix are read here, without creating any views; the
+        # result is the offset of every string (and of the end) relative to
+        # the start of the array, plus one view of all the string bytes.
+        # Every string takes at least the 8 bytes of its length
+        self._header_need(offset + 8 * int(count))
+        buf = self._hbuf
+        buf_end = len(buf)
+        unpack_len = struct.Struct(self._struct_order + 'Q').unpack_from
+        offsets = array('Q', (0,))
+        append_offset = offsets.append
+        offs = offset
+        for _ in range(int(count)):
+            if offs + 8 > buf_end:
+                self._header_need(offs + 8)
+                buf_end = len(buf)
+            offs += 8 + unpack_len(buf, offs)[0]
+            append_offset(offs - offset)
+        self._header_need(offs)
+        return np.frombuffer(offsets, dtype = np.uint64), offs - offset
+
     def _get_field_parts(
         self, orig_offs: int, raw_type: int,
     ) -> tuple[int, list[npt.NDArray[Any]], list[int], list[GGUFValueType]]:
@@ -283,85 +926,156 @@ class GGUFReader:
             [1, 3, 4, 5],
         )
 
+    def _scan_value(self, offs: int, raw_type: int) -> tuple[int, int, int, npt.NDArray[np.uint64] | None]:
+        # Find the size of a value without creating views of it. Returns the
+        # size, the array item type, the element count (or string length) and
+        # for string arrays the offsets of the strings.
+        buf = self._hbuf
+        order = self._struct_order
+        gtype = GGUFValueType(raw_type)
+        if gtype == GGUFValueType.STRING:
+            self._header_need(offs + 8)
+            slen, = struct.unpack_from(order + 'Q', buf, offs)
+            self._header_need(offs + 8 + slen)
+            return 8 + slen, ReaderFieldStore.NO_ITEM_TYPE, slen, None
+        nptype = self.gguf_scalar_to_np.get(gtype)
+        if nptype is not None:
+            size = np.dtype(nptype).itemsize
+            self._header_need(offs + size)
+            return size, ReaderFieldStore.NO_ITEM_TYPE, 1, None
+        if gtype == GGUFValueType.ARRAY:
+            self._header_need(offs + 12)
+            raw_itype, alen = struct.unpack_from(order + 'IQ', buf, offs)
+            itype = GGUFValueType(raw_itype)
+            item_nptype = self.gguf_scalar_to_np.get(itype)
+            if item_nptype is not None:
+                size = 12 + alen * np.dtype(item_nptype).itemsize
+                self._header_need(offs + size)
+                return size, raw_itype, alen, None
+            if itype == GGUFValueType.STRING:
+                offsets, strings_size = self._get_str_array(offs + 12, alen)
+                return 12 + strings_size, raw_itype, alen, offsets
+            # Nested arrays are rare, their elements are scanned one by one
+            size = 12
+            for _ in range(alen):
+                size += self._scan_value(offs + size, raw_itype)[0]
+            return size, raw_itype, alen, None
+        # We can't deal with this one.
+        raise ValueError(f'Unknown/unhandled field type {gtype}')
+
     def _build_fields(self, offs: int, count: int) -> int:
+        buf = self._hbuf
+        unpack_key = struct.Struct(self._struct_order + 'Q').unpack_from
+        unpack_type = struct.Struct(self._struct_order + 'I').unpack_from
         for _ in range(count):
             orig_offs = offs
-            kv_klen, kv_kdata = self._get_str(offs)
-            offs += int(kv_klen.nbytes + kv_kdata.nbytes)
-            raw_kv_type = self._get(offs, np.uint32)
-            offs += int(raw_kv_type.nbytes)
-            parts: list[npt.NDArray[Any]] = [kv_klen, kv_kdata, raw_kv_type]
-            idxs_offs = len(parts)
-            field_size, field_parts, field_idxs, field_types = self._get_field_parts(offs, raw_kv_type[0])
-            parts += field_parts
-            self._push_field(ReaderField(
-                orig_offs,
-                str(bytes(kv_kdata), encoding = 'utf-8'),
-                parts,
-                [idx + idxs_offs for idx in field_idxs],
-                field_types,
-            ), skip_sum = True)
+            self._header_need(offs + 8)
+            kv_klen, = unpack_key(buf, offs)
+            self._header_need(offs + 8 + kv_klen + 4)
+            name = str(buf[offs + 8:offs + 8 + kv_klen], encoding = 'utf-8')
+            offs += 8 + kv_klen
+            raw_kv_type, = unpack_type(buf, offs)
+            offs += 4
+            field_size, item_type, field_count, string_offsets = self._scan_value(offs, raw_kv_type)
+            self.fields.add(
+                name, orig_offs, offs, raw_kv_type, item_type, field_count,
+                offs + field_size - orig_offs, string_offsets,
+            )
             offs += field_size
+        self.fields.freeze()
         return offs
 
-    def _build_tensor_info(self, offs: int, count: int) -> tuple[int, list[ReaderField]]:
-        tensor_fields = []
+    def _build_tensor_info(self, offs: int, count: int) -> tuple[int, tuple[Any, ...]]:
+        # Tensor infos are parsed with struct straight from the header buffer,
+        # which avoids creating numpy views for every part of every tensor.
+        # Each tensor info takes at least 32 bytes (one dimension, empty name).
+        self._header_need(offs + 32 * count)
+        buf = self._hbuf
+        order = self._struct_order
+        u32 = struct.Struct(order + 'I')
+        u64 = struct.Struct(order + 'Q')
+        type_and_offset = struct.Struct(order + 'IQ')
+        unused_dims = (1,) * READER_MAX_DIMS
+
+        names: list[str] = []
+        field_offsets: list[int] = []
+        dims: list[tuple[int, ...]] = []
+        n_dims: list[int] = []
+        types: list[int] = []
+        offsets: list[int] = []
         for _ in range(count):
-            field = self._get_tensor_info_field(offs)
-            offs += sum(int(part.nbytes) for part in field.parts)
-            tensor_fields.append(field)
-        return offs, tensor_fields
-
-    def _build_tensors(self, start_offs: int, fields: list[ReaderField]) -> None:
-        tensors = []
-        tensor_names = set() # keep track of name to prevent duplicated tensors
-        for field in fields:
-            _name_len, name_data, _n_dims, dims, raw_dtype, offset_tensor = field.parts
+            field_offsets.append(offs)
+            self._header_need(offs + 8)
+            name_len, = u64.unpack_from(buf, offs)
+            offs += 8
+            self._header_need(offs + name_len + 4)
+            names.append(str(buf[offs:offs + name_len], encoding = 'utf-8'))
+            offs += name_len
+            nd, = u32.unpack_from(buf, offs)
+            offs += 4
+            if nd > READER_MAX_DIMS:
+                raise ValueError(f'Tensor {names[-1]} has {nd} dimensions, at most {READER_MAX_DIMS} are supported')
+            self._header_need(offs + 8 * nd + type_and_offset.size)
+            dims.append(struct.unpack_from(f'{order}{nd}Q', buf, offs) + unused_dims[nd:])
+            n_dims.append(nd)
+            offs += 8 * nd
+            raw_dtype, offset_tensor = type_and_offset.unpack_from(buf, offs)
+            offs += type_and_offset.size
+            types.append(raw_dtype)
+            offsets.append(offset_tensor)
+        return offs, (names, field_offsets, dims, n_dims, types, offsets)
+
+    def _check_tensor_names(self) -> None:
+        names = self.tensor_table.names
+        if len(set(names)) != len(names):
             # check if there's any tensor having same name already in the list
-            tensor_name = str(bytes(name_data), encoding = 'utf-8')
-            if tensor_name in tensor_names:
-                raise ValueError(f'Found duplicated tensor with name {tensor_name}')
-            tensor_names.add(tensor_name)
-            ggml_type = GGMLQuantizationType(raw_dtype[0])
-            n_elems = int(np.prod(dims))
-            np_dims = tuple(reversed(dims.tolist()))
-            block_size, type_size = GGML_QUANT_SIZES[ggml_type]
-            n_bytes = n_elems * type_size // block_size
-            data_offs = int(start_offs + offset_tensor[0])
-            item_type: npt.DTypeLike
-            if ggml_type == GGMLQuantizationType.F16:
-                item_count = n_elems
-                item_type = np.float16
-            elif ggml_type == GGMLQuantizationType.F32:
-                item_count = n_elems
-                item_type = np.float32
-            elif ggml_type == GGMLQuantizationType.F64:
-                item_count = n_elems
-                item_type = np.float64
-            elif ggml_type == GGMLQuantizationType.I8:
-                item_count = n_elems
-                item_type = np.int8
-            elif ggml_type == GGMLQuantizationType.I16:
-                item_count = n_elems
-                item_type = np.int16
-            elif ggml_type == GGMLQuantizationType.I32:
-                item_count = n_elems
-                item_type = np.int32
-            elif ggml_type == GGMLQuantizationType.I64:
-                item_count = n_elems
-                item_type = np.int64
-            else:
-                item_count = n_bytes
-                item_type = np.uint8
-                np_dims = quant_shape_to_byte_shape(np_dims, ggml_type)
-            tensors.append(ReaderTensor(
-                name = tensor_name,
-                tensor_type = ggml_type,
-                shape = dims,
-                n_elements = n_elems,
-                n_bytes = n_bytes,
-                data_offset = data_offs,
-                data = self._get(data_offs, item_type, item_count).reshape(np_dims),
-                field = field,
-            ))
-        self.tensors = tensors
+            tensor_names = set()
+            for tensor_name in names:
+                if tensor_name in tensor_names:
+                    raise ValueError(f'Found duplicated tensor with name {tensor_name}')
+                tensor_names.add(tensor_name)
+
+    def _make_tensor(self, idx: int) -> ReaderTensor:
+        table = self.tensor_table
+        field = self._get_tensor_info_field(int(table.field_offsets[idx]))
+        ggml_type = GGMLQuantizationType(int(table.types[idx]))
+        n_elems = int(table.n_elements[idx])
+        n_bytes = int(table.n_bytes[idx])
+        np_dims = tuple(reversed(table.shape(idx)))
+        data_offs = int(table.data_offsets[idx])
+        item_type: npt.DTypeLike
+        if ggml_type == GGMLQuantizationType.F16:
+            item_count = n_elems
+            item_type = np.float16
+        elif ggml_type == GGMLQuantizationType.F32:
+            item_count = n_elems
+            item_type = np.float32
+        elif ggml_type == GGMLQuantizationType.F64:
+            item_count = n_elems
+            item_type = np.float64
+        elif ggml_type == GGMLQuantizationType.I8:
+            item_count = n_elems
+            item_type = np.int8
+        elif ggml_type == GGMLQuantizationType.I16:
+            item_count = n_elems
+            item_type = np.int16
+        elif ggml_type == GGMLQuantizationType.I32:
+            item_count = n_elems
+            item_type = np.int32
+        elif ggml_type == GGMLQuantizationType.I64:
+            item_count = n_elems
+            item_type = np.int64
+        else:
+            item_count = n_bytes
+            item_type = np.uint8
+            np_dims = quant_shape_to_byte_shape(np_dims, ggml_type)
+        return ReaderTensor(
+            name = table.names[idx],
+            tensor_type = ggml_type,
+            shape = field.parts[3],
+            n_elements = n_elems,
+            n_bytes = n_bytes,
+            data_offset = data_offs,
+            data = self._get(data_offs, item_type, item_count).reshape(np_dims),
+            field = field,
+        )
@@ -0,0 +1,170 @@
+#
+# A shared registry of GGUFReaders for long running processes that look at
+# many models, e.g. a launcher or catalog service.
+#
+# Readers are handed out by file identity (device, inode, size, mtime), so
+# every caller shares one parsed header per file and a changed file gets a
+# new reader. Every memory mapped file costs a VMA and a file descriptor
+# (mmap duplicates it), so at most max_mapped of them (and max_mapped_bytes
+# of files) stay mapped; the least recently used reader loses its mapping
+# and maps the file again the next time tensor data is accessed. Headers are
+# read with pread (header_io = 'pread') and not from the mapping, so fields
+# and the tensor table stay usable while a reader is unmapped. Tensor views
+# handed out before keep their mapping alive until they are released.
+#
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+
+from .gguf_reader import GGUFReader
+
+# Default limits of ReaderRegistry.
+REGISTRY_MAX_READERS = 1024
+REGISTRY_MAX_MAPPED = 64
+
+
+class FileIdentity(NamedTuple):
+    dev: int
+    ino: int
+    size: int
+    mtime_ns: int
+
+
+class RegistryStats(NamedTuple):
+    readers: int
+    hits: int
+    misses: int
+
+    # Tensor data accesses that had to map the file again after eviction.
+    reopens: int
+    evictions: int
+    mapped: int
+    mapped_bytes: int
+
+
+def file_identity(path: os.PathLike[str] | str) -> FileIdentity:
+    st = os.stat(path)
+    return FileIdentity(st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class RegisteredReader(GGUFReader):
+    # A GGUFReader whose memory map is managed by a ReaderRegistry.
+
+    def __init__(self, registry: ReaderRegistry, path: os.PathLike[str] | str, identity: FileIdentity):
+        self._registry = registry
+        self.identity = identity
+        self.was_mapped = False
+        super().__init__(path, 'r', lazy_tensors = True, header_io = 'pread', use_index = False)
+
+    @property
+    def data(self) -> np.memmap:
+        data = self._data
+        if data is None:
+            return self._registry._map(self)
+        self._registry._touch(self)
+        return data
+
+
+class ReaderRegistry:
+    def __init__(
+        self, max_readers: int = REGISTRY_MAX_READERS, max_mapped: int = REGISTRY_MAX_MAPPED,
+        max_mapped_bytes: int | None = None,
+    ):
+        self.max_readers = max_readers
+        self.max_mapped = max_mapped
+        self.max_mapped_bytes = max_mapped_bytes
+        self._lock = threading.RLock()
+        self._readers: OrderedDict[FileIdentity, RegisteredReader] = OrderedDict()
+        self._mapped: OrderedDict[FileIdentity, RegisteredReader] = OrderedDict()
+        self._mapped_bytes = 0
+        self._hits = self._misses = self._reopens = self._evictions = 0
+
+    # The reader of a file, parsed on first use. Readers of files that
+    # changed since are replaced.
+    def get(self, path: os.PathLike[str] | str) -> GGUFReader:
+        identity = file_identity(path)
+        with self._lock:
+            reader = self._readers.get(identity)
+            if reader is not None:
+                self._hits += 1
+                self._readers.move_to_end(identity)
+                return reader
+            self._misses += 1
+        # Parse outside of the lock, a concurrent get of the same file may
+        # parse it too but only one reader is kept
+        reader = RegisteredReader(self, path, identity)
+        with self._lock:
+            existing = self._readers.get(identity)
+            if existing is not None:
+                return existing
+            self._readers[identity] = reader
+            while len(self._readers) > self.max_readers:
+                _identity, old = self._readers.popitem(last = False)
+                self._unmap(old)
+            return reader
+
+    def stats(self) -> RegistryStats:
+        with self._lock:
+            return RegistryStats(
+                len(self._readers), self._hits, self._misses, self._reopens, self._evictions,
+                len(self._mapped), self._mapped_bytes,
+            )
+
+    # Unmap every reader, e.g. before the files are replaced.
+    def unmap_all(self) -> None:
+        with self._lock:
+            for reader in list(self._mapped.values()):
+                self._unmap(reader)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.unmap_all()
+            self._readers.clear()
+
+    def _map(self, reader: RegisteredReader) -> np.memmap:
+        with self._lock:
+            if reader._data is not None:
+                return reader._data
+            data = np.memmap(reader.path, mode = 'r')
+            reader._data = data
+            if reader.was_mapped:
+                self._reopens += 1
+            reader.was_mapped = True
+            self._mapped[reader.identity] = reader
+            self._mapped_bytes += reader.identity.size
+            while len(self._mapped) > 1 and (
+                len(self._mapped) > self.max_mapped
+                or (self.max_mapped_bytes is not None and self._mapped_bytes > self.max_mapped_bytes)
+            ):
+                _identity, victim = next(iter(self._mapped.items()))
+                self._unmap(victim)
+                self._evictions += 1
+            return data
+
+    def _touch(self, reader: RegisteredReader) -> None:
+        with self._lock:
+            if reader.identity in self._mapped:
+                self._mapped.move_to_end(reader.identity)
+
+    def _unmap(self, reader: RegisteredReader) -> None:
+        if self._mapped.pop(reader.identity, None) is not None:
+            self._mapped_bytes -= reader.identity.size
+        reader._data = None
+
+
+_shared_registry: ReaderRegistry | None = None
+_shared_lock = threading.Lock()
+
+
+# The process wide registry, created with the default limits on first use.
+def shared_registry() -> ReaderRegistry:
+    global _shared_registry
+    with _shared_lock:
+        if _shared_registry is None:
+            _shared_registry = ReaderRegistry()
+        return _shared_registry
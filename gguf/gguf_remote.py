@@ -0,0 +1,327 @@
+#
+# Reading GGUF files over HTTP with range requests, to look at the metadata
+# and tensor table of a model (architecture, context length, quant mix)
+# without downloading it.
+#
+# HTTPRangeFile keeps one keep-alive connection per reader and a bounded
+# cache of the ranges it fetched. GGUFRemoteReader is a GGUFReader whose
+# header buffer is filled from it in growing chunks, like
+# GGUFReader(header_io = 'pread'); tensor data is fetched by range when a
+# tensor is accessed.
+#
+# RangeRequestHandler is a http.server handler that serves files with range
+# support, as a local stand-in for an artifact server:
+#
+#   python -m gguf.gguf_remote --serve models/ --port 8000
+#   python -m gguf.gguf_remote http://localhost:8000/model.gguf
+#
+from __future__ import annotations
+
+import http.client
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from http.server import SimpleHTTPRequestHandler
+from typing import Any
+from urllib.parse import urlsplit
+
+import numpy as np
+import numpy.typing as npt
+
+from .gguf_reader import READER_HEADER_CHUNK, GGUFReader
+
+logger = logging.getLogger(__name__)
+
+# Bytes of fetched ranges kept by HTTPRangeFile.
+REMOTE_CACHE_SIZE = 64 << 20
+
+REMOTE_TIMEOUT = 60.0
+
+_CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+class HTTPRangeFile:
+    # Random access to a file over HTTP range requests. The size is learned
+    # from the Content-Range of the first request, which also reads the first
+    # first_chunk bytes. Safe to share between threads, requests are made one
+    # at a time on the keep-alive connection.
+
+    def __init__(
+        self, url: str, first_chunk: int = READER_HEADER_CHUNK, cache_size: int = REMOTE_CACHE_SIZE,
+        timeout: float = REMOTE_TIMEOUT, headers: dict[str, str] | None = None,
+    ):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f'Unsupported URL scheme {parts.scheme!r}')
+        self.url = url
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.headers = headers or {}
+        self._scheme = parts.scheme
+        self._netloc = parts.netloc
+        self._target = parts.path + (f'?{parts.query}' if parts.query else '')
+        self._conn: http.client.HTTPConnection | None = None
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[int, bytes] = OrderedDict()
+        self._cached_bytes = 0
+
+        # Counters, for tuning
+        self.requests = 0
+        self.bytes_fetched = 0
+
+        self.size = -1
+        self.read(0, first_chunk)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self) -> HTTPRangeFile:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            conn_class = http.client.HTTPSConnection if self._scheme == 'https' else http.client.HTTPConnection
+            self._conn = conn_class(self._netloc, timeout = self.timeout)
+        return self._conn
+
+    def _drop_connection(self, conn: http.client.HTTPConnection) -> None:
+        conn.close()
+        if self._conn is conn:
+            self._conn = None
+
+    def _fetch(self, start: int, end: int) -> bytes:
+        # GET bytes [start, end), retried once on a new connection when the
+        # server closed the kept alive one. The status and Content-Range are
+        # checked before the body is read: a server ignoring the range would
+        # send the whole file, so the connection is dropped instead.
+        headers = {**self.headers, 'Range': f'bytes={start}-{end - 1}'}
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request('GET', self._target, headers = headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._drop_connection(conn)
+                if attempt:
+                    raise
+                continue
+            break
+        self.requests += 1
+
+        if response.status != 206:
+            self._drop_connection(conn)
+            if response.status == 416 and self.size < 0:
+                # Empty file
+                self.size = 0
+                return b''
+            if response.status == 200:
+                raise ValueError(f'{self.url}: the server does not support range requests')
+            raise ValueError(f'{self.url}: {response.status} {response.reason}')
+        match = _CONTENT_RANGE.fullmatch(response.getheader('Content-Range', ''))
+        if match is None or int(match.group(1)) != start or not start <= int(match.group(2)) < end:
+            self._drop_connection(conn)
+            raise ValueError(f'{self.url}: unexpected Content-Range {response.getheader("Content-Range")!r}')
+        length = int(match.group(2)) + 1 - start
+        try:
+            body = response.read(length)
+        except (http.client.IncompleteRead, OSError) as e:
+            self._drop_connection(conn)
+            raise ValueError(f'{self.url}: short read at offset {start}') from e
+        self.bytes_fetched += len(body)
+        # A body longer than the range, or a connection the server closes,
+        # can not be reused
+        if response.will_close or not response.isclosed():
+            self._drop_connection(conn)
+        if len(body) != length:
+            raise ValueError(f'{self.url}: short read at offset {start}')
+        if match.group(3) != '*':
+            self.size = int(match.group(3))
+        return body
+
+    def _cached(self, start: int, end: int) -> bytes | None:
+        for offset, data in self._cache.items():
+            if offset <= start and end <= offset + len(data):
+                self._cache.move_to_end(offset)
+                return data[start - offset:end - offset]
+        return None
+
+    def _store(self, start: int, data: bytes) -> None:
+        old = self._cache.pop(start, None)
+        if old is not None:
+            self._cached_bytes -= len(old)
+        self._cache[start] = data
+        self._cached_bytes += len(data)
+        while self._cached_bytes > self.cache_size and len(self._cache) > 1:
+            _offset, evicted = self._cache.popitem(last = False)
+            self._cached_bytes -= len(evicted)
+
+    # Read size bytes at offset, fewer at the end of the file.
+    def read(self, offset: int, size: int) -> bytes:
+        with self._lock:
+            end = offset + size if self.size < 0 else min(offset + size, self.size)
+            if end <= offset:
+                return b''
+            data = self._cached(offset, end)
+            if data is None:
+                data = self._fetch(offset, end)
+                if len(data) <= self.cache_size:
+                    self._store(offset, data)
+            return data
+
+
+class GGUFRemoteReader(GGUFReader):
+    # A GGUFReader over HTTP. The fields, tensor_table, tensors and
+    # select_tensors work as for local files, the tensors are always lazy
+    # and reading the data of one fetches it with a range request. There is
+    # no memory map, so data raises.
+
+    def __init__(
+        self, url: str, *, first_chunk: int = READER_HEADER_CHUNK, cache_size: int = REMOTE_CACHE_SIZE,
+        timeout: float = REMOTE_TIMEOUT, headers: dict[str, str] | None = None,
+    ):
+        self.path = url
+        self.mode = 'r'
+        self._data = None
+        self._header_fd = None
+        self.remote = HTTPRangeFile(url, first_chunk, cache_size, timeout, headers)
+        self._file_size = self.remote.size
+        self._file_stat = (self._file_size, 0)
+        self._hbuf = bytearray()
+        self._parse_header()
+        self._init_tensors(lazy_tensors = True)
+
+    @property
+    def file_size(self) -> int:
+        return self._file_size
+
+    @property
+    def data(self) -> np.memmap:
+        raise ValueError(f'{self.path} is read over HTTP and has no memory map, use tensors or read_range')
+
+    def close(self) -> None:
+        self.remote.close()
+
+    def read_range(self, offset: int, size: int) -> bytes:
+        return self.remote.read(offset, size)
+
+    def _read_header(self, size: int, offset: int) -> bytes:
+        return self.remote.read(offset, size)
+
+    def _data_range(self, start: int, end: int) -> npt.NDArray[np.uint8]:
+        data = self.remote.read(start, end - start)
+        if len(data) != end - start:
+            raise ValueError(f'{self.path} is truncated, needs {end} bytes but has {self._file_size}')
+        return np.frombuffer(data, dtype = np.uint8)
+
+    def save_index(self, index_dir: os.PathLike[str] | str | None = None) -> Any:
+        raise ValueError('Header indexes are only supported for local files')
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    # SimpleHTTPRequestHandler with single range requests (Range: bytes=a-b),
+    # enough to stand in for an artifact server in tests and benchmarks.
+    protocol_version = 'HTTP/1.1'
+
+    def send_head(self) -> Any:
+        # Left over from a HEAD request on this keep-alive connection, whose
+        # body was never copied
+        self._range_left = None
+        range_header = self.headers.get('Range')
+        if range_header is None:
+            return super().send_head()
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            return super().send_head()
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', range_header.strip())
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(404, 'File not found')
+            return None
+        size = os.fstat(f.fileno()).st_size
+        if match is None or match.group(1) == match.group(2) == '':
+            f.close()
+            self.send_error(400, 'Unsupported range')
+            return None
+        if match.group(1) == '':
+            start, end = max(0, size - int(match.group(2))), size - 1
+        else:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        if start >= size or start > end:
+            f.close()
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+        self.send_response(206)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        f.seek(start)
+        self._range_left = end - start + 1
+        return f
+
+    def copyfile(self, source: Any, outputfile: Any) -> None:
+        left = getattr(self, '_range_left', None)
+        if left is None:
+            return super().copyfile(source, outputfile)
+        self._range_left = None
+        while left > 0:
+            chunk = source.read(min(left, 1 << 20))
+            if not chunk:
+                break
+            try:
+                outputfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading, e.g. a cancelled download
+                self.close_connection = True
+                return
+            left -= len(chunk)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format, *args)
+
+
+def main() -> None:
+    import argparse
+    import functools
+    import json
+    from http.server import ThreadingHTTPServer
+
+    from .gguf_inspect import summarize
+
+    parser = argparse.ArgumentParser(description = 'Print the header summary of a GGUF file over HTTP')
+    parser.add_argument('url', nargs = '?', help = 'URL of a GGUF file on a server with range support')
+    parser.add_argument('--serve', metavar = 'DIR', help = 'serve DIR with range support instead')
+    parser.add_argument('--port', type = int, default = 8000, help = 'port for --serve')
+    args = parser.parse_args()
+
+    if args.serve:
+        handler = functools.partial(RangeRequestHandler, directory = args.serve)
+        with ThreadingHTTPServer(('', args.port), handler) as server:
+            print(f'Serving {args.serve} on port {server.server_address[1]}')
+            server.serve_forever()
+        return
+    if not args.url:
+        parser.error('a URL or --serve is required')
+
+    reader = GGUFRemoteReader(args.url)
+    summary = summarize(reader, reader.file_size)
+    print(json.dumps({**summary._asdict(), 'path': args.url, 'requests': reader.remote.requests, 'bytes_fetched': reader.remote.bytes_fetched}, default = str))
+    reader.close()
+
+
+if __name__ == '__main__':
+    main()
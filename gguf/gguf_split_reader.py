@@ -0,0 +1,221 @@
+#
+# Reading of models split over several GGUF files (see SHARD_NAME_FORMAT in
+# gguf_writer.py) through one merged view.
+#
+from __future__ import annotations
+
+import logging
+import os
+import re
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, Literal, Mapping, NamedTuple, Sequence, Union, overload
+
+import numpy as np
+
+from .constants import Keys
+from .gguf_reader import GGUFReader, ReaderField, ReaderTensor
+from .gguf_writer import SHARD_NAME_FORMAT
+
+logger = logging.getLogger(__name__)
+
+SHARD_NAME_PATTERN = re.compile(r'^(?P<prefix>.+)-(?P<no>\d{5})-of-(?P<count>\d{5})\.gguf$')
+
+# Keys whose value legitimately differs between the shards of one model
+SHARD_LOCAL_KEYS = (Keys.Split.LLM_KV_SPLIT_NO,)
+
+
+class TensorLocation(NamedTuple):
+    # Index of the shard holding the tensor.
+    shard: int
+
+    path: Path
+
+    # Absolute offset of the tensor data in the shard file.
+    data_offset: int
+
+
+def split_shard_paths(path: os.PathLike[str] | str) -> list[Path]:
+    # Given the path of any shard, list the paths of all shards in order.
+    # A file not following the shard naming scheme is a single shard model.
+    path = Path(path)
+    match = SHARD_NAME_PATTERN.match(path.name)
+    if match is None:
+        return [path]
+    count = int(match.group('count'))
+    return [path.with_name(SHARD_NAME_FORMAT.format(match.group('prefix'), i + 1, count)) for i in range(count)]
+
+
+class SplitTensorList(Sequence[ReaderTensor]):
+    # Read-only list of the tensors of all shards, in shard order. Like the
+    # ReaderTensorList of each shard, a ReaderTensor is only created when it
+    # is accessed.
+
+    def __init__(self, reader: GGUFSplitReader):
+        self.reader = reader
+
+    def __len__(self) -> int:
+        return self.reader._starts[-1]
+
+    @overload
+    def __getitem__(self, idx: int) -> ReaderTensor: ...
+    @overload
+    def __getitem__(self, idx: slice) -> list[ReaderTensor]: ...
+
+    def __getitem__(self, idx: int | slice) -> ReaderTensor | list[ReaderTensor]:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        shard, local_idx = self.reader._locate(idx)
+        return self.reader.shards[shard].tensors[local_idx]
+
+
+class SplitFieldMap(Mapping[str, ReaderField]):
+    # Read-only mapping of the merged key/value fields. Only the shard that
+    # first holds each key is recorded, the ReaderField is created by that
+    # shard's field store when the key is looked up.
+
+    def __init__(self, reader: GGUFSplitReader, owners: dict[str, int]):
+        self.reader = reader
+        self.owners = owners
+
+    def __len__(self) -> int:
+        return len(self.owners)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.owners)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.owners
+
+    def __getitem__(self, key: str) -> ReaderField:
+        return self.reader.shards[self.owners[key]].fields[key]
+
+
+class GGUFSplitReader:
+    # Merged view over the shards of a split model. The shards are opened
+    # with lazy tensors and tensor data stays memory mapped in the individual
+    # shard readers, nothing is read until accessed.
+    fields: SplitFieldMap
+    tensors: SplitTensorList
+    tensor_index: dict[str, int]
+
+    def __init__(
+        self, path: os.PathLike[str] | str, mode: Literal['r', 'r+', 'c'] = 'r', max_workers: int | None = None,
+    ):
+        self.paths = split_shard_paths(path)
+        missing = [str(p) for p in self.paths if not p.exists()]
+        if missing:
+            raise ValueError(f'Missing shard(s): {", ".join(missing)}')
+
+        # Header parsing is dominated by waiting on the file system for
+        # network or cold storage, so the shards are opened concurrently
+        workers = max_workers if max_workers is not None else min(len(self.paths), 8)
+        if len(self.paths) == 1 or workers <= 1:
+            self.shards = [GGUFReader(p, mode, lazy_tensors = True) for p in self.paths]
+        else:
+            with ThreadPoolExecutor(max_workers = workers) as executor:
+                self.shards = list(executor.map(lambda p: GGUFReader(p, mode, lazy_tensors = True), self.paths))
+
+        self._check_consistency()
+        self._build_merged_view()
+
+    # Fetch a key/value metadata field by key.
+    def get_field(self, key: str) -> Union[ReaderField, None]:
+        return self.fields.get(key, None)
+
+    # Fetch a tensor from the merged list by index.
+    def get_tensor(self, idx: int) -> ReaderTensor:
+        return self.tensors[idx]
+
+    # Fetch a tensor by name, None when there is no such tensor.
+    def get_tensor_by_name(self, name: str) -> Union[ReaderTensor, None]:
+        idx = self.tensor_index.get(name)
+        return None if idx is None else self.tensors[idx]
+
+    def get_tensor_location(self, idx: int) -> TensorLocation:
+        shard, local_idx = self._locate(idx)
+        offset = int(self.shards[shard].tensor_table.data_offsets[local_idx])
+        return TensorLocation(shard, self.paths[shard], offset)
+
+    # Locations of all tensors, built on each access.
+    @property
+    def tensor_locations(self) -> list[TensorLocation]:
+        return [self.get_tensor_location(idx) for idx in range(len(self.tensors))]
+
+    # Shard and index in the shard of a tensor of the merged list.
+    def _locate(self, idx: int) -> tuple[int, int]:
+        if idx < 0:
+            idx += self._starts[-1]
+        if not 0 <= idx < self._starts[-1]:
+            raise IndexError('tensor index out of range')
+        shard = bisect_right(self._starts, idx) - 1
+        return shard, idx - self._starts[shard]
+
+    @property
+    def split_count(self) -> int:
+        return len(self.shards)
+
+    def _shard_value(self, shard: GGUFReader, key: str) -> int | None:
+        field = shard.get_field(key)
+        return None if field is None else int(field.contents())
+
+    def _check_consistency(self) -> None:
+        count = len(self.shards)
+        total_tensors = sum(len(shard.tensor_table) for shard in self.shards)
+        first_version = self._shard_value(self.shards[0], 'GGUF.version')
+
+        for i, (p, shard) in enumerate(zip(self.paths, self.shards)):
+            version = self._shard_value(shard, 'GGUF.version')
+            if version != first_version:
+                raise ValueError(f'{p.name}: GGUF version {version} differs from first shard version {first_version}')
+            if shard.byte_order != self.shards[0].byte_order:
+                raise ValueError(f'{p.name}: byte order differs from the first shard')
+
+            split_no = self._shard_value(shard, Keys.Split.LLM_KV_SPLIT_NO)
+            split_count = self._shard_value(shard, Keys.Split.LLM_KV_SPLIT_COUNT)
+            tensors_count = self._shard_value(shard, Keys.Split.LLM_KV_SPLIT_TENSORS_COUNT)
+
+            if split_count is None:
+                if count != 1:
+                    raise ValueError(f'{p.name}: missing {Keys.Split.LLM_KV_SPLIT_COUNT}')
+                continue
+            if split_count != count:
+                raise ValueError(f'{p.name}: {Keys.Split.LLM_KV_SPLIT_COUNT} is {split_count}, expected {count}')
+            if split_no != i:
+                raise ValueError(f'{p.name}: {Keys.Split.LLM_KV_SPLIT_NO} is {split_no}, expected {i}')
+            if tensors_count is not None and tensors_count != total_tensors:
+                raise ValueError(f'{p.name}: {Keys.Split.LLM_KV_SPLIT_TENSORS_COUNT} is {tensors_count}, but the shards hold {total_tensors} tensors')
+
+    def _build_merged_view(self) -> None:
+        # The first shard carries the model metadata, the other ones usually
+        # only the split keys. Keys present in several shards must agree.
+        # Values are compared as raw bytes of the shard headers, so no field
+        # is created and no array is decoded.
+        owners: dict[str, int] = {}
+        for i, (p, shard) in enumerate(zip(self.paths, self.shards)):
+            for name in shard.fields:
+                if name.startswith('GGUF.') and name != 'GGUF.version':
+                    # per file counts, meaningless for the merged model
+                    continue
+                owner = owners.get(name)
+                if owner is None:
+                    owners[name] = i
+                elif name not in SHARD_LOCAL_KEYS:
+                    known = self.shards[owner].fields.raw_value(name)
+                    if not np.array_equal(known, shard.fields.raw_value(name)):
+                        raise ValueError(f'{p.name}: value of {name} differs from the one in {self.paths[owner].name}')
+        self.fields = SplitFieldMap(self, owners)
+
+        # Only the names are looked at, no ReaderTensor is created
+        self._starts = [0]
+        self.tensor_index = {}
+        for i, (p, shard) in enumerate(zip(self.paths, self.shards)):
+            start = self._starts[-1]
+            for local_idx, name in enumerate(shard.tensor_table.names):
+                known_idx = self.tensor_index.get(name)
+                if known_idx is not None:
+                    raise ValueError(f'{p.name}: tensor {name} already present in shard {self._locate(known_idx)[0] + 1}')
+                self.tensor_index[name] = start + local_idx
+            self._starts.append(start + len(shard.tensor_table))
+        self.tensors = SplitTensorList(self)
@@ -0,0 +1,247 @@
+#
+# Weight statistics of GGUF files, computed in a streaming fashion.
+#
+# Tensors are dequantized a chunk of rows at a time and folded into
+# mergeable statistics: count, mean and M2 (Welford, merged with Chan's
+# formula), min and max, NaN and Inf counts, a histogram of the binary
+# exponent of the values and the absolute maximum of every row. Large
+# tensors are split into row ranges, each range is a task for a process
+# pool and the partial statistics are merged, so memory use is bounded by
+# the chunk size whatever the size of the model. Tensors of a type that
+# cannot be dequantized are reported as skipped.
+#
+from __future__ import annotations
+
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+import numpy as np
+import numpy.typing as npt
+
+from .gguf_diff import tensor_values
+from .gguf_handle import TensorHandle, tensor_handles
+from .gguf_reader import GGUFReader
+
+# Values dequantized at once, and per pool task.
+STATS_CHUNK_ELEMENTS = 1 << 22
+STATS_TASK_ELEMENTS = 1 << 26
+
+# Histogram bins by binary exponent of |x| (x = m * 2**e, 0.5 <= m < 1),
+# plus a first bin for zeros.
+STATS_MIN_EXPONENT = -40
+STATS_MAX_EXPONENT = 24
+STATS_HISTOGRAM_BINS = STATS_MAX_EXPONENT - STATS_MIN_EXPONENT + 2
+
+# Tasks submitted to the pool ahead of the one being waited for, per worker.
+STATS_PENDING_PER_WORKER = 4
+
+# A row is an outlier when its absmax is this many times the median row absmax.
+STATS_OUTLIER_FACTOR = 10.0
+
+
+@dataclass
+class TensorStats:
+    name: str
+    tensor_type: str
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    min: float = float('inf')
+    max: float = float('-inf')
+    nan_count: int = 0
+    inf_count: int = 0
+    histogram: npt.NDArray[np.int64] = field(default_factory = lambda: np.zeros(STATS_HISTOGRAM_BINS, dtype = np.int64))
+
+    # Absolute maximum of every row seen, by row index.
+    row_absmax: npt.NDArray[np.float32] = field(default_factory = lambda: np.zeros(0, dtype = np.float32))
+
+    # Why the values were not looked at, None when they were.
+    skipped: str | None = None
+
+    @property
+    def std(self) -> float:
+        return (self.m2 / self.count) ** 0.5 if self.count else 0.0
+
+    @property
+    def outlier_rows(self) -> int:
+        if len(self.row_absmax) == 0:
+            return 0
+        median = float(np.median(self.row_absmax))
+        return int((self.row_absmax > STATS_OUTLIER_FACTOR * median).sum()) if median > 0 else 0
+
+    def update(self, rows: npt.NDArray[Any]) -> None:
+        # Fold a (n_rows, row_size) chunk of values into the statistics
+        finite = np.isfinite(rows)
+        n_nan = int(np.isnan(rows).sum())
+        self.nan_count += n_nan
+        self.inf_count += int(rows.size - finite.sum()) - n_nan
+        abs_rows = np.where(finite, np.abs(rows), 0)
+        self.row_absmax = np.concatenate((self.row_absmax, abs_rows.max(axis = 1).astype(np.float32)))
+
+        values = rows[finite].astype(np.float64)
+        if values.size == 0:
+            return
+        chunk_mean = float(values.mean())
+        chunk_m2 = float(np.square(values - chunk_mean).sum())
+        self._merge_moments(values.size, chunk_mean, chunk_m2)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        _mantissa, exponents = np.frexp(values)
+        bins = np.clip(exponents, STATS_MIN_EXPONENT, STATS_MAX_EXPONENT) - STATS_MIN_EXPONENT + 1
+        bins[values == 0] = 0
+        self.histogram += np.bincount(bins, minlength = STATS_HISTOGRAM_BINS)
+
+    def _merge_moments(self, count: int, mean: float, m2: float) -> None:
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def merge(self, other: TensorStats) -> None:
+        # Merge the statistics of the rows that follow the ones seen so far
+        if other.skipped is not None:
+            self.skipped = other.skipped
+        if other.count:
+            self._merge_moments(other.count, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.nan_count += other.nan_count
+        self.inf_count += other.inf_count
+        self.histogram += other.histogram
+        self.row_absmax = np.concatenate((self.row_absmax, other.row_absmax))
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'name': self.name,
+            'type': self.tensor_type,
+            'skipped': self.skipped,
+            'count': self.count,
+            'mean': self.mean,
+            'std': self.std,
+            'min': self.min,
+            'max': self.max,
+            'nan': self.nan_count,
+            'inf': self.inf_count,
+            'row_absmax_median': float(np.median(self.row_absmax)) if len(self.row_absmax) else None,
+            'row_absmax_max': float(self.row_absmax.max()) if len(self.row_absmax) else None,
+            'outlier_rows': self.outlier_rows,
+            'exponent_histogram': {
+                ('zero' if i == 0 else str(i - 1 + STATS_MIN_EXPONENT)): int(n)
+                for i, n in enumerate(self.histogram.tolist()) if n
+            },
+        }
+
+
+def tensor_stats(
+    handle: TensorHandle, row_start: int = 0, row_end: int | None = None,
+    chunk_elements: int = STATS_CHUNK_ELEMENTS,
+) -> TensorStats:
+    # Statistics of rows [row_start, row_end) of a tensor.
+    n_rows, row_size, _row_bytes = handle.row_layout()
+    row_end = n_rows if row_end is None else row_end
+    stats = TensorStats(handle.name, handle.tensor_type.name)
+    chunk_rows = max(1, chunk_elements // max(row_size, 1))
+    for start in range(row_start, row_end, chunk_rows):
+        end = min(start + chunk_rows, row_end)
+        try:
+            values = tensor_values(handle.raw_rows(start, end), handle.tensor_type)
+        except NotImplementedError as e:
+            # No dequantization for this type (e.g. Q8_1, Q8_K)
+            stats.skipped = str(e) or f'{handle.tensor_type.name} cannot be dequantized'
+            break
+        stats.update(values.reshape(end - start, row_size))
+    return stats
+
+
+def _tasks(handles: list[TensorHandle], task_elements: int) -> Iterator[tuple[TensorHandle, int, int]]:
+    for handle in handles:
+        n_rows, row_size, _row_bytes = handle.row_layout()
+        task_rows = max(1, task_elements // max(row_size, 1))
+        for start in range(0, max(n_rows, 1), task_rows):
+            yield handle, start, min(start + task_rows, n_rows)
+
+
+def model_stats(
+    path: os.PathLike[str] | str, max_workers: int | None = None, pattern: str | None = None,
+    task_elements: int = STATS_TASK_ELEMENTS,
+) -> Iterator[TensorStats]:
+    # Statistics of every tensor (or the ones matching a glob pattern), in
+    # file order. Each one is yielded as soon as all its row ranges are done.
+    reader = GGUFReader(path, lazy_tensors = True)
+    handles = tensor_handles(reader, reader.select_tensors(pattern) if pattern else None)
+    tasks = _tasks(handles, task_elements)
+    workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+
+    # Only the handles are sent to the workers, which map the file themselves.
+    # Tasks are submitted through a bounded window, so the results waiting to
+    # be merged stay few whatever the number of tensors.
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        pending: deque[tuple[TensorHandle, Future[TensorStats]]] = deque()
+        current: TensorStats | None = None
+        current_handle: TensorHandle | None = None
+        while True:
+            for handle, start, end in tasks:
+                pending.append((handle, executor.submit(tensor_stats, handle, start, end)))
+                if len(pending) >= workers * STATS_PENDING_PER_WORKER:
+                    break
+            if not pending:
+                break
+            handle, future = pending.popleft()
+            stats = future.result()
+            if handle is not current_handle:
+                if current is not None:
+                    yield current
+                current, current_handle = stats, handle
+            else:
+                assert current is not None
+                current.merge(stats)
+        if current is not None:
+            yield current
+
+
+def format_stats_table(rows: list[TensorStats]) -> list[str]:
+    header = f'{"tensor":<40} {"type":<7} {"mean":>10} {"std":>10} {"min":>10} {"max":>10} {"nan":>6} {"inf":>6} {"absmax":>10} {"outl":>5}'
+    lines = [header, '-' * len(header)]
+    for stats in rows:
+        if stats.skipped is not None:
+            lines.append(f'{stats.name[-40:]:<40} {stats.tensor_type:<7} skipped: {stats.skipped}')
+            continue
+        absmax = float(stats.row_absmax.max()) if len(stats.row_absmax) else 0.0
+        lines.append(
+            f'{stats.name[-40:]:<40} {stats.tensor_type:<7} {stats.mean:>10.4g} {stats.std:>10.4g} '
+            f'{stats.min:>10.4g} {stats.max:>10.4g} {stats.nan_count:>6} {stats.inf_count:>6} '
+            f'{absmax:>10.4g} {stats.outlier_rows:>5}'
+        )
+    return lines
+
+
+def main() -> None:
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description = 'Per-tensor weight statistics of a GGUF file')
+    parser.add_argument('model', help = 'GGUF file')
+    parser.add_argument('--tensors', help = 'glob pattern of the tensors to look at, e.g. "blk.0.*"')
+    parser.add_argument('--workers', type = int, default = None, help = 'number of worker processes')
+    parser.add_argument('--json', action = 'store_true', help = 'print NDJSON instead of a table')
+    args = parser.parse_args()
+
+    rows = []
+    for stats in model_stats(args.model, args.workers, args.tensors):
+        if args.json:
+            print(json.dumps(stats.to_dict()))
+            sys.stdout.flush()
+        else:
+            rows.append(stats)
+    if not args.json:
+        print('\n'.join(format_stats_table(rows)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+#
+# Streaming access to the key/value metadata of GGUF files.
+#
+# iter_kv reads the header front to back with pread into a small window and
+# yields one entry at a time, so a caller looking for a few keys can stop
+# as soon as it has them, without building the field store of GGUFReader.
+# Arrays longer than max_array_items are stepped over by their lengths
+# (numeric arrays in a single jump, string arrays length prefix by length
+# prefix) and never decoded.
+#
+from __future__ import annotations
+
+import os
+import struct
+import sys
+from typing import Any, Callable, Iterator, NamedTuple
+
+from .constants import GGUF_MAGIC, GGUFValueType
+from .gguf_index import read_at
+
+# First read of the window, it grows as needed up to STREAM_MAX_CHUNK per read.
+STREAM_FIRST_CHUNK = 64 << 10
+STREAM_MAX_CHUNK = 4 << 20
+
+# Arrays with more items than this are skipped by default.
+STREAM_MAX_ARRAY_ITEMS = 64
+
+_SCALAR_FORMATS: dict[GGUFValueType, str] = {
+    GGUFValueType.UINT8:   'B',
+    GGUFValueType.INT8:    'b',
+    GGUFValueType.UINT16:  'H',
+    GGUFValueType.INT16:   'h',
+    GGUFValueType.UINT32:  'I',
+    GGUFValueType.INT32:   'i',
+    GGUFValueType.FLOAT32: 'f',
+    GGUFValueType.UINT64:  'Q',
+    GGUFValueType.INT64:   'q',
+    GGUFValueType.FLOAT64: 'd',
+    GGUFValueType.BOOL:    '?',
+}
+
+
+class StreamedKV(NamedTuple):
+    key: str
+    type: GGUFValueType
+
+    # Item type and length of arrays, None and 1 for other values.
+    item_type: GGUFValueType | None
+    count: int
+
+    # The value as ReaderField.contents() would return it, except that nested
+    # arrays stay nested. None when the array was skipped.
+    value: Any
+
+    # Offsets of the entry (its key) and of the next one in the file.
+    offset: int
+    end: int
+
+    @property
+    def skipped(self) -> bool:
+        return self.value is None
+
+
+class _Window:
+    # A sliding window over a file, consumed front to back.
+
+    def __init__(self, fd: int, file_size: int):
+        self.fd = fd
+        self.file_size = file_size
+        self.buf = b''
+        self.base = 0  # file offset of buf[0]
+        self.pos = 0   # read position in buf
+        self.chunk = STREAM_FIRST_CHUNK
+
+    @property
+    def offset(self) -> int:
+        return self.base + self.pos
+
+    def need(self, n: int) -> None:
+        # Make the next n bytes available from pos
+        if self.pos + n <= len(self.buf):
+            return
+        offset = self.offset
+        if offset + n > self.file_size:
+            raise ValueError(f'GGUF header is truncated, needs {offset + n} bytes but the file has {self.file_size}')
+        size = max(n, self.chunk)
+        self.chunk = min(2 * self.chunk, STREAM_MAX_CHUNK)
+        data = read_at(self.fd, min(size, self.file_size - offset), offset)
+        while len(data) < n:
+            more = read_at(self.fd, n - len(data), offset + len(data))
+            if not more:
+                raise ValueError(f'GGUF header is truncated, could only read up to {offset + len(data)}')
+            data += more
+        self.buf, self.base, self.pos = data, offset, 0
+
+    def unpack(self, fmt: struct.Struct) -> tuple[Any, ...]:
+        self.need(fmt.size)
+        values = fmt.unpack_from(self.buf, self.pos)
+        self.pos += fmt.size
+        return values
+
+    def take(self, n: int) -> bytes:
+        self.need(n)
+        data = self.buf[self.pos:self.pos + n]
+        self.pos += n
+        return data
+
+    def skip(self, n: int) -> None:
+        if self.offset + n > self.file_size:
+            raise ValueError(f'GGUF header is truncated, needs {self.offset + n} bytes but the file has {self.file_size}')
+        if self.pos + n <= len(self.buf):
+            self.pos += n
+        else:
+            self.buf, self.base, self.pos = b'', self.offset + n, 0
+
+
+class _KVParser:
+    def __init__(self, window: _Window, order: str):
+        self.window = window
+        self.u32 = struct.Struct(order + 'I')
+        self.u64 = struct.Struct(order + 'Q')
+        self.scalars = {gtype: struct.Struct(order + fmt) for gtype, fmt in _SCALAR_FORMATS.items()}
+
+    def string(self) -> str:
+        slen, = self.window.unpack(self.u64)
+        return str(self.window.take(slen), encoding = 'utf-8')
+
+    def value(self, gtype: GGUFValueType) -> Any:
+        scalar = self.scalars.get(gtype)
+        if scalar is not None:
+            return self.window.unpack(scalar)[0]
+        if gtype == GGUFValueType.STRING:
+            return self.string()
+        if gtype == GGUFValueType.ARRAY:
+            itype, alen = self.array_header()
+            return [self.value(itype) for _ in range(alen)]
+        raise ValueError(f'Unknown/unhandled field type {gtype}')
+
+    def skip(self, gtype: GGUFValueType) -> None:
+        scalar = self.scalars.get(gtype)
+        if scalar is not None:
+            self.window.skip(scalar.size)
+        elif gtype == GGUFValueType.STRING:
+            self.window.skip(self.window.unpack(self.u64)[0])
+        elif gtype == GGUFValueType.ARRAY:
+            itype, alen = self.array_header()
+            self.skip_items(itype, alen)
+        else:
+            raise ValueError(f'Unknown/unhandled field type {gtype}')
+
+    def skip_items(self, itype: GGUFValueType, count: int) -> None:
+        scalar = self.scalars.get(itype)
+        if scalar is not None:
+            self.window.skip(scalar.size * count)
+            return
+        window = self.window
+        if itype == GGUFValueType.STRING:
+            unpack_len = self.u64.unpack_from
+            for _ in range(count):
+                window.need(8)
+                window.pos += 8 + unpack_len(window.buf, window.pos)[0]
+                if window.pos > len(window.buf):
+                    # The string runs past the window, restart after it
+                    window.skip(0)
+            return
+        for _ in range(count):
+            self.skip(itype)
+
+    def array_header(self) -> tuple[GGUFValueType, int]:
+        itype, = self.window.unpack(self.u32)
+        alen, = self.window.unpack(self.u64)
+        return GGUFValueType(itype), alen
+
+
+def _open_header(path: os.PathLike[str] | str) -> tuple[int, _Window, _KVParser, int, int]:
+    # Open a file and read its fixed header, returns the fd, the window and
+    # parser positioned at the first key, the tensor and kv counts.
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        window = _Window(fd, os.fstat(fd).st_size)
+        window.need(24)
+        if struct.unpack_from('<I', window.buf, 0)[0] != GGUF_MAGIC:
+            raise ValueError('GGUF magic invalid')
+        order = '<' if sys.byteorder == 'little' else '>'
+        version, = struct.unpack_from(order + 'I', window.buf, 4)
+        if version & 65535 == 0:
+            # Written for the opposite byte order, see GGUFReader
+            order = '>' if order == '<' else '<'
+            version, = struct.unpack_from(order + 'I', window.buf, 4)
+        tensor_count, kv_count = struct.unpack_from(order + 'QQ', window.buf, 8)
+        window.pos = 24
+        return fd, window, _KVParser(window, order), tensor_count, kv_count
+    except BaseException:
+        os.close(fd)
+        raise
+
+
+def iter_kv(
+    path: os.PathLike[str] | str, max_array_items: int | None = STREAM_MAX_ARRAY_ITEMS,
+    decode: Callable[[str], bool] | None = None,
+) -> Iterator[StreamedKV]:
+    # Yield the key/value entries of a GGUF file in file order. Arrays with
+    # more than max_array_items items are skipped (None for no limit), and
+    # with decode only the values of the keys it returns True for are
+    # decoded at all. The file is closed when the generator is exhausted or
+    # closed, e.g. by leaving a for loop with break.
+    fd, window, parser, _tensor_count, kv_count = _open_header(path)
+    try:
+        for _ in range(kv_count):
+            offset = window.offset
+            key = parser.string()
+            gtype = GGUFValueType(window.unpack(parser.u32)[0])
+            wanted = decode is None or decode(key)
+            if gtype != GGUFValueType.ARRAY:
+                if wanted:
+                    value = parser.value(gtype)
+                else:
+                    parser.skip(gtype)
+                    value = None
+                yield StreamedKV(key, gtype, None, 1, value, offset, window.offset)
+                continue
+            itype, alen = parser.array_header()
+            if wanted and (max_array_items is None or alen <= max_array_items):
+                value = [parser.value(itype) for _ in range(alen)]
+            else:
+                parser.skip_items(itype, alen)
+                value = None
+            yield StreamedKV(key, gtype, itype, alen, value, offset, window.offset)
+    finally:
+        os.close(fd)
+
+
+def find_kv(
+    path: os.PathLike[str] | str, keys: Callable[[str], bool],
+    limit: int | None = None,
+) -> dict[str, Any]:
+    # Values of the keys matching a predicate, reading no further than the
+    # limit-th match when a limit is given.
+    found: dict[str, Any] = {}
+    for kv in iter_kv(path, None, decode = keys):
+        if keys(kv.key):
+            found[kv.key] = kv.value
+            if limit is not None and len(found) >= limit:
+                break
+    return found
@@ -0,0 +1,169 @@
+#
+# Structural validation of GGUF files. All checks run as numpy operations
+# over the tensor table of a GGUFReader, so even files with thousands of
+# tensors are checked in milliseconds without touching the tensor data.
+#
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from .constants import GGML_QUANT_SIZES, GGMLQuantizationType
+from .gguf_reader import GGUFReader
+
+# Number of offending tensors named per problem, the rest are only counted.
+VALIDATOR_MAX_EXAMPLES = 3
+
+
+class TensorGap(NamedTuple):
+    # Tensor the gap follows, None for a gap at the start of the data.
+    after: str | None
+
+    # Absolute offset and size of the unused bytes beyond the alignment padding.
+    offset: int
+    n_bytes: int
+
+
+class ValidationReport(NamedTuple):
+    path: Path
+    errors: list[str]
+    warnings: list[str]
+
+    # Bytes spent on aligning tensors, and unused bytes beyond that.
+    padding_bytes: int
+    gap_bytes: int
+    gaps: list[TensorGap]
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def describe(self) -> str:
+        lines = [f'{self.path.name}: {"OK" if self.ok else "INVALID"}']
+        lines += [f'  error: {e}' for e in self.errors]
+        lines += [f'  warning: {w}' for w in self.warnings]
+        lines.append(f'  padding: {self.padding_bytes} bytes, gaps: {self.gap_bytes} bytes in {len(self.gaps)} gap(s)')
+        return '\n'.join(lines)
+
+
+def _examples(names: list[str], mask: np.ndarray) -> str:
+    idxs = np.flatnonzero(mask)
+    shown = ', '.join(names[i] for i in idxs[:VALIDATOR_MAX_EXAMPLES])
+    more = len(idxs) - VALIDATOR_MAX_EXAMPLES
+    return shown + (f' and {more} more' if more > 0 else '')
+
+
+def validate_reader(reader: GGUFReader, file_size: int | None = None) -> ValidationReport:
+    path = Path(reader.path)
+    if file_size is None:
+        file_size = os.path.getsize(path)
+    table = reader.tensor_table
+    names = table.names
+    errors: list[str] = []
+    warnings: list[str] = []
+
+    # The reader refuses alignments that are not a power of two
+    alignment = int(reader.alignment)
+    if reader.data_offset > file_size:
+        errors.append(f'tensor data starts at {reader.data_offset}, past the end of the file ({file_size} bytes)')
+
+    if len(table) == 0:
+        return ValidationReport(path, errors, warnings, 0, 0, [])
+
+    offsets = table.offsets
+    starts = table.data_offsets
+    ends = starts + table.n_bytes
+
+    # Alignment of the tensor offsets
+    misaligned = offsets % np.uint64(alignment) != 0
+    if misaligned.any():
+        message = f'{int(misaligned.sum())} tensor(s) not aligned to {alignment} bytes: {_examples(names, misaligned)}'
+        # Offsets that are all aligned to some other power of two point at a
+        # general.alignment that does not match how the file was written
+        nonzero = offsets[offsets != 0]
+        actual = int(np.bitwise_and(nonzero, ~nonzero + np.uint64(1)).min()) if len(nonzero) else alignment
+        if actual > 1 and actual != alignment:
+            message += f' (the offsets are aligned to {actual}, general.alignment is {alignment})'
+        errors.append(message)
+
+    # Shapes: the first dimension must hold whole quantization blocks
+    block_sizes = np.ones(int(table.types.max()) + 1, dtype = np.uint64)
+    for qtype, (block_size, _type_size) in GGML_QUANT_SIZES.items():
+        if int(qtype) < len(block_sizes):
+            block_sizes[int(qtype)] = block_size
+    partial_blocks = table.dims[:, 0] % block_sizes[table.types] != 0
+    if partial_blocks.any():
+        for qtype in np.unique(table.types[partial_blocks]).tolist():
+            mask = partial_blocks & (table.types == qtype)
+            errors.append(
+                f'{int(mask.sum())} {GGMLQuantizationType(qtype).name} tensor(s) have a first dimension '
+                f'that is not a multiple of the block size {int(block_sizes[qtype])}: {_examples(names, mask)}'
+            )
+    empty = table.n_elements == 0
+    if empty.any():
+        warnings.append(f'{int(empty.sum())} tensor(s) have no elements: {_examples(names, empty)}')
+
+    # Ranges past the end of the file
+    past_eof = ends > np.uint64(file_size)
+    if past_eof.any():
+        errors.append(f'{int(past_eof.sum())} tensor(s) extend past the end of the file: {_examples(names, past_eof)}')
+
+    # Overlaps, checked on the tensors in file order against the furthest end
+    # of all the tensors before them
+    order = np.argsort(starts, kind = 'stable')
+    sorted_starts = starts[order]
+    sorted_ends = ends[order]
+    prev_ends = np.concatenate(([np.uint64(reader.data_offset)], np.maximum.accumulate(sorted_ends)[:-1]))
+    overlapping = np.zeros(len(table), dtype = np.bool_)
+    overlapping[order] = sorted_starts < prev_ends
+    overlapping[order[0]] = False
+    if overlapping.any():
+        errors.append(f'{int(overlapping.sum())} tensor(s) overlap the data of other tensors: {_examples(names, overlapping)}')
+
+    # Padding and gaps between consecutive tensors
+    aligned_prev_ends = (prev_ends + np.uint64(alignment - 1)) // np.uint64(alignment) * np.uint64(alignment)
+    following = sorted_starts >= prev_ends
+    padding = np.where(following, np.minimum(aligned_prev_ends, sorted_starts) - prev_ends, 0)
+    gap_sizes = np.where(following & (sorted_starts > aligned_prev_ends), sorted_starts - aligned_prev_ends, 0)
+    gaps = [
+        TensorGap(names[order[i - 1]] if i > 0 else None, int(aligned_prev_ends[i]), int(gap_sizes[i]))
+        for i in np.flatnonzero(gap_sizes).tolist()
+    ]
+    if gaps:
+        warnings.append(f'{int(gap_sizes.sum())} unused bytes in {len(gaps)} gap(s) between tensors')
+    trailing = file_size - int(sorted_ends.max())
+    if trailing >= alignment:
+        warnings.append(f'{trailing} bytes after the last tensor')
+
+    return ValidationReport(path, errors, warnings, int(padding.sum()), int(gap_sizes.sum()), gaps)
+
+
+def validate_file(path: os.PathLike[str] | str) -> ValidationReport:
+    # Validate a file, problems found while parsing the header are reported
+    # as errors as well.
+    try:
+        reader = GGUFReader(path, lazy_tensors = True)
+    except (ValueError, OverflowError) as e:
+        return ValidationReport(Path(path), [f'cannot parse header: {e}'], [], 0, 0, [])
+    return validate_reader(reader)
+
+
+def main() -> None:
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description = 'Check the structure of GGUF files')
+    parser.add_argument('models', nargs = '+', help = 'GGUF files')
+    args = parser.parse_args()
+
+    reports = [validate_file(model) for model in args.models]
+    for report in reports:
+        print(report.describe())
+    sys.exit(0 if all(report.ok for report in reports) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,26 +11,31 @@ from typing import Any
 if "NO_LOCAL_GGUF" not in os.environ and (Path(__file__).parent.parent.parent.parent / 'llama_server_UI').exists():
     sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from gguf import GGUFReader, GGUFValueType  # noqa: E402
+from gguf.gguf_stream import iter_kv  # noqa: E402
 
 logger = logging.getLogger("gguf-extract")
 
-def extract_block_and_context(reader: GGUFReader) -> None:
+def _is_wanted(field_name: str) -> bool:
+    field_name = field_name.lower()
+    return field_name.endswith(('.block_count', '.context_length')) or field_name in ('block_count', 'context_length')
+
+def extract_block_and_context(path: os.PathLike[str] | str) -> None:
     """Extract and print only block_count and context_length values, regardless of prefix."""
     block_count = None
     context_length = None
     
-    # Search through all fields for block_count and context_length
-    for field in reader.fields.values():
-        field_name = field.name.lower()
+    # Stream the metadata from the start of the file, only these two keys are
+    # decoded and reading stops as soon as both were found
+    for kv in iter_kv(path, decode=_is_wanted):
+        field_name = kv.key.lower()
         
         # Check for block_count with any prefix
         if field_name.endswith('.block_count') or field_name == 'block_count':
-            block_count = field.contents()
+            block_count = kv.value
             
         # Check for context_length with any prefix
         if field_name.endswith('.context_length') or field_name == 'context_length':
-            context_length = field.contents()
+            context_length = kv.value
             
         # If we found both values, we can stop
         if block_count is not None and context_length is not None:
@@ -55,8 +60,7 @@ def main() -> None:
     logging.basicConfig(level=logging.INFO)
     logger.info(f'* Loading: {args.model}')
     
-    reader = GGUFReader(args.model, 'r')
-    extract_block_and_context(reader)
+    extract_block_and_context(args.model)
 
 if __name__ == '__main__':
     main()
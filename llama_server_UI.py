@@ -2,20 +2,31 @@
 import os
 import json
 import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
+from tkinter import filedialog, messagebox, simpledialog, ttk
 import subprocess
 import configparser
-import re
 from pathlib import Path
 import signal
 import platform
+import threading
+import time
+
+from draft_models import find_draft_candidates, model_size
+from model_downloader import DownloadError, ModelDownloader
+from gguf import GGUFSplitReader, split_shard_paths
+from gguf.gguf_dump import dump_file
+from gguf.gguf_fingerprint import model_fingerprint
+from gguf.gguf_integrity import manifest_path, verify_manifest, write_manifest
+from gguf.gguf_validator import validate_file
+from startup_profiler import StartupHistory, StartupProfiler, format_profile, profile_key
+from server_flags import SERVER_FLAGS, CapabilityCache, build_args, validate_params
 
 
 class LlamaServerUI:
     def __init__(self, root):
         self.root = root
         self.root.title("Llama Server UI")
-        self.root.geometry("700x550")
+        self.root.geometry("760x960")
         self.root.resizable(True, True)
 
         # Configuration file
@@ -25,11 +36,27 @@ class LlamaServerUI:
         # Default values
         self.llama_server_path = ""
         self.gguf_model_path = ""
+        self.model_dirs = ""
+        self.verify_model = False
         self.params_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parameters")
         
+        # Flags supported by the selected llama-server, cached per binary hash
+        self.capability_cache = CapabilityCache(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "server_capabilities.json"))
+        self.capabilities = None
+        
         # Server process tracking
         self.server_process = None
         
+        # Running model download, see model_downloader.py
+        self.downloader = None
+        
+        # Startup phase timing of the running server and the history to compare against
+        self.startup_profiler = None
+        self.startup_cmd = None
+        self.startup_history = StartupHistory(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_history.json"))
+        
         # Ensure parameters folder exists
         if not os.path.exists(self.params_folder):
             os.makedirs(self.params_folder)
@@ -39,6 +66,7 @@ class LlamaServerUI:
         
         # Create the UI
         self.create_widgets()
+        self.load_capabilities()
         
     def load_config(self):
         """Load configuration from file if it exists"""
@@ -48,6 +76,8 @@ class LlamaServerUI:
                 settings = self.config["Settings"]
                 self.llama_server_path = settings.get("llama_server_path", "")
                 self.gguf_model_path = settings.get("gguf_model_path", "")
+                self.model_dirs = settings.get("model_dirs", "")
+                self.verify_model = settings.getboolean("verify_model", False)
     
     def save_config(self):
         """Save configuration to file"""
@@ -56,6 +86,8 @@ class LlamaServerUI:
         
         self.config["Settings"]["llama_server_path"] = self.llama_server_path
         self.config["Settings"]["gguf_model_path"] = self.gguf_model_path
+        self.config["Settings"]["model_dirs"] = self.model_dirs
+        self.config["Settings"]["verify_model"] = str(self.verify_model)
         
         with open(self.config_file, "w") as f:
             self.config.write(f)
@@ -84,37 +116,40 @@ class LlamaServerUI:
         ttk.Entry(model_frame, textvariable=self.model_path_var, width=50).grid(row=0, column=1, padx=5, pady=5, sticky=tk.W+tk.E)
         ttk.Button(model_frame, text="Browse", command=self.browse_model).grid(row=0, column=2, padx=5, pady=5)
         
+        # Optional tensor digest check before starting, see gguf/gguf_integrity.py
+        self.verify_model_var = tk.BooleanVar(value=self.verify_model)
+        ttk.Checkbutton(model_frame, text="Verify model integrity before start", variable=self.verify_model_var,
+                        command=self.toggle_verify_model).grid(row=1, column=1, sticky=tk.W, padx=5, pady=5)
+        ttk.Button(model_frame, text="Download", command=self.download_model).grid(row=1, column=2, padx=5, pady=5)
+        
         # Parameters Frame
         params_frame = ttk.LabelFrame(main_frame, text="Server Parameters", padding="10")
         params_frame.pack(fill=tk.X, padx=5, pady=5)
         
-        # GPU Layers
-        self.gpu_layers_var = tk.StringVar(value="0")
-        ttk.Label(params_frame, text="GPU Layers (ngl):").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
-        ttk.Entry(params_frame, textvariable=self.gpu_layers_var, width=10).grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
-        
-        # Context Size
-        self.context_size_var = tk.StringVar(value="2048")
-        ttk.Label(params_frame, text="Context Size (c):").grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
-        ttk.Entry(params_frame, textvariable=self.context_size_var, width=10).grid(row=1, column=1, padx=5, pady=5, sticky=tk.W)
+        # Widgets are generated from the flag schema in server_flags.py
+        self.param_vars = {}
+        self.param_widgets = {}
+        basic_rows = self.create_flag_widgets(params_frame, "basic", columns=1)
         
-        # Host
-        self.host_var = tk.StringVar(value="0.0.0.0")
-        ttk.Label(params_frame, text="Host:").grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
-        ttk.Entry(params_frame, textvariable=self.host_var, width=15).grid(row=2, column=1, padx=5, pady=5, sticky=tk.W)
+        # Update Button
+        ttk.Button(params_frame, text="Update from Model", command=self.update_from_model).grid(row=basic_rows, column=0, columnspan=2, padx=5, pady=10)
         
-        # Port
-        self.port_var = tk.StringVar(value="9000")
-        ttk.Label(params_frame, text="Port:").grid(row=3, column=0, sticky=tk.W, padx=5, pady=5)
-        ttk.Entry(params_frame, textvariable=self.port_var, width=10).grid(row=3, column=1, padx=5, pady=5, sticky=tk.W)
+        # Performance Parameters Frame, empty values are left out of the command
+        perf_frame = ttk.LabelFrame(main_frame, text="Performance Parameters", padding="10")
+        perf_frame.pack(fill=tk.X, padx=5, pady=5)
+        self.create_flag_widgets(perf_frame, "performance", columns=2)
         
-        # Device
-        self.device_var = tk.StringVar(value="Vulkan1")
-        ttk.Label(params_frame, text="Device:").grid(row=4, column=0, sticky=tk.W, padx=5, pady=5)
-        ttk.Entry(params_frame, textvariable=self.device_var, width=15).grid(row=4, column=1, padx=5, pady=5, sticky=tk.W)
+        # Draft Model Frame for speculative decoding
+        draft_frame = ttk.LabelFrame(main_frame, text="Draft Model (Speculative Decoding)", padding="10")
+        draft_frame.pack(fill=tk.X, padx=5, pady=5)
+        draft_rows = self.create_flag_widgets(draft_frame, "draft", columns=1)
+        self.param_widgets["draft_model"].config(width=50)
+        ttk.Button(draft_frame, text="Browse", command=self.browse_draft_model).grid(row=0, column=2, padx=5, pady=5)
         
-        # Update Button
-        ttk.Button(params_frame, text="Update from Model", command=self.update_from_model).grid(row=5, column=0, columnspan=2, padx=5, pady=10)
+        self.model_dirs_var = tk.StringVar(value=self.model_dirs)
+        ttk.Label(draft_frame, text="Search Directories:").grid(row=draft_rows, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(draft_frame, textvariable=self.model_dirs_var, width=50).grid(row=draft_rows, column=1, padx=5, pady=5, sticky=tk.W+tk.E)
+        ttk.Button(draft_frame, text="Find Compatible", command=self.find_draft_model).grid(row=draft_rows, column=2, padx=5, pady=5)
         
         # Model Info Frame
         info_frame = ttk.LabelFrame(main_frame, text="Model Information", padding="10")
@@ -157,11 +192,84 @@ class LlamaServerUI:
         # Update the command preview when any parameter changes
         self.server_path_var.trace_add("write", lambda *args: self.update_command_preview())
         self.model_path_var.trace_add("write", lambda *args: self.update_command_preview())
-        self.gpu_layers_var.trace_add("write", lambda *args: self.update_command_preview())
-        self.context_size_var.trace_add("write", lambda *args: self.update_command_preview())
-        self.host_var.trace_add("write", lambda *args: self.update_command_preview())
-        self.port_var.trace_add("write", lambda *args: self.update_command_preview())
-        self.device_var.trace_add("write", lambda *args: self.update_command_preview())
+        for var in self.param_vars.values():
+            var.trace_add("write", lambda *args: self.update_command_preview())
+    
+    def create_flag_widgets(self, frame, group, columns):
+        """Create an input widget for every flag of a schema group, returns the number of rows used"""
+        specs = [spec for spec in SERVER_FLAGS if spec.group == group]
+        for i, spec in enumerate(specs):
+            row, col = divmod(i, columns)
+            col *= 2
+            
+            if spec.kind == "bool":
+                var = tk.BooleanVar(value=bool(spec.default))
+                widget = ttk.Checkbutton(frame, text=spec.label, variable=var)
+                widget.grid(row=row, column=col, columnspan=2, sticky=tk.W, padx=5, pady=5)
+            else:
+                var = tk.StringVar(value=str(spec.default))
+                ttk.Label(frame, text=spec.label).grid(row=row, column=col, sticky=tk.W, padx=5, pady=5)
+                if spec.kind == "choice":
+                    widget = ttk.Combobox(frame, textvariable=var, values=spec.choices, width=12, state="readonly")
+                else:
+                    widget = ttk.Entry(frame, textvariable=var, width=15)
+                widget.grid(row=row, column=col + 1, padx=5, pady=5, sticky=tk.W)
+            
+            self.param_vars[spec.key] = var
+            self.param_widgets[spec.key] = widget
+        
+        return (len(specs) + columns - 1) // columns
+    
+    def load_capabilities(self):
+        """Discover the flags supported by the selected llama-server on a thread, the UI is updated when done
+        
+        Hashing a new binary and running its --help can take seconds, every
+        flag stays enabled in the meantime.
+        """
+        self.capabilities = None
+        self.apply_capabilities()
+        server_path = self.llama_server_path
+        if not server_path or not os.path.isfile(server_path):
+            return
+        result = {}
+        
+        def load():
+            try:
+                result["capabilities"] = self.capability_cache.get(server_path)
+            except OSError:
+                result["capabilities"] = None
+        
+        thread = threading.Thread(target=load, daemon=True)
+        thread.start()
+        self.root.after(100, self.poll_capabilities, thread, result, server_path)
+    
+    def poll_capabilities(self, thread, result, server_path):
+        """Apply the capabilities of a binary once they are loaded"""
+        if thread.is_alive():
+            self.root.after(100, self.poll_capabilities, thread, result, server_path)
+            return
+        # Another binary may have been selected while this one was loading
+        if server_path != self.llama_server_path:
+            return
+        self.capabilities = result.get("capabilities")
+        self.apply_capabilities()
+    
+    def apply_capabilities(self):
+        """Grey out the flags the selected binary does not support and update the preview"""
+        for spec in SERVER_FLAGS:
+            if spec.group == "basic":
+                continue
+            widget = self.param_widgets[spec.key]
+            if self.capabilities is None or self.capabilities.supports(spec):
+                widget.state(["!disabled"])
+            else:
+                widget.state(["disabled"])
+        
+        self.update_command_preview()
+    
+    def get_raw_params(self):
+        """Get the current raw parameter values from the UI"""
+        return {key: var.get() for key, var in self.param_vars.items()}
     
     def browse_server(self):
         """Browse for llama-server executable"""
@@ -170,7 +278,7 @@ class LlamaServerUI:
             self.llama_server_path = path
             self.server_path_var.set(path)
             self.save_config()
-            self.update_command_preview()
+            self.load_capabilities()
     
     def browse_model(self):
         """Browse for GGUF model file"""
@@ -186,6 +294,127 @@ class LlamaServerUI:
             self.update_model_info()
             self.update_command_preview()
     
+    def download_model(self):
+        """Download a model from an HTTP mirror into the model directory, or cancel the running download"""
+        if self.downloader is not None:
+            if messagebox.askyesno("Download", "Cancel the running download? It can be resumed later."):
+                self.downloader.cancel()
+            return
+        
+        url = simpledialog.askstring("Download Model", "URL of the GGUF file:", parent=self.root)
+        if not url:
+            return
+        self.model_dirs = self.model_dirs_var.get()
+        dirs = self.get_model_dirs()
+        dest = dirs[0] if dirs else filedialog.askdirectory(title="Select Download Directory")
+        if not dest:
+            return
+        
+        self.downloader = ModelDownloader(url.strip(), dest)
+        result = {}
+        
+        def download():
+            try:
+                result["path"] = self.downloader.run()
+            except Exception as e:
+                result["error"] = e
+        
+        thread = threading.Thread(target=download, daemon=True)
+        thread.start()
+        self.start_button.config(state=tk.DISABLED)
+        self.server_status_var.set("Downloading: checking model")
+        self.root.after(500, self.poll_download, thread, result)
+    
+    def poll_download(self, thread, result):
+        """Show the download progress and select the model when it is complete"""
+        downloader = self.downloader
+        if thread.is_alive():
+            if downloader.total:
+                self.server_status_var.set(
+                    f"Downloading: {downloader.bytes_done / downloader.total:.1%} ({downloader.rate / 1e6:.1f} MB/s)")
+            self.root.after(500, self.poll_download, thread, result)
+            return
+        
+        self.downloader = None
+        self.update_server_status(self.server_process is not None)
+        if "error" in result:
+            error = result["error"]
+            title = "Download Failed" if isinstance(error, DownloadError) else "Error"
+            messagebox.showerror(title, f"{downloader.url}:\n{str(error)}")
+            return
+        
+        self.gguf_model_path = result["path"]
+        self.model_path_var.set(result["path"])
+        self.save_config()
+        self.load_model_parameters()
+        self.update_model_info()
+        self.update_command_preview()
+    
+    def toggle_verify_model(self):
+        """Remember the pre-launch integrity check setting"""
+        self.verify_model = self.verify_model_var.get()
+        self.save_config()
+    
+    def browse_draft_model(self):
+        """Browse for a GGUF draft model file"""
+        path = filedialog.askopenfilename(
+            title="Select GGUF Draft Model",
+            filetypes=[("GGUF Files", "*.gguf"), ("All Files", "*.*")]
+        )
+        if path:
+            self.param_vars["draft_model"].set(path)
+    
+    def get_model_dirs(self):
+        """Get the directories searched for draft models, defaults to the model's directory"""
+        dirs = [d.strip() for d in self.model_dirs_var.get().split(os.pathsep) if d.strip()]
+        if not dirs and self.gguf_model_path:
+            dirs = [os.path.dirname(os.path.abspath(self.gguf_model_path))]
+        return dirs
+    
+    def find_draft_model(self):
+        """Search the model directories for draft models sharing the model's tokenizer"""
+        if not os.path.exists(self.gguf_model_path):
+            messagebox.showerror("Error", "Please select a GGUF model file first.")
+            return
+        
+        self.model_dirs = self.model_dirs_var.get()
+        self.save_config()
+        
+        try:
+            candidates = find_draft_candidates(self.gguf_model_path, self.get_model_dirs())
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to search for draft models: {str(e)}")
+            return
+        
+        if not candidates:
+            messagebox.showinfo("Draft Model", "No smaller model with a compatible tokenizer was found.")
+            return
+        
+        # Let the user pick one of the candidates, best ranked first
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Compatible Draft Models")
+        dialog.geometry("600x250")
+        dialog.grab_set()
+        
+        listbox = tk.Listbox(dialog)
+        listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        for candidate in candidates:
+            size_gb = candidate.size / (1024 * 1024 * 1024)
+            listbox.insert(tk.END, f"{os.path.basename(candidate.path)}  ({size_gb:.2f} GB, {candidate.size_ratio:.1%} of target)")
+        listbox.selection_set(0)
+        
+        def use_selected():
+            selection = listbox.curselection()
+            if selection:
+                self.param_vars["draft_model"].set(candidates[selection[0]].path)
+            dialog.destroy()
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        ttk.Button(button_frame, text="Use Selected", command=use_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+    
     def update_model_info(self):
         """Update the model information text area"""
         self.info_text.config(state=tk.NORMAL)
@@ -193,16 +422,20 @@ class LlamaServerUI:
         
         if os.path.exists(self.gguf_model_path):
             model_name = os.path.basename(self.gguf_model_path)
-            model_size = os.path.getsize(self.gguf_model_path) / (1024 * 1024 * 1024)  # Size in GB
+            size_gb = model_size(self.gguf_model_path) / (1024 * 1024 * 1024)  # Size in GB, all shards
+            shard_count = len(split_shard_paths(self.gguf_model_path))
             
             info_text = f"Model: {model_name}\n"
-            info_text += f"Size: {model_size:.2f} GB\n"
+            info_text += f"Size: {size_gb:.2f} GB\n"
             
-            if self.context_size_var.get():
-                info_text += f"Context Length: {self.context_size_var.get()} tokens\n"
+            if shard_count > 1:
+                info_text += f"Shards: {shard_count}\n"
             
-            if self.gpu_layers_var.get():
-                info_text += f"GPU Layers: {self.gpu_layers_var.get()}\n"
+            if self.param_vars["context_size"].get():
+                info_text += f"Context Length: {self.param_vars['context_size'].get()} tokens\n"
+            
+            if self.param_vars["gpu_layers"].get():
+                info_text += f"GPU Layers: {self.param_vars['gpu_layers'].get()}\n"
             
             self.info_text.insert(tk.END, info_text)
         else:
@@ -211,74 +444,73 @@ class LlamaServerUI:
         self.info_text.config(state=tk.DISABLED)
     
     def update_from_model(self):
-        """Update parameters from model using gguf_dump-v3.py script"""
+        """Update parameters from the model metadata, see gguf/gguf_dump.py"""
         if not os.path.exists(self.gguf_model_path):
             messagebox.showerror("Error", "Please select a GGUF model file first.")
             return
         
-        script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gguf_dump-v3.py")
-        
-        if not os.path.exists(script_path):
-            messagebox.showerror("Error", "gguf_dump-v3.py script not found in the same directory.")
-            return
-        
         try:
-            # Run the gguf_dump-v3.py script to extract parameters
-            result = subprocess.run(
-                ["python", script_path, self.gguf_model_path],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            
-            output = result.stdout + result.stderr
-            
-            # Extract block_count and context_length using regex
-            block_count_match = re.search(r'block_count\s*=\s*(\d+)', output)
-            context_length_match = re.search(r'context_length\s*=\s*(\d+)', output)
+            # Only the two keys are decoded, with any architecture prefix
+            metadata = dump_file(self.gguf_model_path, keys=["block_count", "*.block_count",
+                                                             "context_length", "*.context_length"])["metadata"]
+            block_count = next((value for key, value in metadata.items() if key.endswith("block_count")), None)
+            context_length = next((value for key, value in metadata.items() if key.endswith("context_length")), None)
             
-            if block_count_match and context_length_match:
-                block_count = int(block_count_match.group(1))
-                context_length = int(context_length_match.group(1))
+            if block_count is not None and context_length is not None:
+                block_count = int(block_count)
+                context_length = int(context_length)
                 
                 # Set values in the UI (add 1 to block_count as per requirements)
-                self.gpu_layers_var.set(str(block_count + 1))
-                self.context_size_var.set(str(context_length))
+                self.param_vars["gpu_layers"].set(str(block_count + 1))
+                self.param_vars["context_size"].set(str(context_length))
                 
                 messagebox.showinfo("Success", f"Updated parameters from model:\nGPU Layers: {block_count + 1}\nContext Size: {context_length}")
                 self.update_model_info()
                 self.update_command_preview()
             else:
-                messagebox.showerror("Error", "Failed to extract parameters from model output.")
+                messagebox.showerror("Error", "The model has no block_count or context_length metadata.")
         
-        except subprocess.CalledProcessError as e:
-            messagebox.showerror("Error", f"Failed to run gguf_dump-v3.py: {str(e)}\n{e.stderr}")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
     
+    def get_model_key(self):
+        """Get the key of the per-model state, the content fingerprint of the model
+        
+        The fingerprint stays the same when the model is renamed or copied, the
+        file name is used when the model cannot be read.
+        """
+        try:
+            return model_fingerprint(self.gguf_model_path)
+        except (OSError, ValueError):
+            return os.path.basename(self.gguf_model_path)
+    
     def get_params_filename(self):
-        """Get the parameters filename based on the model name"""
+        """Get the parameters filename based on the model fingerprint"""
         if not self.gguf_model_path:
             return None
         
-        model_name = os.path.basename(self.gguf_model_path)
-        return os.path.join(self.params_folder, f"{model_name}.json")
+        return os.path.join(self.params_folder, f"{self.get_model_key()}.json")
     
     def load_model_parameters(self):
         """Load parameters for the selected model if they exist"""
         params_file = self.get_params_filename()
         
+        # Parameters saved before they were keyed by fingerprint are named after the model file
+        if params_file and not os.path.exists(params_file):
+            params_file = os.path.join(self.params_folder, f"{os.path.basename(self.gguf_model_path)}.json")
+        
         if params_file and os.path.exists(params_file):
             try:
                 with open(params_file, 'r') as f:
                     params = json.load(f)
                 
-                # Update UI with loaded parameters
-                self.gpu_layers_var.set(str(params.get("gpu_layers", "0")))
-                self.context_size_var.set(str(params.get("context_size", "2048")))
-                self.host_var.set(params.get("host", "0.0.0.0"))
-                self.port_var.set(str(params.get("port", "9000")))
-                self.device_var.set(params.get("device", "Vulkan1"))
+                # Update UI with loaded parameters, missing keys fall back to the defaults
+                for spec in SERVER_FLAGS:
+                    value = params.get(spec.key, spec.default)
+                    if spec.kind == "bool":
+                        self.param_vars[spec.key].set(bool(value))
+                    else:
+                        self.param_vars[spec.key].set("" if value is None else str(value))
                 
                 messagebox.showinfo("Parameters Loaded", f"Loaded saved parameters for {os.path.basename(self.gguf_model_path)}")
                 self.update_command_preview()
@@ -296,15 +528,14 @@ class LlamaServerUI:
         if not params_file:
             return
         
+        params, errors = validate_params(self.get_raw_params())
+        if errors:
+            messagebox.showerror("Invalid Parameters", "\n".join(errors.values()))
+            return
+        
         try:
-            # Prepare parameters dictionary
-            params = {
-                "gpu_layers": int(self.gpu_layers_var.get() or 0),
-                "context_size": int(self.context_size_var.get() or 2048),
-                "host": self.host_var.get(),
-                "port": int(self.port_var.get() or 9000),
-                "device": self.device_var.get()
-            }
+            # Unset optional flags are not stored
+            params = {key: value for key, value in params.items() if value is not None}
             
             # Save to file
             with open(params_file, 'w') as f:
@@ -319,16 +550,12 @@ class LlamaServerUI:
         if not self.llama_server_path or not self.gguf_model_path:
             return []
         
+        # Invalid values are left out here, start_server refuses to run with them
+        params, _errors = validate_params(self.get_raw_params())
+        
         # Build command
-        cmd = [
-            self.llama_server_path,
-            "-m", self.gguf_model_path,
-            "-ngl", self.gpu_layers_var.get(),
-            "-c", self.context_size_var.get(),
-            "--port", self.port_var.get(),
-            "--device", self.device_var.get(),
-            "--host", self.host_var.get()
-        ]
+        cmd = [self.llama_server_path, "-m", self.gguf_model_path]
+        cmd += build_args(params, self.capabilities)
         
         return cmd
         
@@ -407,6 +634,30 @@ class LlamaServerUI:
             messagebox.showinfo("Server Running", "The server is already running.")
             return
         
+        _params, errors = validate_params(self.get_raw_params())
+        if errors:
+            messagebox.showerror("Invalid Parameters", "\n".join(errors.values()))
+            return
+        
+        # Split models are refused early when shards are missing or don't belong together
+        if len(split_shard_paths(self.gguf_model_path)) > 1:
+            try:
+                GGUFSplitReader(self.gguf_model_path)
+            except Exception as e:
+                messagebox.showerror("Error", f"Invalid split model: {str(e)}")
+                return
+        
+        # Broken tensor tables are found in milliseconds, instead of after minutes of loading
+        try:
+            invalid = [report.describe() for report in map(validate_file, split_shard_paths(self.gguf_model_path))
+                       if not report.ok]
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to read model: {str(e)}")
+            return
+        if invalid:
+            messagebox.showerror("Invalid Model", "\n\n".join(invalid) + "\n\nThe server was not started.")
+            return
+        
         try:
             # Get command
             cmd = self.build_command()
@@ -420,16 +671,129 @@ class LlamaServerUI:
             # Save parameters before starting
             self.save_parameters()
             
-            # Start server in a new process
-            self.server_process = subprocess.Popen(cmd)
+            if self.verify_model_var.get():
+                self.start_verification(cmd)
+            else:
+                self.launch_server(cmd)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to start server: {str(e)}")
+    
+    def verify_model_files(self):
+        """Check every shard of the model against its digest manifest, returns (shard, report) pairs
+        
+        A shard without a manifest gets one written, its report is None.
+        """
+        results = []
+        for shard in split_shard_paths(self.gguf_model_path):
+            if manifest_path(shard).exists():
+                results.append((shard, verify_manifest(shard)))
+            else:
+                write_manifest(shard)
+                results.append((shard, None))
+        return results
+    
+    def start_verification(self, cmd):
+        """Verify the model on a thread, the server is launched when it is intact"""
+        self.start_button.config(state=tk.DISABLED)
+        self.server_status_var.set("Server Status: Verifying Model")
+        result = {}
+        
+        def verify():
+            try:
+                result["reports"] = self.verify_model_files()
+            except Exception as e:
+                result["error"] = e
+        
+        thread = threading.Thread(target=verify, daemon=True)
+        thread.start()
+        self.root.after(200, self.poll_verification, thread, result, cmd)
+    
+    def poll_verification(self, thread, result, cmd):
+        """Wait for the integrity check and launch the server when it passed"""
+        if thread.is_alive():
+            self.root.after(200, self.poll_verification, thread, result, cmd)
+            return
+        
+        self.update_server_status(False)
+        if "error" in result:
+            messagebox.showerror("Error", f"Model verification failed: {str(result['error'])}")
+            return
+        
+        lines = ["", "Integrity Check:"]
+        failed = []
+        for shard, report in result["reports"]:
+            if report is None:
+                lines.append(f"{shard.name}: manifest created")
+            else:
+                lines.append(report.describe())
+                if not report.ok:
+                    failed.append(report.describe())
+        self.info_text.config(state=tk.NORMAL)
+        self.info_text.insert(tk.END, "\n".join(lines) + "\n")
+        self.info_text.config(state=tk.DISABLED)
+        
+        if failed:
+            messagebox.showerror("Corrupt Model", "\n".join(failed) + "\n\nThe server was not started.")
+            return
+        self.launch_server(cmd)
+    
+    def launch_server(self, cmd):
+        """Start the server process and follow its startup"""
+        try:
+            # Start server in a new process, its output is followed by the startup profiler
+            start_time = time.perf_counter()
+            self.server_process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+                errors="replace"
+            )
+            self.startup_profiler = StartupProfiler(self.server_process, start_time)
+            self.startup_cmd = cmd
             
             # Update UI state
             self.update_server_status(True)
+            self.server_status_var.set("Server Status: Starting")
+            self.root.after(500, self.poll_startup)
             
             messagebox.showinfo("Server Started", "Llama Server has been started.")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to start server: {str(e)}")
     
+    def poll_startup(self):
+        """Wait for the startup profiler to finish and record the startup profile"""
+        profiler = self.startup_profiler
+        if profiler is None:
+            return
+        if not profiler.done.is_set():
+            self.root.after(500, self.poll_startup)
+            return
+        
+        self.startup_profiler = None
+        profile = profiler.profile
+        if not profile.ready:
+            if profiler.process.poll() is not None and profiler.process is self.server_process:
+                self.update_server_status(False)
+                messagebox.showerror("Error", "Llama Server exited during startup, see the console output.")
+            return
+        
+        model_key = self.get_model_key()
+        try:
+            regressions = self.startup_history.add(model_key, profile_key(self.startup_cmd), profile)
+        except OSError:
+            regressions = []
+        
+        self.server_status_var.set(f"Server Status: Running (ready in {profile.total:.1f}s)")
+        
+        lines = ["", "Startup Profile:"] + format_profile(profile)
+        if regressions:
+            lines += ["", "Slower than usual:"] + regressions
+        self.info_text.config(state=tk.NORMAL)
+        self.info_text.insert(tk.END, "\n".join(lines) + "\n")
+        self.info_text.config(state=tk.DISABLED)
+    
     def stop_server(self):
         """Stop the running server process"""
         if not self.server_process or self.server_process.poll() is not None:
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""Replay chat/completion requests against a llama-server and measure latency.
+
+Requests come from a JSONL trace (one request per line, with either
+"messages" for /v1/chat/completions or "prompt" for /v1/completions) or
+from a synthetic distribution. They are sent with streaming enabled, either
+by a fixed number of concurrent clients or at a fixed arrival rate, and the
+time to first token (TTFT), inter-token latency (ITL), end-to-end latency
+and aggregate tokens/s are reported as JSON.
+
+A stub server emitting SSE tokens at a configurable rate is included to
+check the measurements:
+
+    python3 load_generator.py stub --port 9100 --token-rate 50
+    python3 load_generator.py run --url http://127.0.0.1:9100 --synthetic 64 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+CHAT_ENDPOINT = "/v1/chat/completions"
+COMPLETION_ENDPOINT = "/v1/completions"
+
+_WORDS = ("the quick brown fox jumps over a lazy dog while seven wizards quietly "
+          "judge boxing matches in the old stone tower").split()
+
+
+@dataclass
+class RequestResult:
+    ok: bool = False
+    error: str = ""
+    start: float = 0.0
+    ttft: float = None             # seconds from send to first token
+    e2e: float = None              # seconds from send to end of stream
+    token_times: list = field(default_factory=list)
+
+    @property
+    def n_tokens(self):
+        return len(self.token_times)
+
+    @property
+    def itls(self):
+        return [b - a for a, b in zip(self.token_times, self.token_times[1:])]
+
+
+def load_trace(path):
+    """Load a JSONL request trace, lines may hold "messages" or "prompt" plus sampling options"""
+    requests = []
+    with open(path, "r") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            request = json.loads(line)
+            if "messages" not in request and "prompt" not in request:
+                raise ValueError(f"{path}:{line_no}: request needs \"messages\" or \"prompt\"")
+            requests.append(request)
+    return requests
+
+
+def synthetic_requests(count, prompt_words=128, max_tokens=128, chat=True, seed=0):
+    """Generate requests with exponentially distributed prompt and output lengths"""
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(count):
+        n_words = max(1, int(rng.expovariate(1 / prompt_words)))
+        prompt = " ".join(rng.choice(_WORDS) for _ in range(n_words))
+        n_tokens = max(1, int(rng.expovariate(1 / max_tokens)))
+        if chat:
+            requests.append({"messages": [{"role": "user", "content": prompt}], "max_tokens": n_tokens})
+        else:
+            requests.append({"prompt": prompt, "max_tokens": n_tokens})
+    return requests
+
+
+async def _read_chunked(reader):
+    """Yield the body chunks of a chunked HTTP response"""
+    while True:
+        size_line = await reader.readline()
+        if not size_line:
+            return
+        size = int(size_line.split(b";")[0].strip() or b"0", 16)
+        if size == 0:
+            await reader.readline()
+            return
+        data = await reader.readexactly(size)
+        await reader.readexactly(2)
+        yield data
+
+
+async def _read_plain(reader, length):
+    """Yield the body chunks of a response with Content-Length or read until close"""
+    remaining = length
+    while remaining is None or remaining > 0:
+        data = await reader.read(65536 if remaining is None else min(65536, remaining))
+        if not data:
+            return
+        if remaining is not None:
+            remaining -= len(data)
+        yield data
+
+
+def _event_has_token(payload):
+    """Check whether an SSE JSON payload carries generated text"""
+    for choice in payload.get("choices", ()):
+        delta = choice.get("delta")
+        if delta is not None and delta.get("content"):
+            return True
+        if choice.get("text"):
+            return True
+    # llama-server native /completion endpoint
+    return bool(payload.get("content"))
+
+
+async def send_request(url, request, timeout=600.0):
+    """Send one streaming request and record the arrival time of every token"""
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)
+    endpoint = request.get("endpoint") or (CHAT_ENDPOINT if "messages" in request else COMPLETION_ENDPOINT)
+    body = {k: v for k, v in request.items() if k not in ("endpoint", "timestamp")}
+    body["stream"] = True
+    payload = json.dumps(body).encode()
+
+    result = RequestResult(start=time.perf_counter())
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=parts.scheme == "https"), timeout)
+        writer.write(
+            f"POST {parts.path.rstrip('/')}{endpoint} HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            "Content-Type: application/json\r\n"
+            "Accept: text/event-stream\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "Connection: close\r\n\r\n".encode() + payload)
+        await writer.drain()
+
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        status = int(status_line.split()[1])
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        if status != 200:
+            result.error = f"HTTP {status}"
+            return result
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = _read_chunked(reader)
+        else:
+            length = headers.get("content-length")
+            chunks = _read_plain(reader, int(length) if length else None)
+
+        buffer = b""
+        async for chunk in chunks:
+            now = time.perf_counter()
+            buffer += chunk
+            *events, buffer = buffer.split(b"\n")
+            for event in events:
+                event = event.strip()
+                if not event.startswith(b"data:"):
+                    continue
+                data = event[5:].strip()
+                if data == b"[DONE]":
+                    continue
+                if _event_has_token(json.loads(data)):
+                    result.token_times.append(now)
+
+        end = time.perf_counter()
+        result.e2e = end - result.start
+        if result.token_times:
+            result.ttft = result.token_times[0] - result.start
+        result.ok = True
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+        result.error = f"{type(e).__name__}: {e}"
+    finally:
+        if writer is not None:
+            writer.close()
+    return result
+
+
+async def run_concurrency(url, requests, concurrency):
+    """Closed loop: a fixed number of clients each send their next request when the previous one finished"""
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    results = []
+
+    async def client():
+        while not queue.empty():
+            results.append(await send_request(url, queue.get_nowait()))
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return results
+
+
+async def run_rate(url, requests, rate, seed=0):
+    """Open loop: requests arrive as a Poisson process with the given rate per second"""
+    rng = random.Random(seed)
+    tasks = []
+    for request in requests:
+        tasks.append(asyncio.ensure_future(send_request(url, request)))
+        await asyncio.sleep(rng.expovariate(rate))
+    return list(await asyncio.gather(*tasks))
+
+
+def percentile(values, q):
+    """Get the q-th percentile (0-100) of values using linear interpolation"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (pos - lower)
+
+
+def _summary(values):
+    if not values:
+        return None
+    return {
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def build_report(results, duration):
+    """Summarize request results into a JSON serializable report"""
+    ok = [r for r in results if r.ok]
+    total_tokens = sum(r.n_tokens for r in ok)
+    errors = {}
+    for r in results:
+        if not r.ok:
+            errors[r.error] = errors.get(r.error, 0) + 1
+    return {
+        "requests": len(results),
+        "completed": len(ok),
+        "failed": len(results) - len(ok),
+        "errors": errors,
+        "duration_s": duration,
+        "requests_per_s": len(ok) / duration if duration > 0 else None,
+        "output_tokens": total_tokens,
+        "tokens_per_s": total_tokens / duration if duration > 0 else None,
+        "ttft_s": _summary([r.ttft for r in ok if r.ttft is not None]),
+        "itl_s": _summary([itl for r in ok for itl in r.itls]),
+        "e2e_s": _summary([r.e2e for r in ok]),
+    }
+
+
+async def run_load(url, requests, concurrency=None, rate=None):
+    """Replay requests at a fixed concurrency or arrival rate and return the report"""
+    start = time.perf_counter()
+    if rate:
+        results = await run_rate(url, requests, rate)
+    else:
+        results = await run_concurrency(url, requests, concurrency or 1)
+    return build_report(results, time.perf_counter() - start)
+
+
+class StubServer:
+    """Minimal OpenAI compatible streaming server emitting tokens at a fixed rate"""
+
+    def __init__(self, host="127.0.0.1", port=0, token_rate=50.0, ttft=0.05, default_tokens=16):
+        self.host = host
+        self.port = port
+        self.token_rate = token_rate
+        self.ttft = ttft
+        self.default_tokens = default_tokens
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            request = json.loads(body or b"{}")
+            chat = CHAT_ENDPOINT.encode() in request_line
+            n_tokens = int(request.get("max_tokens") or request.get("n_predict") or self.default_tokens)
+
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                         b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+            await asyncio.sleep(self.ttft)
+            for i in range(n_tokens):
+                if i:
+                    await asyncio.sleep(1 / self.token_rate)
+                if chat:
+                    choice = {"index": 0, "delta": {"content": f" tok{i}"}}
+                else:
+                    choice = {"index": 0, "text": f" tok{i}"}
+                self._write_event(writer, json.dumps({"choices": [choice]}).encode())
+                await writer.drain()
+            self._write_event(writer, b"[DONE]")
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _write_event(writer, data):
+        event = b"data: " + data + b"\n\n"
+        writer.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+
+
+async def _serve_stub(args):
+    stub = await StubServer(args.host, args.port, args.token_rate, args.ttft, args.default_tokens).start()
+    print(f"Stub server listening on http://{stub.host}:{stub.port}", file=sys.stderr)
+    async with stub.server:
+        await stub.server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming load generator for llama-server")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="replay requests against a server")
+    run.add_argument("--url", default="http://127.0.0.1:9000", help="server base URL")
+    source = run.add_mutually_exclusive_group(required=True)
+    source.add_argument("--trace", help="JSONL file with one request per line")
+    source.add_argument("--synthetic", type=int, metavar="N", help="send N synthetic requests")
+    run.add_argument("--prompt-words", type=int, default=128, help="mean synthetic prompt length in words")
+    run.add_argument("--max-tokens", type=int, default=128, help="mean synthetic output length in tokens")
+    run.add_argument("--completion", action="store_true", help="send synthetic completion instead of chat requests")
+    mode = run.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, default=1, help="number of concurrent clients")
+    mode.add_argument("--rate", type=float, help="Poisson arrival rate in requests per second")
+    run.add_argument("--output", help="write the JSON report to this file instead of stdout")
+
+    stub = subparsers.add_parser("stub", help="run a stub server emitting SSE tokens")
+    stub.add_argument("--host", default="127.0.0.1")
+    stub.add_argument("--port", type=int, default=9100)
+    stub.add_argument("--token-rate", type=float, default=50.0, help="tokens per second per request")
+    stub.add_argument("--ttft", type=float, default=0.05, help="delay before the first token in seconds")
+    stub.add_argument("--default-tokens", type=int, default=16, help="tokens per request without max_tokens")
+
+    args = parser.parse_args()
+
+    if args.command == "stub":
+        try:
+            asyncio.run(_serve_stub(args))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.trace:
+        requests = load_trace(args.trace)
+    else:
+        requests = synthetic_requests(args.synthetic, args.prompt_words, args.max_tokens, chat=not args.completion)
+
+    report = asyncio.run(run_load(args.url, requests, args.concurrency, args.rate))
+    text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""Parallel, resumable download of GGUF models from an HTTP mirror.
+
+The header and tensor table are read first with a few range requests and
+validated, so a wrong, truncated or non-GGUF file fails before any tensor
+data is fetched. The file is then split into fixed size ranges that are
+fetched over several keep-alive connections and written with os.pwrite
+(seek and write on Windows) into a preallocated (sparse) .part file.
+Finished ranges are recorded in a JSON journal next to it, an interrupted
+download resumes with the missing ranges only. The server must support range requests; a local directory can
+be served with one for testing:
+
+    python3 -m gguf.gguf_remote --serve models/ --port 8000
+    python3 model_downloader.py http://127.0.0.1:8000/model.gguf downloads/
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit
+
+from gguf.gguf_remote import GGUFRemoteReader
+from gguf.gguf_validator import validate_file, validate_reader
+
+DOWNLOAD_CHUNK = 32 * 1024 * 1024      # bytes per range, the unit of the journal
+DOWNLOAD_CONNECTIONS = 8
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_TIMEOUT = 60.0
+READ_SIZE = 1024 * 1024                # bytes per response read and pwrite
+JOURNAL_INTERVAL = 2.0                 # seconds between journal updates
+
+PART_SUFFIX = ".part"
+JOURNAL_SUFFIX = ".part.json"
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class DownloadError(Exception):
+    pass
+
+
+# Serializes seek and write where os.pwrite is missing (Windows), the
+# download threads share one file descriptor
+_seek_lock = threading.Lock()
+
+
+def _write_at(fd, data, offset):
+    view = memoryview(data)
+    while view:
+        if hasattr(os, "pwrite"):
+            written = os.pwrite(fd, view, offset)
+        else:
+            with _seek_lock:
+                os.lseek(fd, offset, os.SEEK_SET)
+                written = os.write(fd, view)
+        view = view[written:]
+        offset += written
+
+
+class ModelDownloader:
+    """Download one GGUF file over parallel range requests
+
+    run() blocks until the file is complete and returns its path; progress
+    can be followed from another thread through bytes_done and total, and
+    cancel() stops the download at the next read, keeping the journal for
+    a later resume.
+    """
+
+    def __init__(self, url, dest, connections=DOWNLOAD_CONNECTIONS, chunk_size=DOWNLOAD_CHUNK,
+                 headers=None, timeout=DOWNLOAD_TIMEOUT):
+        self.url = url
+        parts = urlsplit(url)
+        if os.path.isdir(dest):
+            dest = os.path.join(dest, os.path.basename(unquote(parts.path)) or "model.gguf")
+        self.dest = dest
+        self.part_path = dest + PART_SUFFIX
+        self.journal_path = dest + JOURNAL_SUFFIX
+        self.connections = connections
+        self.chunk_size = chunk_size
+        self.headers = headers or {}
+        self.timeout = timeout
+        self._scheme = parts.scheme
+        self._netloc = parts.netloc
+        self._target = parts.path + (f"?{parts.query}" if parts.query else "")
+
+        self.total = None
+        self.bytes_done = 0
+        self.resumed_bytes = 0
+        self.started = None
+        self._lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        self._local = threading.local()
+        self._cancelled = threading.Event()
+        self._done_chunks = set()
+        self._journal_time = 0.0
+
+    @property
+    def rate(self):
+        """Get the download rate in bytes/s, resumed ranges excluded"""
+        if self.started is None:
+            return 0.0
+        elapsed = time.perf_counter() - self.started
+        return (self.bytes_done - self.resumed_bytes) / elapsed if elapsed > 0 else 0.0
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def check_header(self):
+        """Read and validate the header and tensor table, returns (file size, header digest)"""
+        try:
+            reader = GGUFRemoteReader(self.url, headers=self.headers, timeout=self.timeout)
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            raise DownloadError(f"{self.url} is not a readable GGUF file: {e}") from e
+        try:
+            report = validate_reader(reader, reader.file_size)
+            if not report.ok:
+                raise DownloadError(report.describe())
+            # The digest identifies the remote file in the journal, a resume
+            # of a file that changed on the server starts over
+            digest = hashlib.sha256(reader.read_range(0, reader.header_end)).hexdigest()
+            return reader.file_size, digest
+        finally:
+            reader.close()
+
+    def _load_journal(self, size, digest):
+        """Get the finished chunks of an earlier attempt at the same file"""
+        try:
+            with open(self.journal_path, "r") as f:
+                journal = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if (journal.get("url") != self.url or journal.get("size") != size or journal.get("header_sha256") != digest
+                or journal.get("chunk_size") != self.chunk_size or not os.path.exists(self.part_path)):
+            return set()
+        return set(journal.get("done", []))
+
+    def _save_journal(self, fd, size, digest):
+        with self._journal_lock:
+            # The data has to be on disk before the journal says it is
+            with self._lock:
+                done = sorted(self._done_chunks)
+            os.fsync(fd)
+            tmp_path = self.journal_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"url": self.url, "size": size, "header_sha256": digest,
+                           "chunk_size": self.chunk_size, "done": done}, f)
+            os.replace(tmp_path, self.journal_path)
+            self._journal_time = time.monotonic()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            conn = self._local.conn = conn_class(self._netloc, timeout=self.timeout)
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _fetch_range(self, fd, start, end):
+        """GET bytes [start, end) and pwrite them as they arrive, returns the bytes written"""
+        conn = self._connection()
+        conn.request("GET", self._target, headers={**self.headers, "Range": f"bytes={start}-{end - 1}"})
+        response = conn.getresponse()
+        if response.status != 206:
+            # The body may be the whole file, it is not read
+            self._drop_connection()
+            raise DownloadError(f"{self.url}: expected a partial response (206), got {response.status} {response.reason}")
+        match = _CONTENT_RANGE.fullmatch(response.getheader("Content-Range", ""))
+        if match is None or int(match.group(1)) != start or int(match.group(2)) != end - 1:
+            self._drop_connection()
+            raise DownloadError(f"{self.url}: unexpected Content-Range {response.getheader('Content-Range')!r}")
+        offset = start
+        while offset < end:
+            if self._cancelled.is_set():
+                self._drop_connection()
+                raise DownloadError("Download cancelled")
+            data = response.read(min(READ_SIZE, end - offset))
+            if not data:
+                raise http.client.IncompleteRead(b"", end - offset)
+            _write_at(fd, data, offset)
+            offset += len(data)
+            self._local.written += len(data)
+            with self._lock:
+                self.bytes_done += len(data)
+        if response.will_close:
+            self._drop_connection()
+        return offset - start
+
+    def _download_chunk(self, fd, index, size, digest):
+        start = index * self.chunk_size
+        end = min(start + self.chunk_size, size)
+        for attempt in range(DOWNLOAD_RETRIES + 1):
+            if self._cancelled.is_set():
+                raise DownloadError("Download cancelled")
+            self._local.written = 0
+            try:
+                self._fetch_range(fd, start, end)
+                break
+            except (OSError, http.client.HTTPException) as e:
+                # Undo the progress of the failed attempt and retry on a new connection
+                self._drop_connection()
+                with self._lock:
+                    self.bytes_done -= self._local.written
+                if attempt == DOWNLOAD_RETRIES:
+                    raise DownloadError(f"Failed to download bytes {start}-{end - 1}: {e}") from e
+                time.sleep(min(2 ** attempt, 10))
+        with self._lock:
+            self._done_chunks.add(index)
+        if time.monotonic() - self._journal_time > JOURNAL_INTERVAL:
+            self._save_journal(fd, size, digest)
+
+    def run(self):
+        """Download the file, returns the destination path"""
+        size, digest = self.check_header()
+        n_chunks = (size + self.chunk_size - 1) // self.chunk_size
+        self._done_chunks = {i for i in self._load_journal(size, digest) if 0 <= i < n_chunks}
+        self.total = size
+        self.bytes_done = self.resumed_bytes = sum(
+            min(self.chunk_size, size - i * self.chunk_size) for i in self._done_chunks)
+        self.started = time.perf_counter()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.dest)), exist_ok=True)
+        fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            # Sparse preallocation, the ranges are written in any order
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            self._journal_time = time.monotonic()
+            pending = [i for i in range(n_chunks) if i not in self._done_chunks]
+            try:
+                with ThreadPoolExecutor(max_workers=self.connections) as executor:
+                    futures = [executor.submit(self._download_chunk, fd, i, size, digest) for i in pending]
+                    for future in futures:
+                        try:
+                            future.result()
+                        except BaseException:
+                            self._cancelled.set()
+                            raise
+            finally:
+                self._save_journal(fd, size, digest)
+        finally:
+            os.close(fd)
+
+        report = validate_file(self.part_path)
+        if not report.ok:
+            raise DownloadError(report.describe())
+        os.replace(self.part_path, self.dest)
+        os.remove(self.journal_path)
+        return self.dest
+
+
+def download_model(url, dest, connections=DOWNLOAD_CONNECTIONS, chunk_size=DOWNLOAD_CHUNK):
+    """Download a GGUF file into dest (a file or directory), returns its path"""
+    return ModelDownloader(url, dest, connections, chunk_size).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download a GGUF model over parallel, resumable range requests")
+    parser.add_argument("url", help="URL of the GGUF file")
+    parser.add_argument("dest", help="destination file or directory")
+    parser.add_argument("--connections", type=int, default=DOWNLOAD_CONNECTIONS, help="parallel connections")
+    parser.add_argument("--chunk-mb", type=int, default=DOWNLOAD_CHUNK // (1024 * 1024), help="range size in MiB")
+    args = parser.parse_args()
+
+    downloader = ModelDownloader(args.url, args.dest, args.connections, args.chunk_mb * 1024 * 1024)
+    result = {}
+
+    def run():
+        try:
+            result["path"] = downloader.run()
+        except Exception as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while thread.is_alive():
+            thread.join(1.0)
+            if downloader.total:
+                print(f"\r{downloader.bytes_done / downloader.total:6.1%}  {downloader.rate / 1e6:8.1f} MB/s",
+                      end="", file=sys.stderr)
+    except KeyboardInterrupt:
+        downloader.cancel()
+        thread.join()
+    print(file=sys.stderr)
+    if "error" in result:
+        print(f"Error: {result['error']}", file=sys.stderr)
+        sys.exit(1)
+    print(result["path"])
+
+
+if __name__ == "__main__":
+    main()
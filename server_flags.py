@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""Declarative llama-server flag schema and per-binary capability cache.
+
+Every server parameter the launcher knows about is described once in
+SERVER_FLAGS. The UI builds its widgets from it, the parameters are
+validated against it, the argv is built from it and the per-model JSON
+files store its keys.
+"""
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class FlagSpec:
+    key: str            # key in the per-model JSON and in the UI
+    flag: str           # flag passed to llama-server
+    kind: str           # "int", "float", "str", "bool" or "choice"
+    label: str
+    default: object = ""
+    group: str = "performance"
+    choices: tuple = ()
+    minimum: float = None
+    maximum: float = None
+    aliases: tuple = ()  # other spellings of the flag that appear in --help
+    required: bool = False
+
+    @property
+    def all_flags(self):
+        return (self.flag,) + self.aliases
+
+
+CACHE_TYPES = ("", "f32", "f16", "bf16", "q8_0", "q4_0", "q4_1", "iq4_nl", "q5_0", "q5_1")
+
+SERVER_FLAGS = [
+    # Basic parameters, these have always been part of the launcher
+    FlagSpec("gpu_layers", "-ngl", "int", "GPU Layers (ngl):", 0, "basic", minimum=0,
+             aliases=("--gpu-layers", "--n-gpu-layers"), required=True),
+    FlagSpec("context_size", "-c", "int", "Context Size (c):", 2048, "basic", minimum=0,
+             aliases=("--ctx-size",), required=True),
+    FlagSpec("host", "--host", "str", "Host:", "0.0.0.0", "basic", required=True),
+    FlagSpec("port", "--port", "int", "Port:", 9000, "basic", minimum=1, maximum=65535, required=True),
+    FlagSpec("device", "--device", "str", "Device:", "Vulkan1", "basic", aliases=("-dev",)),
+
+    # Throughput related parameters, left out of the command line when empty
+    FlagSpec("threads", "-t", "int", "Threads (t):", minimum=1, aliases=("--threads",)),
+    FlagSpec("threads_batch", "-tb", "int", "Batch Threads (tb):", minimum=1, aliases=("--threads-batch",)),
+    FlagSpec("batch_size", "-b", "int", "Batch Size (b):", minimum=1, aliases=("--batch-size",)),
+    FlagSpec("ubatch_size", "-ub", "int", "Micro Batch Size (ub):", minimum=1, aliases=("--ubatch-size",)),
+    FlagSpec("parallel", "-np", "int", "Parallel Slots (np):", minimum=1, aliases=("--parallel",)),
+    FlagSpec("flash_attn", "-fa", "bool", "Flash Attention (fa)", False, aliases=("--flash-attn",)),
+    FlagSpec("cache_type_k", "-ctk", "choice", "K Cache Type (ctk):", choices=CACHE_TYPES,
+             aliases=("--cache-type-k",)),
+    FlagSpec("cache_type_v", "-ctv", "choice", "V Cache Type (ctv):", choices=CACHE_TYPES,
+             aliases=("--cache-type-v",)),
+    FlagSpec("mlock", "--mlock", "bool", "Lock Model in RAM (mlock)", False),
+    FlagSpec("no_mmap", "--no-mmap", "bool", "Disable mmap (no-mmap)", False),
+    FlagSpec("cont_batching", "--cont-batching", "bool", "Continuous Batching", False, aliases=("-cb",)),
+    FlagSpec("override_tensor", "-ot", "str", "Override Tensor (ot):", aliases=("--override-tensor",)),
+    FlagSpec("numa", "--numa", "choice", "NUMA Mode:", choices=("", "distribute", "isolate", "numactl")),
+
+    # Speculative decoding, only used when a draft model is set
+    FlagSpec("draft_model", "-md", "str", "Draft Model (md):", group="draft", aliases=("--model-draft",)),
+    FlagSpec("gpu_layers_draft", "-ngld", "int", "Draft GPU Layers (ngld):", group="draft", minimum=0,
+             aliases=("--gpu-layers-draft", "--n-gpu-layers-draft")),
+    FlagSpec("draft_max", "--draft-max", "int", "Max Draft Tokens:", group="draft", minimum=0,
+             aliases=("--draft", "--draft-n")),
+    FlagSpec("draft_min", "--draft-min", "int", "Min Draft Tokens:", group="draft", minimum=0,
+             aliases=("--draft-n-min",)),
+]
+
+FLAGS_BY_KEY = {spec.key: spec for spec in SERVER_FLAGS}
+
+# Matches the flag column of a `llama-server --help` line, e.g.
+# "-fa,   --flash-attn [on|off|auto]" or "--mlock". A metavar follows the
+# flags after a single space and runs up to the description, which is
+# separated by a padding of spaces; it may hold single spaces itself, e.g.
+# "-ot, --override-tensor <tensor name pattern>=<buffer type>,...".
+_HELP_LINE_RE = re.compile(
+    r"^\s*(-{1,2}[A-Za-z][\w-]*(?:\s*,\s*-{1,2}[A-Za-z][\w-]*)*)(?: ([^\s-].*?))?(?:\s{2,}|\s*$)")
+_FLAG_RE = re.compile(r"-{1,2}[A-Za-z][\w-]*")
+
+
+def default_params():
+    """Get a parameters dictionary holding the default value of every flag"""
+    return {spec.key: spec.default for spec in SERVER_FLAGS}
+
+
+def parse_value(spec, raw):
+    """Convert a raw UI/JSON value to the type of the flag, None means unset"""
+    if spec.kind == "bool":
+        if isinstance(raw, str):
+            return raw.strip().lower() in ("1", "true", "yes", "on")
+        return bool(raw)
+
+    if raw is None:
+        return None
+    text = str(raw).strip()
+    if text == "":
+        return None
+
+    try:
+        if spec.kind == "int":
+            value = int(text)
+        elif spec.kind == "float":
+            value = float(text)
+        else:
+            value = text
+    except ValueError:
+        raise ValueError(f"must be a number, got {text!r}") from None
+
+    if spec.kind == "choice" and spec.choices and value not in spec.choices:
+        raise ValueError(f"must be one of {', '.join(c for c in spec.choices if c)}")
+    if spec.minimum is not None and value < spec.minimum:
+        raise ValueError(f"must be at least {spec.minimum}")
+    if spec.maximum is not None and value > spec.maximum:
+        raise ValueError(f"must be at most {spec.maximum}")
+    return value
+
+
+def validate_params(raw_params):
+    """Validate raw parameter values, returning (params, errors)
+
+    params holds the typed values of the valid entries, errors maps a flag
+    key to a human readable message.
+    """
+    params = {}
+    errors = {}
+    for spec in SERVER_FLAGS:
+        try:
+            value = parse_value(spec, raw_params.get(spec.key, spec.default))
+        except ValueError as e:
+            errors[spec.key] = f"{spec.label.rstrip(':')} {e}"
+            continue
+        if value is None and spec.required:
+            errors[spec.key] = f"{spec.label.rstrip(':')} is required"
+            continue
+        params[spec.key] = value
+
+    draft_min, draft_max = params.get("draft_min"), params.get("draft_max")
+    if draft_min is not None and draft_max is not None and draft_min > draft_max:
+        errors["draft_min"] = "Min Draft Tokens must not be larger than Max Draft Tokens"
+    return params, errors
+
+
+def build_args(params, capabilities=None):
+    """Build the llama-server arguments for a set of validated parameters
+
+    Performance flags that the binary does not support (according to
+    capabilities) are skipped so an older server does not refuse to start.
+    """
+    args = []
+    for spec in SERVER_FLAGS:
+        value = params.get(spec.key)
+        if value is None or value == "":
+            continue
+        # The draft settings mean nothing without a draft model
+        if spec.group == "draft" and not params.get("draft_model"):
+            continue
+        if capabilities is not None and spec.group != "basic" and not capabilities.supports(spec):
+            continue
+
+        if spec.kind == "bool":
+            if not value:
+                continue
+            args.append(spec.flag)
+            # Newer servers take an explicit value, e.g. "-fa on"
+            if capabilities is not None and capabilities.takes_value(spec):
+                args.append("on")
+        else:
+            args += [spec.flag, str(value)]
+    return args
+
+
+@dataclass
+class ServerCapabilities:
+    """Flags advertised by a llama-server binary in its --help output"""
+    sha256: str
+    flags: dict = field(default_factory=dict)  # flag -> takes a value
+
+    def supports(self, spec):
+        # An empty flag list means --help could not be parsed, allow everything
+        if not self.flags:
+            return True
+        return any(flag in self.flags for flag in spec.all_flags)
+
+    def takes_value(self, spec):
+        return any(self.flags.get(flag, False) for flag in spec.all_flags)
+
+
+def parse_help(text):
+    """Parse `llama-server --help` output into a {flag: takes_value} dictionary
+
+    >>> parse_help("-fa,   --flash-attn [on|off|auto]       set Flash Attention use")
+    {'-fa': True, '--flash-attn': True}
+    >>> parse_help("--mlock                                  force system to keep model in RAM")
+    {'--mlock': False}
+    >>> parse_help("-ot,   --override-tensor <tensor name pattern>=<buffer type>,...")
+    {'-ot': True, '--override-tensor': True}
+    >>> parse_help("--lora-scaled FNAME SCALE               path to LoRA adapter with user defined scaling")
+    {'--lora-scaled': True}
+    """
+    flags = {}
+    for line in text.splitlines():
+        match = _HELP_LINE_RE.match(line)
+        if not match:
+            continue
+        takes_value = match.group(2) is not None
+        for flag in _FLAG_RE.findall(match.group(1)):
+            flags[flag] = takes_value
+    return flags
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """Get the SHA-256 hex digest of a file"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class CapabilityCache:
+    """JSON backed cache of ServerCapabilities, keyed by binary hash
+
+    The hash of a binary is remembered together with its size and mtime so a
+    binary that did not change is neither hashed nor run again.
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.entries = {"binaries": {}, "capabilities": {}}
+        self._lock = threading.Lock()
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, "r") as f:
+                    self.entries.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+
+    def save(self):
+        tmp_file = self.cache_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self.entries, f, indent=4)
+        os.replace(tmp_file, self.cache_file)
+
+    def binary_hash(self, server_path):
+        """Get the hash of a binary, reusing the cached one when unchanged"""
+        st = os.stat(server_path)
+        path = os.path.abspath(server_path)
+        known = self.entries["binaries"].get(path)
+        if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+            return known["sha256"]
+        sha = hash_file(server_path)
+        self.entries["binaries"][path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+        return sha
+
+    def get(self, server_path, timeout=10):
+        """Get the capabilities of a binary, running --help only on a cache miss
+
+        Safe to call from several threads, e.g. a UI loading capabilities in
+        the background.
+        """
+        with self._lock:
+            return self._get(server_path, timeout)
+
+    def _get(self, server_path, timeout):
+        known = dict(self.entries["binaries"])
+        sha = self.binary_hash(server_path)
+        flags = self.entries["capabilities"].get(sha)
+        changed = known != self.entries["binaries"]
+        if flags is None:
+            try:
+                result = subprocess.run(
+                    [server_path, "--help"],
+                    capture_output=True,
+                    text=True,
+                    timeout=timeout
+                )
+                flags = parse_help(result.stdout + result.stderr)
+            except (OSError, subprocess.SubprocessError):
+                flags = {}
+            # Only remember successful parses so a broken run is retried
+            if flags:
+                self.entries["capabilities"][sha] = flags
+                changed = True
+        if changed:
+            self.save()
+        return ServerCapabilities(sha, flags)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""Startup-time profiler for llama-server.
+
+The server output is scanned for log markers of the startup phases, from
+starting the process to listening for requests. At every marker the page
+fault and I/O counters of the process are sampled from /proc/<pid> (Linux
+only). Completed profiles are kept in a per-model, per-profile history and
+flagged as a regression when noticeably slower than the median of earlier
+starts.
+"""
+import hashlib
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+# Phase markers in the order they appear in the llama-server log. A phase
+# starts at its marker and lasts until the next marker seen.
+PHASE_MARKERS = [
+    ("exec", None),  # process started
+    ("model_open", re.compile(r"llama_model_loader: loaded meta data|gguf_init_from_file|llama_model_load_from_file")),
+    ("tensor_load", re.compile(r"load_tensors: loading model tensors|llm_load_tensors:")),
+    ("buffer_alloc", re.compile(r"(load_tensors|llm_load_tensors):\s+\S+ (model )?buffer size")),
+    ("kv_alloc", re.compile(r"llama_kv_cache|llama_context: KV self size|kv_self")),
+    ("warmup", re.compile(r"warming up the model")),
+    ("listening", re.compile(r"server is listening on|HTTP server listening|all slots are idle")),
+]
+READY_PHASE = "listening"
+
+# A start is a regression when this much slower than the median of the history
+REGRESSION_THRESHOLD = 0.25
+REGRESSION_MIN_HISTORY = 3
+HISTORY_LIMIT = 50
+
+
+def read_proc_counters(pid):
+    """Read page fault and I/O counters of a process, None when /proc is not available"""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces, fields are counted after it
+    fields = stat[stat.rfind(")") + 2:].split()
+    counters = {"minflt": int(fields[7]), "majflt": int(fields[9])}
+    try:
+        with open(f"/proc/{pid}/io", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("rchar", "read_bytes"):
+                    counters[key] = int(value)
+    except OSError:
+        # /proc/<pid>/io needs the same user or ptrace rights
+        pass
+    return counters
+
+
+@dataclass
+class PhaseMark:
+    phase: str
+    elapsed: float              # seconds since Popen
+    counters: dict = None
+
+
+@dataclass
+class StartupProfile:
+    marks: list = field(default_factory=list)
+    ready: bool = False
+    exited: bool = False
+    total: float = None
+
+    def phases(self):
+        """Get {phase: {"duration": s, counter deltas...}} from consecutive marks"""
+        result = {}
+        for mark, next_mark in zip(self.marks, self.marks[1:]):
+            phase = {"duration": next_mark.elapsed - mark.elapsed}
+            if mark.counters and next_mark.counters:
+                for key, value in next_mark.counters.items():
+                    if key in mark.counters:
+                        phase[key] = value - mark.counters[key]
+            result[mark.phase] = phase
+        return result
+
+    def to_dict(self):
+        return {
+            "ready": self.ready,
+            "total": self.total,
+            "phases": self.phases(),
+            "marks": [asdict(mark) for mark in self.marks],
+        }
+
+
+class StartupProfiler:
+    """Follow the output of a starting llama-server and time its startup phases
+
+    The profiler reads the process output on a thread, echoes it to the
+    console and records a PhaseMark for every phase marker seen.
+    """
+
+    def __init__(self, process, start_time=None, echo=sys.stdout):
+        self.process = process
+        self.start_time = start_time if start_time is not None else time.perf_counter()
+        self.echo = echo
+        self.profile = StartupProfile()
+        self.done = threading.Event()
+        self._next_marker = 1
+        self._mark("exec")
+        self.thread = threading.Thread(target=self._follow, daemon=True)
+        self.thread.start()
+
+    def _mark(self, phase):
+        elapsed = time.perf_counter() - self.start_time
+        self.profile.marks.append(PhaseMark(phase, elapsed, read_proc_counters(self.process.pid)))
+        if phase == READY_PHASE:
+            self.profile.ready = True
+            self.profile.total = elapsed
+            self.done.set()
+
+    def feed(self, line):
+        """Check a log line for the next phase markers"""
+        # Markers are only searched from the last phase on, later phases may
+        # be reported without the earlier ones when the log format changes
+        for i in range(self._next_marker, len(PHASE_MARKERS)):
+            phase, pattern = PHASE_MARKERS[i]
+            if pattern.search(line):
+                self._mark(phase)
+                self._next_marker = i + 1
+                break
+
+    def _follow(self):
+        try:
+            for line in self.process.stdout:
+                if self.echo is not None:
+                    self.echo.write(line)
+                if not self.profile.ready:
+                    self.feed(line)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.profile.exited = self.process.poll() is not None
+            self.done.set()
+
+
+def profile_key(cmd):
+    """Get a short key for the server parameters, the model path excluded"""
+    args = list(cmd[1:])
+    if "-m" in args:
+        i = args.index("-m")
+        del args[i:i + 2]
+    return hashlib.sha256(json.dumps(args).encode()).hexdigest()[:12]
+
+
+class StartupHistory:
+    """JSON backed history of startup profiles per model and parameter profile"""
+
+    def __init__(self, history_file):
+        self.history_file = history_file
+        self.entries = {}
+        if os.path.exists(history_file):
+            try:
+                with open(history_file, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def records(self, model_key, profile):
+        return self.entries.get(model_key, {}).get(profile, [])
+
+    def check_regression(self, model_key, profile, startup):
+        """Compare a profile to the history, returns a list of regression messages"""
+        records = [r for r in self.records(model_key, profile) if r.get("total") is not None]
+        if len(records) < REGRESSION_MIN_HISTORY or startup.total is None:
+            return []
+
+        messages = []
+        median_total = statistics.median(r["total"] for r in records)
+        if startup.total > median_total * (1 + REGRESSION_THRESHOLD):
+            messages.append(f"startup took {startup.total:.1f}s, median is {median_total:.1f}s")
+        for phase, values in startup.phases().items():
+            durations = [r["phases"][phase]["duration"] for r in records if phase in r.get("phases", {})]
+            if len(durations) < REGRESSION_MIN_HISTORY:
+                continue
+            median = statistics.median(durations)
+            # Ignore sub-second phases, their jitter is meaningless
+            if values["duration"] > 1.0 and values["duration"] > median * (1 + REGRESSION_THRESHOLD):
+                messages.append(f"{phase} took {values['duration']:.1f}s, median is {median:.1f}s")
+        return messages
+
+    def add(self, model_key, profile, startup):
+        """Store a completed profile, returns the regression messages"""
+        regressions = self.check_regression(model_key, profile, startup)
+        record = startup.to_dict()
+        record["timestamp"] = time.time()
+        record["regressions"] = regressions
+        records = self.entries.setdefault(model_key, {}).setdefault(profile, [])
+        records.append(record)
+        del records[:-HISTORY_LIMIT]
+
+        tmp_file = self.history_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self.entries, f, indent=4)
+        os.replace(tmp_file, self.history_file)
+        return regressions
+
+
+def format_profile(startup):
+    """Format a profile as human readable lines"""
+    lines = []
+    for phase, values in startup.phases().items():
+        line = f"{phase}: {values['duration']:.2f}s"
+        if "majflt" in values:
+            line += f", {values['majflt']} major faults"
+        if "read_bytes" in values:
+            line += f", {values['read_bytes'] / (1024 * 1024):.0f} MB read"
+        lines.append(line)
+    if startup.total is not None:
+        lines.append(f"total: {startup.total:.2f}s")
+    return lines
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import functools
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import pytest
+
+# Necessary to load the local gguf package and the launcher modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from gguf.gguf_remote import RangeRequestHandler  # noqa: E402
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    # Clients that drop the connection without reading the body, e.g. after
+    # a 200 to a range request, are expected in these tests
+    daemon_threads = True
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+@pytest.fixture
+def serve() -> Iterator[Callable[..., str]]:
+    # serve(directory, handler) runs a local HTTP server for the test and
+    # returns its base URL
+    servers: list[QuietHTTPServer] = []
+
+    def start(directory: Path, handler: Any = RangeRequestHandler) -> str:
+        server = QuietHTTPServer(('127.0.0.1', 0), functools.partial(handler, directory = str(directory)))
+        threading.Thread(target = server.serve_forever, daemon = True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_address[1]}'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from gguf import GGUF_DEFAULT_ALIGNMENT, GGUFReader, GGUFWriter, Keys
+from gguf.gguf_editor import GGUFMetadataEditor
+
+
+@pytest.fixture
+def model_file(tmp_path: Path) -> Path:
+    path = tmp_path / 'model.gguf'
+    writer = GGUFWriter(path, 'llama')
+    writer.add_tensor('t', np.arange(8, dtype = np.float32))
+    writer.write_header_to_file()
+    writer.write_kv_data_to_file()
+    writer.write_tensors_to_file()
+    writer.close()
+    return path
+
+
+def test_set_current_alignment(model_file: Path) -> None:
+    # Without a vtype the alignment is written as the UINT32 readers expect
+    editor = GGUFMetadataEditor(model_file)
+    editor.set(Keys.General.ALIGNMENT, GGUF_DEFAULT_ALIGNMENT)
+    editor.apply()
+    reader = GGUFReader(model_file)
+    assert reader.fields[Keys.General.ALIGNMENT].contents() == GGUF_DEFAULT_ALIGNMENT
+    assert np.array_equal(reader.tensors[0].data, np.arange(8, dtype = np.float32))
+
+
+def test_change_alignment_is_refused(model_file: Path) -> None:
+    editor = GGUFMetadataEditor(model_file)
+    editor.set(Keys.General.ALIGNMENT, 64)
+    with pytest.raises(ValueError, match = 'needs the tensor data to be rewritten'):
+        editor.apply()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from gguf import GGUFReader, GGUFValueType, GGUFWriter
+
+
+@pytest.fixture
+def fields_file(tmp_path: Path) -> Path:
+    path = tmp_path / 'fields.gguf'
+    writer = GGUFWriter(path, 'llama')
+    writer.add_block_count(2)
+    writer.add_string('test.string', 'hello')
+    writer.add_array('test.tokens', ['a', 'bc', '', 'déf'])
+    writer.add_array('test.scores', [0.5, -1.0, 2.25])
+    writer.add_array('test.types', [1, 2, 3])
+    writer.add_array('test.nested', [[1, 2], [3]])
+    writer.add_tensor('t', np.arange(8, dtype = np.float32))
+    writer.write_header_to_file()
+    writer.write_kv_data_to_file()
+    writer.write_tensors_to_file()
+    writer.close()
+    return path
+
+
+def baseline_field(reader: GGUFReader, key: str) -> tuple[list[np.ndarray], list[int], list[GGUFValueType]]:
+    # The parts, data and types of the per-item parser of the original reader
+    start, value_start, _end = reader.fields.span(key)
+    parts: list[np.ndarray] = []
+    if value_start != start:
+        parts += [*reader._get_str(start), reader._get(value_start - 4, np.uint32)]
+    _size, field_parts, field_idxs, field_types = reader._get_field_parts(value_start, int(reader.fields.types[reader.fields._index[key]]))
+    return parts + field_parts, [idx + len(parts) for idx in field_idxs], field_types
+
+
+@pytest.mark.parametrize('header_io', ['mmap', 'pread'])
+def test_field_parts_match_baseline(fields_file: Path, header_io: str) -> None:
+    reader = GGUFReader(fields_file, header_io = header_io, use_index = False)  # type: ignore[arg-type]
+    for key in reader.fields:
+        if key.startswith('GGUF.'):
+            continue
+        field = reader.fields[key]
+        parts, data, types = baseline_field(reader, key)
+        assert len(field.parts) == len(parts), key
+        for part, expected in zip(field.parts, parts):
+            assert part.dtype == expected.dtype and np.array_equal(part, expected), key
+        assert list(field.data) == data, key
+        assert field.types == types, key
+        assert sum(part.nbytes for part in field.parts) == sum(part.nbytes for part in parts), key
+
+
+def test_field_contents(fields_file: Path) -> None:
+    reader = GGUFReader(fields_file)
+    assert reader.fields['test.string'].contents() == 'hello'
+    tokens = reader.fields['test.tokens']
+    assert tokens.contents() == ['a', 'bc', '', 'déf']
+    assert tokens.contents(-1) == 'déf'
+    assert tokens.contents(slice(1, 3)) == ['bc', '']
+    assert reader.fields['test.scores'].contents() == [0.5, -1.0, 2.25]
+    assert reader.fields['test.types'].contents(1) == 2
+    assert reader.fields['test.nested'].contents() == [1, 2, 3]
+
+
+def test_field_parts_are_file_views(fields_file: Path) -> None:
+    # The parts of a field cover exactly its bytes in the file
+    reader = GGUFReader(fields_file)
+    for key in ('test.tokens', 'test.scores'):
+        start, _value_start, end = reader.fields.span(key)
+        assert sum(part.nbytes for part in reader.fields[key].parts) == end - start
+
+
+def test_pread_header_buffer_is_trimmed(fields_file: Path) -> None:
+    # The pread buffer is read ahead in large chunks but only keeps the header
+    reader = GGUFReader(fields_file, header_io = 'pread')
+    mapped = GGUFReader(fields_file)
+    assert len(reader._hbuf) == reader.header_end
+    assert reader.fields['test.tokens'].contents() == mapped.fields['test.tokens'].contents()
+    for tensor, expected in zip(reader.tensors, mapped.tensors):
+        assert np.array_equal(tensor.data, expected.data)
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from gguf import GGUFReader, GGUFWriter
+from gguf.gguf_registry import ReaderRegistry
+
+
+@pytest.fixture
+def models(tmp_path: Path) -> list[Path]:
+    paths = []
+    for i in range(3):
+        path = tmp_path / f'm{i}.gguf'
+        writer = GGUFWriter(path, 'llama')
+        writer.add_tensor('t', np.full(1024, i, dtype = np.float32))
+        writer.write_header_to_file()
+        writer.write_kv_data_to_file()
+        writer.write_tensors_to_file()
+        writer.close()
+        paths.append(path)
+    return paths
+
+
+def mapped(reader: GGUFReader) -> bool:
+    return reader._data is not None
+
+
+def test_lru_unmap(models: list[Path]) -> None:
+    registry = ReaderRegistry(max_mapped = 2)
+    readers = [registry.get(path) for path in models]
+    assert not any(mapped(reader) for reader in readers)
+
+    for i, reader in enumerate(readers[:2]):
+        assert reader.tensors[0].data[0] == i
+    readers[0].data  # the first one becomes the most recently used
+    assert readers[2].tensors[0].data[0] == 2
+    assert [mapped(reader) for reader in readers] == [True, False, True]
+    stats = registry.stats()
+    assert (stats.readers, stats.misses, stats.evictions, stats.reopens, stats.mapped) == (3, 3, 1, 0, 2)
+    assert stats.mapped_bytes == models[0].stat().st_size + models[2].stat().st_size
+
+    # The header stays usable while unmapped, tensor data maps the file again
+    assert readers[1].fields['general.architecture'].contents() == 'llama'
+    assert float(readers[1].data[readers[1].data_offset:readers[1].data_offset + 4].view(np.float32)[0]) == 1
+    stats = registry.stats()
+    assert (stats.evictions, stats.reopens, stats.mapped) == (2, 1, 2)
+    assert [mapped(reader) for reader in readers] == [False, True, True]
+
+
+def test_max_mapped_bytes(models: list[Path]) -> None:
+    registry = ReaderRegistry(max_mapped_bytes = models[0].stat().st_size)
+    readers = [registry.get(path) for path in models]
+    for reader in readers:
+        reader.data
+    # The most recently mapped file stays mapped even alone over the limit
+    assert [mapped(reader) for reader in readers] == [False, False, True]
+    assert registry.stats().evictions == 2
+
+
+def test_readers(models: list[Path]) -> None:
+    registry = ReaderRegistry(max_readers = 2)
+    first = registry.get(models[0])
+    first.data
+    assert registry.get(models[0]) is first
+    registry.get(models[1])
+    registry.get(models[2])
+    stats = registry.stats()
+    # The least recently used reader is dropped and unmapped
+    assert (stats.readers, stats.hits, stats.misses, stats.mapped) == (2, 1, 3, 0)
+    assert not mapped(first)
+    assert registry.get(models[0]) is not first
+
+    # A changed file gets a new reader
+    second = registry.get(models[2])
+    st = models[2].stat()
+    os.utime(models[2], ns = (st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert registry.get(models[2]) is not second
+
+    registry.clear()
+    assert registry.stats().readers == 0
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import http.client
+import os
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+
+from gguf.gguf_remote import HTTPRangeFile, RangeRequestHandler
+
+
+@pytest.fixture
+def blob(tmp_path: Path) -> bytes:
+    data = os.urandom(100_000)
+    (tmp_path / 'blob.bin').write_bytes(data)
+    return data
+
+
+class ShortReadHandler(RangeRequestHandler):
+    # Announces the whole range but closes the connection halfway
+    def copyfile(self, source: Any, outputfile: Any) -> None:
+        left = self._range_left
+        if left is None:
+            return super().copyfile(source, outputfile)
+        self._range_left = None
+        outputfile.write(source.read(left // 2))
+        self.close_connection = True
+
+
+class ShiftedRangeHandler(RangeRequestHandler):
+    # Sends a Content-Range starting one byte past the requested one
+    def send_header(self, keyword: str, value: str) -> None:
+        if keyword == 'Content-Range' and not value.startswith('bytes */'):
+            start, rest = value[len('bytes '):].split('-', 1)
+            value = f'bytes {int(start) + 1}-{rest}'
+        super().send_header(keyword, value)
+
+
+class NoRangeHandler(RangeRequestHandler):
+    # Ignores Range and sends the whole file with 200
+    def send_head(self) -> Any:
+        self._range_left = None
+        del self.headers['Range']
+        return super().send_head()
+
+
+def test_read(serve: Callable[..., str], tmp_path: Path, blob: bytes) -> None:
+    with HTTPRangeFile(serve(tmp_path) + '/blob.bin', first_chunk = 1000, cache_size = 4096) as f:
+        assert f.size == len(blob)
+        assert f.read(10, 20) == blob[10:30]
+        assert f.requests == 1
+        assert f.read(50_000, 10_000) == blob[50_000:60_000]
+        assert f.read(len(blob) - 5, 100) == blob[-5:]
+        assert f.read(len(blob), 10) == b''
+        assert f.requests == 3
+        assert f.bytes_fetched == 1000 + 10_000 + 5
+
+
+def test_empty_file(serve: Callable[..., str], tmp_path: Path) -> None:
+    (tmp_path / 'empty.bin').write_bytes(b'')
+    with HTTPRangeFile(serve(tmp_path) + '/empty.bin') as f:
+        assert f.size == 0
+        assert f.read(0, 10) == b''
+
+
+def test_short_read(serve: Callable[..., str], tmp_path: Path, blob: bytes) -> None:
+    with pytest.raises(ValueError, match = 'short read at offset 0'):
+        HTTPRangeFile(serve(tmp_path, ShortReadHandler) + '/blob.bin', first_chunk = 1000)
+
+
+def test_bad_content_range(serve: Callable[..., str], tmp_path: Path, blob: bytes) -> None:
+    with pytest.raises(ValueError, match = 'unexpected Content-Range'):
+        HTTPRangeFile(serve(tmp_path, ShiftedRangeHandler) + '/blob.bin', first_chunk = 1000)
+
+
+def test_no_range_support(serve: Callable[..., str], tmp_path: Path, blob: bytes) -> None:
+    # The whole file must not be read, the connection is dropped instead
+    f = HTTPRangeFile.__new__(HTTPRangeFile)
+    with pytest.raises(ValueError, match = 'does not support range requests'):
+        f.__init__(serve(tmp_path, NoRangeHandler) + '/blob.bin', first_chunk = 1000)  # type: ignore[misc]
+    assert f.bytes_fetched == 0
+    assert f._conn is None
+
+
+def test_missing_file(serve: Callable[..., str], tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match = '404'):
+        HTTPRangeFile(serve(tmp_path) + '/missing.bin')
+
+
+def test_range_after_head(serve: Callable[..., str], tmp_path: Path, blob: bytes) -> None:
+    # A ranged HEAD leaves no state behind for the next request on the
+    # same keep-alive connection
+    conn = http.client.HTTPConnection(serve(tmp_path)[len('http://'):], timeout = 10)
+    try:
+        conn.request('HEAD', '/blob.bin', headers = {'Range': 'bytes=0-99'})
+        response = conn.getresponse()
+        assert response.status == 206
+        response.read()
+        conn.request('GET', '/blob.bin')
+        response = conn.getresponse()
+        assert response.status == 200
+        assert response.read() == blob
+    finally:
+        conn.close()
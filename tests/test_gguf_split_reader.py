@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+
+from gguf import GGUFSplitReader, GGUFValueType, GGUFWriter, Keys
+
+
+def write_shards(tmp_path: Path, extra: list[dict[str, Any]]) -> Path:
+    # One tensor per shard, every shard with the split keys and its extra
+    # string array fields
+    count = len(extra)
+    for i, fields in enumerate(extra):
+        writer = GGUFWriter(tmp_path / f'model-{i + 1:05d}-of-{count:05d}.gguf', 'llama')
+        writer.add_key_value(Keys.Split.LLM_KV_SPLIT_NO, i, GGUFValueType.UINT16)
+        writer.add_key_value(Keys.Split.LLM_KV_SPLIT_COUNT, count, GGUFValueType.UINT16)
+        writer.add_key_value(Keys.Split.LLM_KV_SPLIT_TENSORS_COUNT, count, GGUFValueType.INT32)
+        for key, value in fields.items():
+            writer.add_array(key, value)
+        writer.add_tensor(f't{i}', np.full(4, i, dtype = np.float32))
+        writer.write_header_to_file()
+        writer.write_kv_data_to_file()
+        writer.write_tensors_to_file()
+        writer.close()
+    return tmp_path / f'model-00001-of-{count:05d}.gguf'
+
+
+def test_merged_fields(tmp_path: Path) -> None:
+    tokens = ['a', 'bc', 'déf']
+    path = write_shards(tmp_path, [{'test.tokens': tokens}, {'test.tokens': tokens, 'test.extra': [1, 2]}, {}])
+    reader = GGUFSplitReader(path)
+    assert reader.split_count == 3
+    assert 'GGUF.tensor_count' not in reader.fields
+    assert list(reader.fields).count('test.tokens') == 1
+    assert reader.fields['test.tokens'].contents() == tokens
+    assert reader.get_field('test.extra').contents() == [1, 2]
+    assert reader.get_field('test.missing') is None
+    assert [int(t.data[0]) for t in reader.tensors] == [0, 1, 2]
+
+
+@pytest.mark.parametrize('other', [['a', 'bc', 'dex'], ['a', 'bc'], [1, 2, 3]])
+def test_differing_fields(tmp_path: Path, other: list[Any]) -> None:
+    path = write_shards(tmp_path, [{'test.tokens': ['a', 'bc', 'déf']}, {'test.tokens': other}])
+    with pytest.raises(ValueError, match = 'value of test.tokens differs'):
+        GGUFSplitReader(path)
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+
+from gguf import GGMLQuantizationType, GGUFWriter
+from gguf.gguf_stats import format_stats_table, model_stats
+
+
+def test_model_stats(tmp_path: Path) -> None:
+    path = tmp_path / 'stats.gguf'
+    rng = np.random.default_rng(0)
+    weights = [rng.standard_normal((64, 32)).astype(np.float32) for _ in range(3)]
+    writer = GGUFWriter(path, 'llama')
+    for i, w in enumerate(weights):
+        writer.add_tensor(f'w{i}', w)
+    # Q8_1 has no dequantization: 4 rows of one 40 byte block
+    writer.add_tensor('q', np.zeros((4, 40), dtype = np.uint8), raw_dtype = GGMLQuantizationType.Q8_1)
+    writer.write_header_to_file()
+    writer.write_kv_data_to_file()
+    writer.write_tensors_to_file()
+    writer.close()
+
+    # Many small tasks, more than the submission window holds
+    rows = list(model_stats(path, max_workers = 1, task_elements = 64))
+    assert [stats.name for stats in rows] == ['w0', 'w1', 'w2', 'q']
+    for stats, w in zip(rows, weights):
+        assert stats.skipped is None
+        assert stats.count == w.size
+        assert np.isclose(stats.mean, w.mean(dtype = np.float64))
+        assert np.isclose(stats.std, w.std(dtype = np.float64))
+        assert np.array_equal(stats.row_absmax, np.abs(w).max(axis = 1))
+    assert rows[-1].skipped is not None and rows[-1].count == 0
+    assert rows[-1].to_dict()['skipped'] == rows[-1].skipped
+    assert 'skipped' in format_stats_table(rows)[-1]
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from load_generator import RequestResult, StubServer, build_report, load_trace, percentile, run_load, synthetic_requests
+
+
+def test_percentile() -> None:
+    assert percentile([], 50) is None
+    assert percentile([3.0], 99) == 3.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 50) == 2.5
+    assert percentile([1.0, 2.0, 3.0, 4.0, 5.0], 100) == 5.0
+
+
+def test_load_trace(tmp_path: Path) -> None:
+    path = tmp_path / 'trace.jsonl'
+    path.write_text('{"prompt": "hi", "max_tokens": 3}\n\n{"messages": []}\n')
+    assert load_trace(path) == [{'prompt': 'hi', 'max_tokens': 3}, {'messages': []}]
+    path.write_text('{"max_tokens": 3}\n')
+    with pytest.raises(ValueError, match = ':1: request needs'):
+        load_trace(path)
+
+
+def test_build_report() -> None:
+    results = [
+        RequestResult(ok = True, start = 0.0, ttft = 0.5, e2e = 1.0, token_times = [0.5, 0.75, 1.0]),
+        RequestResult(ok = False, error = 'HTTP 503'),
+    ]
+    report = build_report(results, 2.0)
+    assert (report['completed'], report['failed'], report['errors']) == (1, 1, {'HTTP 503': 1})
+    assert report['output_tokens'] == 3
+    assert report['tokens_per_s'] == 1.5
+    assert report['itl_s']['mean'] == 0.25
+    assert report['ttft_s']['p50'] == 0.5
+
+
+async def _against_stub(requests: list[dict[str, Any]], **kwargs: Any) -> dict[str, Any]:
+    stub = await StubServer(token_rate = 200.0, ttft = 0.02).start()
+    try:
+        return await run_load(f'http://127.0.0.1:{stub.port}', requests, **kwargs)
+    finally:
+        await stub.close()
+
+
+@pytest.mark.parametrize('chat', [True, False])
+def test_run_against_stub(chat: bool) -> None:
+    requests = synthetic_requests(6, prompt_words = 8, max_tokens = 5, chat = chat)
+    report = asyncio.run(_against_stub(requests, concurrency = 3))
+    assert report['completed'] == 6
+    assert report['output_tokens'] == sum(request['max_tokens'] for request in requests)
+    # The stub waits ttft before the first token and 1 / token_rate between tokens
+    assert report['ttft_s']['p50'] >= 0.02
+    assert report['itl_s'] is None or report['itl_s']['p50'] > 0
+
+
+def test_run_at_rate() -> None:
+    report = asyncio.run(_against_stub([{'prompt': 'x', 'max_tokens': 2}] * 4, rate = 100.0))
+    assert (report['completed'], report['output_tokens']) == (4, 8)
+
+
+def test_connection_refused() -> None:
+    async def refused() -> dict[str, Any]:
+        stub = await StubServer().start()
+        await stub.close()
+        return await run_load(f'http://127.0.0.1:{stub.port}', [{'prompt': 'x'}])
+    report = asyncio.run(refused())
+    assert report['failed'] == 1
+    assert next(iter(report['errors'])).startswith('ConnectionRefusedError')
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pytest
+
+from gguf import GGUFWriter
+from gguf.gguf_remote import RangeRequestHandler
+from model_downloader import DownloadError, ModelDownloader
+
+CHUNK = 64 * 1024
+
+
+class MirrorHandler(RangeRequestHandler):
+    # Records the ranges asked for. Unless ranges is set, ranges that do not
+    # start at the first byte (those past the header) are answered with the
+    # whole file (200), like a server without range support.
+    ranges = True
+    requested: list[str] = []
+
+    def send_head(self) -> Any:
+        self._range_left = None
+        range_header = self.headers.get('Range')
+        if self.command == 'GET' and range_header is not None:
+            self.requested.append(range_header)
+            if not self.ranges and not range_header.startswith('bytes=0-'):
+                del self.headers['Range']
+        return super().send_head()
+
+
+@pytest.fixture
+def mirror(serve: Callable[..., str], tmp_path: Path) -> tuple[str, Path]:
+    (tmp_path / 'src').mkdir()
+    path = tmp_path / 'src' / 'model.gguf'
+    writer = GGUFWriter(path, 'llama')
+    rng = np.random.default_rng(0)
+    for i in range(4):
+        writer.add_tensor(f't{i}', rng.standard_normal(20_000).astype(np.float32))
+    writer.write_header_to_file()
+    writer.write_kv_data_to_file()
+    writer.write_tensors_to_file()
+    writer.close()
+    MirrorHandler.ranges = True
+    MirrorHandler.requested = []
+    return serve(path.parent, MirrorHandler) + '/model.gguf', path
+
+
+def test_download(mirror: tuple[str, Path], tmp_path: Path) -> None:
+    url, model = mirror
+    dest = ModelDownloader(url, str(tmp_path), connections = 3, chunk_size = CHUNK).run()
+    assert Path(dest).read_bytes() == model.read_bytes()
+    assert not Path(dest + '.part.json').exists()
+
+
+def test_no_range_support(mirror: tuple[str, Path], tmp_path: Path) -> None:
+    url, _model = mirror
+    MirrorHandler.ranges = False
+    with pytest.raises(DownloadError, match = r'expected a partial response \(206\), got 200'):
+        ModelDownloader(url, str(tmp_path), connections = 1, chunk_size = CHUNK).run()
+    assert not (tmp_path / 'model.gguf').exists()
+
+
+def test_resume(mirror: tuple[str, Path], tmp_path: Path) -> None:
+    url, model = mirror
+    size = model.stat().st_size
+
+    # A first attempt only gets the first range, which the journal records
+    MirrorHandler.ranges = False
+    with pytest.raises(DownloadError):
+        ModelDownloader(url, str(tmp_path), connections = 1, chunk_size = CHUNK).run()
+    journal = json.loads((tmp_path / 'model.gguf.part.json').read_text())
+    assert journal['done'] == [0]
+
+    # The second one only fetches the missing ranges
+    MirrorHandler.ranges = True
+    MirrorHandler.requested = []
+    downloader = ModelDownloader(url, str(tmp_path), connections = 1, chunk_size = CHUNK)
+    dest = downloader.run()
+    assert Path(dest).read_bytes() == model.read_bytes()
+    assert downloader.resumed_bytes == CHUNK
+    missing = [f'bytes={start}-{min(start + CHUNK, size) - 1}' for start in range(CHUNK, size, CHUNK)]
+    # The header is read again first, to check the file did not change
+    assert MirrorHandler.requested[-len(missing):] == missing
+    assert f'bytes=0-{CHUNK - 1}' not in MirrorHandler.requested